@@ -0,0 +1,194 @@
+"""
+Read-only archive of compacted ledger history
+Compaction moves records already covered by a snapshot out of the live ledger
+files into numbered, read-only parts in one of the record formats (the part's
+suffix says which); a manifest records how many records each part holds so
+totals are known without reading the parts. Archives opened with a key field
+keep a sidecar offset index per part for point reads
+"""
+
+import json
+import logging
+import os
+import stat
+import threading
+
+from .record_format import RECORD_FORMATS, get_format
+from .record_offsets import MappedReader, encode_offset, load_offsets, sidecar_path
+
+logger = logging.getLogger(__name__)
+
+PART_PREFIX = "part-"
+MANIFEST = "manifest.json"
+READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+
+class LedgerArchive:
+    """Ordered, read-only parts holding the oldest records of one ledger file"""
+
+    def __init__(self, directory, key_field=None, record_format="json"):
+        """
+        Open (or create) an archive
+
+        Args:
+            directory: Directory holding the parts and manifest
+            key_field: Record field to index in per-part sidecar files (see read_record)
+            record_format: Encoding of newly archived parts; existing parts keep theirs
+        """
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST)
+        self.key_field = key_field
+        self.format = get_format(record_format) if isinstance(record_format, str) else record_format
+        try:
+            with open(self.manifest_path, 'r') as f:
+                self._parts = json.load(f)["parts"]
+        except FileNotFoundError:
+            self._parts = []
+        # key -> (part file, offset, length), loaded from the sidecars on first use
+        self._offsets = None
+        self._offsets_lock = threading.Lock()
+        self._reader = MappedReader()
+
+    def is_empty(self):
+        return not self._parts
+
+    def record_count(self):
+        return sum(part["records"] for part in self._parts)
+
+    def sources(self):
+        """Live files (e.g. sealed segments) that have been archived"""
+        return {part["source"] for part in self._parts if part.get("source")}
+
+    def last_hash(self):
+        return self._parts[-1].get("last_hash") if self._parts else None
+
+    def _part_path(self, part):
+        return os.path.join(self.directory, part["file"])
+
+    @staticmethod
+    def _part_format(name):
+        return next(fmt for fmt in RECORD_FORMATS.values() if name.endswith(fmt.suffix))
+
+    def iter_entries(self):
+        """Yield every archived record in ledger order"""
+        for part in self._parts:
+            record_format = self._part_format(part["file"])
+            with open(self._part_path(part), 'rb') as f:
+                for payload in record_format.iter_payloads(f):
+                    yield record_format.decode(payload)
+
+    def last_entry(self):
+        if not self._parts:
+            return None
+        record_format = self._part_format(self._parts[-1]["file"])
+        path = self._part_path(self._parts[-1])
+        with open(path, 'rb') as f:
+            payload = record_format.last_payload(f, os.path.getsize(path))
+        return record_format.decode(payload) if payload is not None else None
+
+    def add_records(self, records, source=None):
+        """
+        Write records as a new read-only part
+
+        Args:
+            records: Records to archive, continuing the ledger order
+            source: Name of the live file the records were taken from, if it is removed afterwards
+
+        Returns:
+            int: Number of records archived
+        """
+        records = list(records)
+        if not records:
+            return 0
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{PART_PREFIX}{len(self._parts) + 1:08d}{self.format.suffix}"
+        path = os.path.join(self.directory, name)
+        tmp_path = path + ".tmp"
+        offsets = []
+        framing = self.format.header_size + self.format.trailer_size
+        with open(tmp_path, 'wb') as f:
+            for record in records:
+                frame = self.format.encode(record)
+                offsets.append((record.get(self.key_field), f.tell() + self.format.header_size, len(frame) - framing))
+                f.write(frame)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, READ_ONLY)
+        if self.key_field is not None:
+            index_path = sidecar_path(path)
+            with open(index_path + ".tmp", 'wb') as f:
+                f.write(b''.join(encode_offset(*entry) for entry in offsets))
+            os.chmod(index_path + ".tmp", READ_ONLY)
+            os.replace(index_path + ".tmp", index_path)
+        os.replace(tmp_path, path)
+        with self._offsets_lock:
+            if self._offsets is not None:
+                for key, offset, length in offsets:
+                    if key is not None:
+                        self._offsets[str(key)] = (name, offset, length)
+
+        self._parts.append({
+            "file": name,
+            "records": len(records),
+            "last_hash": records[-1].get("hash"),
+            "source": source
+        })
+        self._write_manifest()
+        logger.info(f"Archived {len(records)} records to {path}")
+        return len(records)
+
+    def _load_offsets(self):
+        """Read every part's sidecar, writing those of parts archived before sidecars existed"""
+        with self._offsets_lock:
+            if self._offsets is None:
+                offsets = {}
+                for part in self._parts:
+                    part_offsets = load_offsets(self._part_path(part), self.key_field, self._part_format(part["file"]))
+                    for key, (offset, length) in part_offsets.items():
+                        offsets[key] = (part["file"], offset, length)
+                self._offsets = offsets
+            return self._offsets
+
+    def load_index(self):
+        """Load the offset index now rather than on the first read_record"""
+        if self.key_field is not None:
+            self._load_offsets()
+
+    def read_record(self, key):
+        """Read one archived record by key from a memory map of its part, or None"""
+        if self.key_field is None:
+            return None
+        location = self._load_offsets().get(key)
+        if location is None:
+            return None
+        name, offset, length = location
+        return self._reader.read(os.path.join(self.directory, name), offset, length, self._part_format(name).decode)
+
+    def _write_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"parts": self._parts}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def drop_archived_sources(self, live_directory):
+        """Remove live files a crashed compaction archived but did not get to delete"""
+        for name in self.sources():
+            path = os.path.join(live_directory, name)
+            if os.path.exists(path):
+                logger.warning(f"Removing {path}, already archived by an interrupted compaction")
+                os.remove(path)
+            if os.path.exists(sidecar_path(path)):
+                os.remove(sidecar_path(path))
+
+    def trim_archived_prefix(self, records):
+        """Drop the records a crashed compaction archived but did not remove from a live JSON array"""
+        last_hash = self.last_hash()
+        if last_hash is None:
+            return records
+        for i, record in enumerate(records):
+            if record.get("hash") == last_hash:
+                logger.warning(f"Dropping {i + 1} records already archived by an interrupted compaction")
+                return records[i + 1:]
+        return records
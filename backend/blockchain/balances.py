@@ -0,0 +1,175 @@
+"""
+Materialized credit balances per entity and vintage
+Updated incrementally by issuance and transfers, and rebuildable by replaying
+the credit and transaction records
+"""
+
+import logging
+import math
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Tolerance for float drift when comparing credit amounts
+EPSILON = 1e-9
+
+
+class InsufficientCreditsError(Exception):
+    def __init__(self, entity_id, available, requested):
+        self.entity_id = entity_id
+        self.available = available
+        self.requested = requested
+        super().__init__(f"Insufficient credits. Available: {available}, Requested: {requested}")
+
+
+def parse_amount(value, field="amount", allow_zero=False):
+    """
+    A credit amount or price as a finite float
+
+    Args:
+        value: Number or numeric string
+        field: Field name used in the error message
+        allow_zero: Whether zero is accepted (prices may be zero, amounts may not)
+
+    Returns:
+        float: The converted value
+
+    Raises:
+        ValueError: If the value is not a number, not finite, negative, or zero when not allowed
+    """
+    try:
+        number = float(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"{field} must be a number")
+    if not math.isfinite(number) or number < 0 or (number == 0 and not allow_zero):
+        raise ValueError(f"{field} must be a {'non-negative' if allow_zero else 'positive'} number")
+    return number
+
+
+def vintage_order(vintage):
+    # Oldest vintage first; credits without a vintage are spent last
+    return (vintage is None, vintage or 0)
+
+
+class BalanceStore:
+    """Credit holdings keyed by entity and vintage, with O(1) per-entity totals"""
+
+    def __init__(self):
+        self._by_vintage = defaultdict(dict)
+        self._totals = defaultdict(float)
+
+    def balance(self, entity_id, vintage_year=None):
+        """Available credits for an entity, optionally for a single vintage"""
+        if vintage_year is None:
+            return self._totals.get(entity_id, 0.0)
+        return self._by_vintage.get(entity_id, {}).get(vintage_year, 0.0)
+
+    def holdings(self, entity_id):
+        """Per-vintage holdings of an entity"""
+        return dict(self._by_vintage.get(entity_id, {}))
+
+    def credit(self, entity_id, amount, vintage_year=None):
+        vintages = self._by_vintage[entity_id]
+        vintages[vintage_year] = vintages.get(vintage_year, 0.0) + amount
+        self._totals[entity_id] += amount
+
+    def credit_allocation(self, entity_id, allocation):
+        """Credit every vintage slice of a transfer allocation"""
+        for part in allocation:
+            self.credit(entity_id, part['amount'], part['vintage_year'])
+
+    def debit(self, entity_id, amount, vintage_year=None):
+        """
+        Remove credits from an entity
+
+        Args:
+            entity_id: Holder to debit
+            amount: Credits to remove
+            vintage_year: Restrict the debit to one vintage; otherwise oldest vintages go first
+
+        Returns:
+            list: Allocation of the debit as [{"vintage_year", "amount"}]
+
+        Raises:
+            ValueError: If the amount is not a positive, finite number
+            InsufficientCreditsError: If the holder does not have enough credits
+        """
+        amount = parse_amount(amount)
+        available = self.balance(entity_id, vintage_year)
+        if available + EPSILON < amount:
+            raise InsufficientCreditsError(entity_id, available, amount)
+
+        vintages = self._by_vintage[entity_id]
+        if vintage_year is not None:
+            allocation = [{"vintage_year": vintage_year, "amount": amount}]
+        else:
+            allocation = []
+            remaining = amount
+            for vintage in sorted(vintages, key=vintage_order):
+                if remaining <= EPSILON:
+                    break
+                take = min(vintages[vintage], remaining)
+                if take > 0:
+                    allocation.append({"vintage_year": vintage, "amount": take})
+                    remaining -= take
+
+        for part in allocation:
+            left = vintages[part['vintage_year']] - part['amount']
+            if left <= EPSILON:
+                del vintages[part['vintage_year']]
+            else:
+                vintages[part['vintage_year']] = left
+        self._totals[entity_id] = max(0.0, self._totals[entity_id] - amount)
+        return allocation
+
+    def apply_issuance(self, credit_record):
+        """Credit the NGO for a newly issued, sellable credit record"""
+        if credit_record.get('available_for_sale', False):
+            self.credit(credit_record['ngo_id'], credit_record['credits_amount'], credit_record.get('vintage_year'))
+
+    def apply_transfer(self, transaction):
+        """Move credits for a stored transaction (used when replaying the ledger)"""
+        from_id = transaction['from_id']
+        allocation = transaction.get('vintage_allocation')
+        if allocation is None:
+            # Transactions written before balances were tracked carry no allocation
+            amount = min(transaction['credits_amount'], self.balance(from_id))
+            if amount + EPSILON < transaction['credits_amount']:
+                logger.warning(f"Transaction {transaction.get('transaction_id')} overdraws {from_id}, replaying {amount} credits")
+            allocation = self.debit(from_id, amount) if amount > 0 else []
+        else:
+            for part in allocation:
+                vintages = self._by_vintage[from_id]
+                left = vintages.get(part['vintage_year'], 0.0) - part['amount']
+                if left <= EPSILON:
+                    vintages.pop(part['vintage_year'], None)
+                else:
+                    vintages[part['vintage_year']] = left
+                self._totals[from_id] = max(0.0, self._totals[from_id] - part['amount'])
+        self.credit_allocation(transaction['to_id'], allocation)
+
+    def to_state(self):
+        """Holdings as [entity, vintage, amount] rows, for snapshots"""
+        return [
+            [entity_id, vintage, amount]
+            for entity_id, vintages in self._by_vintage.items()
+            for vintage, amount in vintages.items()
+        ]
+
+    @classmethod
+    def from_state(cls, rows):
+        """Restore a store from to_state() rows"""
+        store = cls()
+        for entity_id, vintage, amount in rows:
+            store.credit(entity_id, amount, vintage)
+        return store
+
+    @classmethod
+    def rebuild(cls, credits, transactions):
+        """Replay issuance and transfer records into a fresh store"""
+        store = cls()
+        for credit_record in credits:
+            store.apply_issuance(credit_record)
+        for transaction in transactions:
+            store.apply_transfer(transaction)
+        return store
@@ -0,0 +1,203 @@
+"""
+Hash-chain verification with signed checkpoints
+A checkpoint records a block number, that block's hash and the cumulative hash of
+every block up to it, signed with HMAC-SHA256 so later audits only re-verify
+blocks appended after it
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from .merkle import merkle_root
+
+logger = logging.getLogger(__name__)
+
+GENESIS_HASH = "genesis"
+GENESIS_CUMULATIVE = "0" * 64
+
+
+def entry_hash(data):
+    """SHA-256 of a ledger record, matching LedgerService._calculate_hash"""
+    data_copy = data.copy()
+    data_copy.pop('hash', None)
+    data_copy.pop('_id', None)
+    return hashlib.sha256(json.dumps(data_copy, sort_keys=True).encode()).hexdigest()
+
+
+def extend_cumulative(cumulative, block_hash):
+    """Fold one block hash into the running cumulative hash"""
+    return hashlib.sha256((cumulative + block_hash).encode()).hexdigest()
+
+
+def verify_blocks(blocks, previous_hash):
+    """
+    Verify a contiguous run of blocks
+
+    Args:
+        blocks: List of (block_number, entries, header) in chain order; header is None
+            for single-report blocks
+        previous_hash: Hash the first block must link to
+
+    Returns:
+        tuple: (block hashes in order, number of entries checked, list of error strings)
+    """
+    block_hashes = []
+    errors = []
+    entries_checked = 0
+
+    for block_number, entries, header in blocks:
+        if not entries:
+            errors.append(f"Block {block_number}: no entries")
+            block_hashes.append(header['hash'] if header else GENESIS_HASH)
+            continue
+
+        for entry in entries:
+            entries_checked += 1
+            if entry_hash(entry) != entry.get('hash'):
+                errors.append(f"Block {block_number}: report {entry.get('report_id')} hash mismatch")
+            if entry.get('previous_hash') != previous_hash:
+                errors.append(f"Block {block_number}: report {entry.get('report_id')} does not link to previous block")
+
+        if header is None:
+            if len(entries) != 1:
+                errors.append(f"Block {block_number}: {len(entries)} reports without a block header")
+            block_hash = entries[-1].get('hash')
+        else:
+            if entry_hash(header) != header.get('hash'):
+                errors.append(f"Block {block_number}: header hash mismatch")
+            if header.get('previous_hash') != previous_hash:
+                errors.append(f"Block {block_number}: header does not link to previous block")
+            if header.get('entry_count') != len(entries):
+                errors.append(f"Block {block_number}: header lists {header.get('entry_count')} entries, found {len(entries)}")
+            if merkle_root([e.get('hash') for e in entries]) != header.get('merkle_root'):
+                errors.append(f"Block {block_number}: Merkle root mismatch")
+            block_hash = header.get('hash')
+
+        block_hashes.append(block_hash)
+        previous_hash = block_hash
+
+    return block_hashes, entries_checked, errors
+
+
+def _verify_chunk(args):
+    blocks, previous_hash = args
+    return verify_blocks(blocks, previous_hash)
+
+
+def verify_blocks_parallel(blocks, workers=None):
+    """
+    Verify a full chain by splitting it across a process pool
+
+    Each worker re-hashes its slice and checks the links inside it; the links
+    between slices are checked here once every worker has returned.
+
+    Returns:
+        tuple: (block hashes in order, number of entries checked, list of error strings)
+    """
+    workers = workers or os.cpu_count() or 1
+    chunk_size = max(1, -(-len(blocks) // workers))
+    chunks = [blocks[i:i + chunk_size] for i in range(0, len(blocks), chunk_size)]
+    if len(chunks) <= 1:
+        return verify_blocks(blocks, GENESIS_HASH)
+
+    # Each slice assumes the link its first block claims; the boundary check below confirms it
+    jobs = []
+    for index, chunk in enumerate(chunks):
+        claimed = GENESIS_HASH if index == 0 else _claimed_previous_hash(chunk[0])
+        jobs.append((chunk, claimed))
+
+    block_hashes, entries_checked, errors = [], 0, []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for index, (hashes, checked, chunk_errors) in enumerate(pool.map(_verify_chunk, jobs)):
+            if index and block_hashes and jobs[index][1] != block_hashes[-1]:
+                errors.append(f"Block {chunks[index][0][0]}: does not link to previous block")
+            block_hashes.extend(hashes)
+            entries_checked += checked
+            errors.extend(chunk_errors)
+    return block_hashes, entries_checked, errors
+
+
+def _claimed_previous_hash(block):
+    _, entries, header = block
+    if header is not None:
+        return header.get('previous_hash')
+    return entries[0].get('previous_hash') if entries else None
+
+
+class CheckpointStore:
+    """Append-only file of HMAC-signed verification checkpoints"""
+
+    def __init__(self, storage_dir, key=None):
+        """
+        Args:
+            storage_dir: Ledger storage directory
+            key: Signing key; defaults to LEDGER_CHECKPOINT_KEY, then to a key file
+                generated in the storage directory
+        """
+        self.path = os.path.join(storage_dir, "checkpoints.jsonl")
+        self.key_path = os.path.join(storage_dir, "checkpoint.key")
+        key = key or os.environ.get('LEDGER_CHECKPOINT_KEY') or self._load_or_create_key()
+        self._key = key.encode() if isinstance(key, str) else key
+
+    def _load_or_create_key(self):
+        if os.path.exists(self.key_path):
+            with open(self.key_path, 'r') as f:
+                return f.read().strip()
+        key = secrets.token_hex(32)
+        # Written in full before it is linked into place, so a process starting at the same
+        # time never reads a partial key, and only the first process's key is kept
+        tmp_path = f"{self.key_path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(key)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(tmp_path, self.key_path)
+        except FileExistsError:
+            with open(self.key_path, 'r') as f:
+                return f.read().strip()
+        finally:
+            os.remove(tmp_path)
+        logger.warning(f"Generated checkpoint signing key at {self.key_path}; set LEDGER_CHECKPOINT_KEY in production")
+        return key
+
+    def _signature(self, checkpoint):
+        body = {k: v for k, v in checkpoint.items() if k != 'signature'}
+        message = json.dumps(body, sort_keys=True).encode()
+        return hmac.new(self._key, message, hashlib.sha256).hexdigest()
+
+    def is_valid(self, checkpoint):
+        return hmac.compare_digest(checkpoint.get('signature', ''), self._signature(checkpoint))
+
+    def latest(self):
+        """Return the most recent checkpoint, or None"""
+        if not os.path.exists(self.path):
+            return None
+        last = None
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if line.endswith(b'\n') and line.strip():
+                    last = line
+        return json.loads(last) if last else None
+
+    def write(self, block_number, block_hash, cumulative_hash):
+        """Sign and persist a new checkpoint"""
+        checkpoint = {
+            "block_number": block_number,
+            "block_hash": block_hash,
+            "cumulative_hash": cumulative_hash,
+            "created_at": datetime.now().isoformat()
+        }
+        checkpoint["signature"] = self._signature(checkpoint)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(checkpoint) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        return checkpoint
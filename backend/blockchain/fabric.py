@@ -0,0 +1,55 @@
+"""
+Access to the Fabric client wrapper, blockchain/fabric_service.py at the repository root
+Whenever backend/ is on sys.path this package is what `blockchain` resolves to, which
+hides the top-level blockchain directory, so the wrapper is loaded by its file path
+"""
+
+import importlib.util
+import logging
+import os
+import sys
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+FABRIC_SERVICE_PATH = Path(__file__).resolve().parents[2] / 'blockchain' / 'fabric_service.py'
+_MODULE_NAME = 'ecoledger_fabric_service'
+
+
+def _load_fabric_service():
+    module = sys.modules.get(_MODULE_NAME)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(_MODULE_NAME, FABRIC_SERVICE_PATH)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[_MODULE_NAME] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[_MODULE_NAME]
+            raise
+    return module
+
+
+try:
+    _fabric_service = _load_fabric_service()
+    FabricService = _fabric_service.FabricService
+    FabricServiceError = _fabric_service.FabricServiceError
+    SyncFabricService = _fabric_service.SyncFabricService
+    FABRIC_AVAILABLE = True
+except Exception as e:
+    logger.info(f"Fabric client wrapper not available at {FABRIC_SERVICE_PATH}: {e}")
+    FabricService = SyncFabricService = None
+    FABRIC_AVAILABLE = False
+
+    class FabricServiceError(Exception):
+        pass
+
+
+def fabric_configured():
+    """
+    Whether Fabric has been set up for this deployment: a client mode is chosen with
+    FABRIC_CLIENT_MODE, or a connection profile exists (FABRIC_CONNECTION_PROFILE, or
+    connection.json next to fabric_client.js)
+    """
+    profile = os.environ.get('FABRIC_CONNECTION_PROFILE') or FABRIC_SERVICE_PATH.parent / 'connection.json'
+    return bool(os.environ.get('FABRIC_CLIENT_MODE')) or Path(profile).exists()
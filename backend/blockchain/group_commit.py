@@ -0,0 +1,169 @@
+"""
+Group-commit writer for the segmented ledger logs
+Request threads enqueue records; one writer thread appends everything queued
+within a short latency window and fsyncs once per batch before releasing the callers
+"""
+
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMMIT_WINDOW_MS = 2.0
+DEFAULT_MAX_BATCH = 1024
+
+_STOP = object()
+
+
+class PendingWrite:
+    """Handle for an enqueued record; wait() returns once its batch is durable"""
+
+    __slots__ = ("log", "entry", "on_durable", "_done", "_error")
+
+    def __init__(self, log, entry, on_durable=None):
+        self.log = log
+        self.entry = entry
+        self.on_durable = on_durable
+        self._done = threading.Event()
+        self._error = None
+
+    def _resolve(self, error=None):
+        self._error = error
+        self._done.set()
+
+    def wait(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError("Ledger write not committed in time")
+        if self._error is not None:
+            raise self._error
+
+
+class GroupCommitWriter:
+    """Single background thread that batches appends and fsyncs once per batch"""
+
+    def __init__(self, commit_window_ms=DEFAULT_COMMIT_WINDOW_MS, max_batch=DEFAULT_MAX_BATCH,
+                 on_failure=None):
+        """
+        Start the writer thread
+
+        Args:
+            commit_window_ms: How long the writer waits for more records after the first one of a batch
+            max_batch: Maximum records per batch
+            on_failure: Called with the exception when a batch could not be written
+        """
+        self.commit_window = commit_window_ms / 1000.0
+        self.max_batch = max_batch
+        self.on_failure = on_failure
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="ledger-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, log, entry, on_durable=None):
+        """
+        Enqueue a record for the given log; records are written in submission order
+
+        Args:
+            log: SegmentLog to append to
+            entry: Record to append
+            on_durable: Called on the writer thread once the record is durable,
+                before the caller is released and before any later record's callback
+        """
+        if self._closed:
+            raise IOError("Group commit writer is closed")
+        pending = PendingWrite(log, entry, on_durable)
+        self._queue.put(pending)
+        return pending
+
+    def write(self, log, entry, on_durable=None):
+        """Enqueue a record and block until it is durable"""
+        self.submit(log, entry, on_durable).wait()
+
+    def flush(self):
+        """Block until every record submitted so far is durable and its callback has run"""
+        self.submit(None, None).wait()
+
+    def fail_pending(self, error):
+        """Fail every record still waiting in the queue"""
+        failed = 0
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            item._resolve(error)
+            failed += 1
+        return failed
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.commit_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _commit(self, batch):
+        # Group by log while keeping submission order within each log
+        by_log = {}
+        for pending in batch:
+            if pending.log is not None:
+                by_log.setdefault(id(pending.log), (pending.log, []))[1].append(pending.entry)
+        # Logs are synced independently: a failure only rejects the records of its own log,
+        # since the other logs' records are already durable
+        failed = {}
+        for key, (log, entries) in by_log.items():
+            try:
+                log.append_batch(entries, durable=True)
+            except Exception as e:
+                logger.error(f"Group commit of {len(entries)} records to {getattr(log, 'directory', log)} failed: {e}")
+                failed[key] = IOError(f"Ledger group commit failed: {e}")
+        for pending in batch:
+            if pending.log is None:
+                # A flush marker: everything before it must have been written
+                pending._resolve(next(iter(failed.values()), None))
+                continue
+            error = failed.get(id(pending.log))
+            if error is not None:
+                pending._resolve(error)
+                continue
+            if pending.on_durable is not None:
+                try:
+                    pending.on_durable()
+                except Exception as e:
+                    logger.error(f"Group commit callback failed: {e}")
+            pending._resolve()
+        if failed and self.on_failure:
+            try:
+                self.on_failure(next(iter(failed.values())))
+            except Exception as handler_error:
+                logger.error(f"Group commit failure handler raised: {handler_error}")
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stop = self._collect_batch(first)
+            self._commit(batch)
+            if stop:
+                return
+
+    def close(self):
+        """Commit everything already queued, then stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
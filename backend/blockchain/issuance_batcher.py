@@ -0,0 +1,161 @@
+"""
+Coalescing of on-chain credit issuances
+Request threads enqueue chaincode payloads; one submitter thread sends everything
+queued within a short window as a single AddCarbonCredits transaction, so a burst
+of issuances costs one endorsement and ordering round trip instead of one each.
+A batch is all or nothing on-chain, so when one fails its credits are retried one
+at a time and only the credits the chaincode rejects on their own fail
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from .fabric import FabricServiceError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ISSUE_WINDOW_MS = 20.0
+DEFAULT_MAX_ISSUE_BATCH = 100
+# How long issue() waits for a credit's batch, retries included, before giving up on it
+DEFAULT_ISSUE_TIMEOUT = 120.0
+
+_STOP = object()
+
+
+class PendingIssuance:
+    """Handle for an enqueued credit; wait() returns its on-chain result once its batch is committed"""
+
+    __slots__ = ("payload", "_done", "_result", "_error")
+
+    def __init__(self, payload):
+        self.payload = payload
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    def _resolve(self, result=None, error=None):
+        self._result = result
+        self._error = error
+        self._done.set()
+
+    def wait(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError("On-chain issuance not committed in time")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class IssuanceBatcher:
+    """Single background thread that submits queued issuances through FabricService.issue_credits_batch"""
+
+    def __init__(self, fabric_service, window_ms=DEFAULT_ISSUE_WINDOW_MS, max_batch=DEFAULT_MAX_ISSUE_BATCH):
+        """
+        Start the submitter thread
+
+        Args:
+            fabric_service: FabricService (or compatible) providing issue_credits_batch
+            window_ms: How long the submitter waits for more credits after the first one of a batch
+            max_batch: Maximum credits per transaction
+        """
+        self.fabric_service = fabric_service
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="ledger-issuance-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, payload):
+        """Enqueue a chaincode credit payload (with its creditId set)"""
+        if self._closed:
+            raise IOError("Issuance batcher is closed")
+        pending = PendingIssuance(payload)
+        self._queue.put(pending)
+        return pending
+
+    def issue(self, payload, timeout=DEFAULT_ISSUE_TIMEOUT):
+        """
+        Enqueue a credit and block until its batch is on-chain
+
+        Returns:
+            dict: The credit's result
+
+        Raises:
+            TimeoutError: If the credit is not committed or rejected within timeout seconds
+        """
+        return self.submit(payload).wait(timeout)
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _submit_batch(self, batch):
+        """Submit a batch and resolve every one of its pending issuances"""
+        try:
+            self._commit_batch(batch)
+        except Exception as e:
+            logger.error(f"On-chain issuance of {len(batch)} credits failed: {e}")
+            error = e
+        else:
+            error = FabricServiceError("On-chain issuance ended without a result")
+        # Nothing is left waiting, whatever went wrong above
+        for pending in batch:
+            if not pending._done.is_set():
+                pending._resolve(error=error)
+
+    def _commit_batch(self, batch):
+        try:
+            result = self.fabric_service.issue_credits_batch([pending.payload for pending in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                raise
+            # Nothing of a failed batch was committed; find the credits that fail on their own
+            logger.warning(f"On-chain issuance of {len(batch)} credits failed, retrying them one at a time: {e}")
+            for pending in batch:
+                self._submit_batch([pending])
+            return
+        credit_ids = result.get('creditIds')
+        if credit_ids is None:
+            credit_ids = [pending.payload.get('creditId') for pending in batch]
+        if len(credit_ids) != len(batch):
+            raise FabricServiceError(f"AddCarbonCredits returned {len(credit_ids)} credit ids "
+                                     f"for {len(batch)} credits in transaction {result.get('txId')}")
+        logger.info(f"Issued {len(batch)} credits on-chain in transaction {result.get('txId')}")
+        for pending, credit_id in zip(batch, credit_ids):
+            pending._resolve({
+                "success": result.get('success', True),
+                "creditId": credit_id,
+                "txId": result.get('txId'),
+                "batchSize": len(batch)
+            })
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stop = self._collect_batch(first)
+            self._submit_batch(batch)
+            if stop:
+                return
+
+    def close(self):
+        """Submit everything already queued, then stop the submitter thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
@@ -0,0 +1,233 @@
+"""
+In-memory lookup indexes for the file-based ledger
+Built once from the stored records at startup and kept current on every append.
+With record loaders (segmented storage) only ids and sort keys are held in memory
+and record bodies are read back from storage on lookup
+"""
+
+from collections import defaultdict
+
+from .pagination import SORT_FIELDS, KeysetIndex, filter_partition, filter_partitions, paginate, sort_key
+from .time_range import TIME_FIELDS, time_key
+
+# Equality filters on an NGO's credit records, each combination with its own sorted keys
+NGO_FILTER_FIELDS = ("vintage_year", "status")
+
+
+def _sort_indexes():
+    return {field: KeysetIndex() for field in SORT_FIELDS}
+
+
+class LedgerIndex:
+    """Primary (id -> record), secondary (owner -> ids) and time indexes over the ledger records"""
+
+    def __init__(self, load_report=None, load_credit=None, load_transaction=None):
+        """
+        Args:
+            load_report: Reads a stored report by report_id; reports are kept in memory when None
+            load_credit: Reads a stored credit record by credit_id; likewise for credits
+            load_transaction: Reads a stored transaction by transaction_id; likewise for transactions
+        """
+        self._load_report = load_report
+        self._load_credit = load_credit
+        self._load_transaction = load_transaction
+        # id -> record, or -> None when the record is read back by a loader
+        self.reports_by_id = {}
+        self.credits_by_id = {}
+        self.transactions_by_id = {}
+        self.credit_ids_by_ngo = defaultdict(list)
+        self.credit_ids_by_report = defaultdict(list)
+        # Per NGO and filter partition (see pagination.filter_partitions): one sorted key index
+        # per sort field; and per NGO running (issued, available) totals
+        self.credit_keys_by_ngo = defaultdict(lambda: defaultdict(_sort_indexes))
+        self.credit_totals_by_ngo = defaultdict(lambda: [0.0, 0.0])
+        self.report_ids_by_block = defaultdict(list)
+        self.blocks_by_number = {}
+        # Per record kind: keys ordered by epoch time (see time_range)
+        self.keys_by_time = {kind: KeysetIndex() for kind in TIME_FIELDS}
+
+    def _add_time_key(self, kind, record):
+        key = time_key(record, kind)
+        if key is not None:
+            self.keys_by_time[kind].add(key)
+
+    def add_report(self, report):
+        # Adding a record twice is a no-op: a lazy index build can race with an append
+        if report['report_id'] in self.reports_by_id:
+            return
+        self.reports_by_id[report['report_id']] = report if self._load_report is None else None
+        self.report_ids_by_block[report.get('block_number', 0)].append(report['report_id'])
+        self._add_time_key("reports", report)
+
+    def add_credit(self, credit):
+        credit_id = credit['credit_id']
+        if credit_id in self.credits_by_id:
+            return
+        self.credits_by_id[credit_id] = credit if self._load_credit is None else None
+        self.credit_ids_by_ngo[credit['ngo_id']].append(credit_id)
+        self.credit_ids_by_report[credit['report_id']].append(credit_id)
+        partitions = self.credit_keys_by_ngo[credit['ngo_id']]
+        for partition in filter_partitions(credit, NGO_FILTER_FIELDS):
+            for field, index in partitions[partition].items():
+                index.add(sort_key(credit, field))
+        totals = self.credit_totals_by_ngo[credit['ngo_id']]
+        totals[0] += credit['credits_amount']
+        if credit.get('available_for_sale', False):
+            totals[1] += credit['credits_amount']
+        self._add_time_key("credits", credit)
+
+    def add_transaction(self, transaction):
+        transaction_id = transaction['transaction_id']
+        if transaction_id in self.transactions_by_id:
+            return
+        self.transactions_by_id[transaction_id] = transaction if self._load_transaction is None else None
+        self._add_time_key("transactions", transaction)
+
+    def add_block(self, header):
+        """Index the header of a multi-entry block"""
+        self.blocks_by_number[header['block_number']] = header
+
+    def to_state(self):
+        """
+        Ids, owners, sort values and timestamps of the indexed records, for snapshots
+
+        Only an index with record loaders can be saved; its record bodies stay in storage.
+        """
+        if None in (self._load_report, self._load_credit, self._load_transaction):
+            raise ValueError("Only an index that reads records back from storage can be saved")
+        block_of = {report_id: block_number for block_number, report_ids in self.report_ids_by_block.items()
+                    for report_id in report_ids}
+        report_of = {credit_id: report_id for report_id, credit_ids in self.credit_ids_by_report.items()
+                     for credit_id in credit_ids}
+        # Sort and time keys hold ((is_missing, value), id); rows store the value, or None when missing
+        times = {kind: {record_id: value for (missing, value), record_id in index if not missing}
+                 for kind, index in self.keys_by_time.items()}
+        credits = {}
+        for ngo_id, partitions in self.credit_keys_by_ngo.items():
+            for field in SORT_FIELDS:
+                for (missing, value), credit_id in partitions[()][field]:
+                    credits.setdefault(credit_id, {"ngo_id": ngo_id, "status": None})[field] = None if missing else value
+            for partition, keys in partitions.items():
+                if len(partition) == 1 and partition[0][0] == "status":
+                    for _, credit_id in keys["issued_at"]:
+                        credits[credit_id]["status"] = partition[0][1]
+        return {
+            "reports": [[report_id, block_of[report_id], times["reports"].get(report_id)]
+                        for report_id in self.reports_by_id],
+            "credits": [[credit_id, credits[credit_id]["ngo_id"], report_of[credit_id], credits[credit_id]["status"],
+                         *(credits[credit_id][field] for field in SORT_FIELDS), times["credits"].get(credit_id)]
+                        for credit_id in self.credits_by_id],
+            "credit_totals": {ngo_id: list(totals) for ngo_id, totals in self.credit_totals_by_ngo.items()},
+            "transactions": [[transaction_id, times["transactions"].get(transaction_id)]
+                             for transaction_id in self.transactions_by_id],
+            "blocks": list(self.blocks_by_number.values())
+        }
+
+    @classmethod
+    def from_state(cls, state, load_report, load_credit, load_transaction):
+        """Restore an index from to_state(), sorting each key index once"""
+        index = cls(load_report, load_credit, load_transaction)
+        time_keys = {kind: [] for kind in TIME_FIELDS}
+        for report_id, block_number, epoch in state["reports"]:
+            index.reports_by_id[report_id] = None
+            index.report_ids_by_block[block_number].append(report_id)
+            if epoch is not None:
+                time_keys["reports"].append(((False, epoch), report_id))
+        credit_keys = defaultdict(list)
+        for credit_id, ngo_id, report_id, status, *values, epoch in state["credits"]:
+            index.credits_by_id[credit_id] = None
+            index.credit_ids_by_ngo[ngo_id].append(credit_id)
+            index.credit_ids_by_report[report_id].append(credit_id)
+            sort_values = dict(zip(SORT_FIELDS, values))
+            for partition in filter_partitions(dict(sort_values, status=status), NGO_FILTER_FIELDS):
+                for field, value in sort_values.items():
+                    credit_keys[ngo_id, partition, field].append(((value is None, 0 if value is None else value), credit_id))
+            if epoch is not None:
+                time_keys["credits"].append(((False, epoch), credit_id))
+        for (ngo_id, partition, field), field_keys in credit_keys.items():
+            index.credit_keys_by_ngo[ngo_id][partition][field].extend(field_keys)
+        for ngo_id, totals in state["credit_totals"].items():
+            index.credit_totals_by_ngo[ngo_id] = list(totals)
+        for transaction_id, epoch in state["transactions"]:
+            index.transactions_by_id[transaction_id] = None
+            if epoch is not None:
+                time_keys["transactions"].append(((False, epoch), transaction_id))
+        for kind, keys in time_keys.items():
+            index.keys_by_time[kind].extend(keys)
+        for header in state["blocks"]:
+            index.add_block(header)
+        return index
+
+    def get_report(self, report_id):
+        if self._load_report is None or report_id not in self.reports_by_id:
+            return self.reports_by_id.get(report_id)
+        return self._load_report(report_id)
+
+    def get_credit(self, credit_id):
+        if self._load_credit is None or credit_id not in self.credits_by_id:
+            return self.credits_by_id.get(credit_id)
+        return self._load_credit(credit_id)
+
+    def get_transaction(self, transaction_id):
+        if self._load_transaction is None or transaction_id not in self.transactions_by_id:
+            return self.transactions_by_id.get(transaction_id)
+        return self._load_transaction(transaction_id)
+
+    def get_block(self, block_number):
+        return self.blocks_by_number.get(block_number)
+
+    def reports_in_block(self, block_number):
+        """Reports stored in a block, in entry order"""
+        reports = [self.get_report(rid) for rid in self.report_ids_by_block.get(block_number, ())]
+        return sorted(reports, key=lambda r: r.get('entry_index', 0))
+
+    def credits_for_ngo(self, ngo_id):
+        """Credit records issued to an NGO, in issuance order"""
+        return [self.get_credit(cid) for cid in self.credit_ids_by_ngo.get(ngo_id, ())]
+
+    def ngo_credit_keys(self, ngo_id, sort_by, vintage_year=None, status=None):
+        """Sorted key index over the NGO's credit records that match the filters"""
+        partitions = self.credit_keys_by_ngo.get(ngo_id)
+        partition = filter_partition(NGO_FILTER_FIELDS, {"vintage_year": vintage_year, "status": status})
+        keys = partitions.get(partition) if partitions is not None else None
+        return keys[sort_by] if keys is not None else KeysetIndex()
+
+    def ngo_credits_page(self, ngo_id, sort_by="issued_at", limit=None, cursor=None, descending=False,
+                         vintage_year=None, min_price=None, max_price=None, status=None):
+        """
+        Keyset page of an NGO's credit records; returns (credits, next_cursor)
+
+        Price bounds apply to pages sorted by price (see pagination.validate_page_args)
+        """
+        by_price = sort_by == "price_per_credit"
+        return paginate(self.ngo_credit_keys(ngo_id, sort_by, vintage_year, status), self.get_credit, sort_by,
+                        limit, cursor, descending, min_price if by_price else None, max_price if by_price else None)
+
+    def ngo_credit_totals(self, ngo_id):
+        """(credits issued, credits issued for sale) of an NGO"""
+        return tuple(self.credit_totals_by_ngo.get(ngo_id, (0.0, 0.0)))
+
+    def credits_for_report(self, report_id):
+        """Credit records issued against a report, in issuance order"""
+        return [self.get_credit(cid) for cid in self.credit_ids_by_report.get(report_id, ())]
+
+    def all_credits(self):
+        if self._load_credit is None:
+            return self.credits_by_id.values()
+        return (self._load_credit(cid) for cid in self.credits_by_id)
+
+    def time_range_page(self, kind, start=None, end=None, limit=None, cursor=None, descending=False):
+        """
+        Keyset page of records of one kind with timestamps in [start, end]
+
+        Args:
+            kind: Key of time_range.TIME_FIELDS
+            start, end: Inclusive bounds in epoch seconds; None leaves that side open
+
+        Returns:
+            tuple: (records in time order, next_cursor)
+        """
+        lookup = {"reports": self.get_report, "credits": self.get_credit,
+                  "transactions": self.get_transaction}[kind]
+        return paginate(self.keys_by_time[kind], lookup, TIME_FIELDS[kind][0], limit, cursor, descending,
+                        start, end)
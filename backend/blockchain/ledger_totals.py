@@ -0,0 +1,61 @@
+"""
+Running totals of the credit amounts issued and traded on the ledger
+Kept current as credit and transaction records are appended, and stored in
+snapshots, so statistics never need a pass over the ledger
+"""
+
+import logging
+import math
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class LedgerTotals:
+    """Sums over every credit and transaction record, updated per append"""
+
+    def __init__(self, credits_issued=0.0, credits_traded=0.0, trade_value=0.0):
+        self.credits_issued = credits_issued
+        self.credits_traded = credits_traded
+        self.trade_value = trade_value
+        self._lock = threading.Lock()
+
+    def add_credit(self, credit_record):
+        with self._lock:
+            self.credits_issued += credit_record['credits_amount']
+
+    def apply_transfer(self, transaction):
+        amount = transaction['credits_amount']
+        value = transaction.get('total_amount', amount * transaction.get('price_per_credit', 0.0))
+        if not (math.isfinite(amount) and math.isfinite(value)):
+            # A NaN or infinity would stay in the sums, and in every snapshot, for good
+            logger.warning(f"Transaction {transaction.get('transaction_id')} has a non-finite amount, leaving it out of the totals")
+            return
+        with self._lock:
+            self.credits_traded += amount
+            self.trade_value += value
+
+    def to_state(self):
+        with self._lock:
+            return {
+                "credits_issued": self.credits_issued,
+                "credits_traded": self.credits_traded,
+                "trade_value": self.trade_value
+            }
+
+    @classmethod
+    def from_state(cls, state):
+        values = (state["credits_issued"], state["credits_traded"], state["trade_value"])
+        if not all(math.isfinite(value) for value in values):
+            raise ValueError("Snapshot totals are not finite")
+        return cls(*values)
+
+    @classmethod
+    def rebuild(cls, credits, transactions):
+        """Sum issuance and transfer records into fresh totals"""
+        totals = cls()
+        for credit_record in credits:
+            totals.add_credit(credit_record)
+        for transaction in transactions:
+            totals.apply_transfer(transaction)
+        return totals
@@ -0,0 +1,260 @@
+"""
+Incrementally maintained marketplace view
+Keeps the per-NGO aggregation served by /ledger/marketplace up to date as credits
+are issued and sold, and caches the rendered response under a version number so
+repeated polls cost O(1) and clients can revalidate with an ETag. The ETag is the
+ledger position the view reflects (credit and transaction records applied), which
+every process serving the same ledger agrees on. Available credits
+are also kept in sorted key indexes (overall, per NGO and per vintage) for keyset
+pagination; each combination of the equality filters has its own partition of keys
+"""
+
+import threading
+from datetime import datetime
+
+from .balances import EPSILON, vintage_order
+from .pagination import FILTER_FIELDS, SORT_FIELDS, KeysetIndex, filter_partition, filter_partitions, paginate, sort_key
+
+
+class MarketplaceView:
+    """Per-NGO listings of credits still available for sale"""
+
+    def __init__(self):
+        self._listings = {}
+        # Flat per-credit view of the listings, and its sorted keys by partition and field
+        self._credits = {}
+        self._keys = {}
+        self._lock = threading.Lock()
+        # Credit and transaction records applied so far, counted from the start of the ledger
+        self._credits_seen = 0
+        self._transactions_seen = 0
+        self.version = 0
+        self._response = None
+
+    @property
+    def etag(self):
+        return f"c{self._credits_seen}-t{self._transactions_seen}"
+
+    def set_position(self, credits_seen, transactions_seen):
+        """Set the ledger position the view reflects, e.g. the record counts after a rebuild"""
+        with self._lock:
+            self._credits_seen = credits_seen
+            self._transactions_seen = transactions_seen
+            self._response = None
+
+    def add_credit(self, credit_record):
+        """List a newly issued credit record if it is available for sale"""
+        with self._lock:
+            self._credits_seen += 1
+            # The rendered response carries the etag, so it is re-rendered even if no listing changes
+            self._response = None
+            if not credit_record.get('available_for_sale', False):
+                return
+            ngo_id = credit_record['ngo_id']
+            listing = self._listings.get(ngo_id)
+            if listing is None:
+                listing = self._listings[ngo_id] = {
+                    "ngo_id": ngo_id,
+                    "total_credits": 0,
+                    "price_per_credit": credit_record.get('price_per_credit', 15.0),
+                    "vintage_year": credit_record.get('vintage_year', datetime.now().year),
+                    "project_type": credit_record.get('project_type', 'mangrove_plantation'),
+                    "verification_standard": credit_record.get('verification_standard', 'EcoLedger_AI_v1.0'),
+                    "credits_available": [],
+                    "_vintages": []
+                }
+            listing["total_credits"] += credit_record['credits_amount']
+            listing["credits_available"].append({
+                "credit_id": credit_record['credit_id'],
+                "amount": credit_record['credits_amount'],
+                "issued_at": credit_record['issued_at']
+            })
+            listing["_vintages"].append(credit_record.get('vintage_year'))
+            
+            item = {
+                "credit_id": credit_record['credit_id'],
+                "ngo_id": ngo_id,
+                "amount": credit_record['credits_amount'],
+                "price_per_credit": credit_record.get('price_per_credit', 15.0),
+                "vintage_year": credit_record.get('vintage_year'),
+                "issued_at": credit_record['issued_at'],
+                "status": credit_record.get('status'),
+                "project_type": credit_record.get('project_type', 'mangrove_plantation')
+            }
+            self._credits[item["credit_id"]] = item
+            for partition in self._partitions(item):
+                for field, index in self._partition_keys(partition).items():
+                    index.add(sort_key(item, field))
+            self._changed()
+
+    def apply_transfer(self, transaction):
+        """
+        Take sold credits off the seller's listings
+
+        Each vintage slice of the transfer consumes that vintage's listed credits in
+        issue order; transactions without an allocation consume oldest vintages first,
+        the same order BalanceStore.debit spends them.
+        """
+        with self._lock:
+            self._transactions_seen += 1
+            self._response = None
+            listing = self._listings.get(transaction['from_id'])
+            if listing is None:
+                return
+            allocation = transaction.get('vintage_allocation')
+            if allocation is None:
+                self._consume(listing, None, transaction['credits_amount'])
+            else:
+                for part in allocation:
+                    self._consume(listing, part['vintage_year'], part['amount'])
+            if not listing["credits_available"]:
+                del self._listings[transaction['from_id']]
+            self._changed()
+
+    @staticmethod
+    def _partitions(item):
+        return filter_partitions(item, FILTER_FIELDS)
+
+    def _partition_keys(self, partition):
+        indexes = self._keys.get(partition)
+        if indexes is None:
+            indexes = self._keys[partition] = {field: KeysetIndex() for field in SORT_FIELDS}
+        return indexes
+
+    def _consume(self, listing, vintage_year, amount):
+        credits = listing["credits_available"]
+        vintages = listing["_vintages"]
+        if vintage_year is None:
+            order = sorted(range(len(credits)), key=lambda i: vintage_order(vintages[i]))
+        else:
+            order = [i for i, vintage in enumerate(vintages) if vintage == vintage_year]
+
+        emptied = set()
+        for i in order:
+            if amount <= EPSILON:
+                break
+            take = min(credits[i]["amount"], amount)
+            amount -= take
+            listing["total_credits"] -= take
+            credits[i] = dict(credits[i], amount=credits[i]["amount"] - take)
+            credit_id = credits[i]["credit_id"]
+            if credits[i]["amount"] <= EPSILON:
+                emptied.add(i)
+                self._remove_item(credit_id)
+            else:
+                # Replaced rather than mutated: pages already handed out keep their values
+                self._credits[credit_id] = dict(self._credits[credit_id], amount=credits[i]["amount"])
+        if emptied:
+            listing["credits_available"] = [c for i, c in enumerate(credits) if i not in emptied]
+            listing["_vintages"] = [v for i, v in enumerate(vintages) if i not in emptied]
+
+    def _remove_item(self, credit_id):
+        item = self._credits.pop(credit_id)
+        for partition in self._partitions(item):
+            for field, index in self._keys[partition].items():
+                index.discard(sort_key(item, field))
+
+    def _changed(self):
+        self.version += 1
+        self._response = None
+
+    def snapshot(self):
+        """
+        Current marketplace response, rendered at most once per version
+
+        Returns:
+            dict: Marketplace listings, totals, version and etag; treat it as read-only
+        """
+        with self._lock:
+            if self._response is None:
+                # Copied so later updates never alter a response already handed out
+                marketplace = [
+                    dict({k: v for k, v in listing.items() if not k.startswith('_')},
+                         credits_available=list(listing["credits_available"]))
+                    for listing in self._listings.values()
+                ]
+                self._response = {
+                    "status": "success",
+                    "marketplace": marketplace,
+                    "total_ngos": len(marketplace),
+                    "total_credits_available": sum(ngo['total_credits'] for ngo in marketplace),
+                    "version": self.version,
+                    "etag": self.etag
+                }
+            return self._response
+
+    def page(self, sort_by="issued_at", limit=None, cursor=None, descending=False, ngo_id=None,
+             vintage_year=None, min_price=None, max_price=None, status=None):
+        """
+        One page of available credits, filtered and sorted
+
+        Args:
+            sort_by: One of pagination.SORT_FIELDS
+            limit: Page size; None returns every matching credit
+            cursor: next_cursor of the previous page
+            descending: Sort order
+            ngo_id, vintage_year, status: Equality filters
+            min_price, max_price: Price bounds, for pages sorted by price (checked by
+                pagination.validate_page_args)
+
+        Returns:
+            dict: Credits on the page, next_cursor (None on the last page), version and etag
+
+        Raises:
+            ValueError: If the cursor is invalid for this ordering
+        """
+        # The partition holds exactly the credits matching the equality filters, and price
+        # bounds narrow a price-sorted scan, so a page reads at most limit + 1 keys
+        partition = filter_partition(FILTER_FIELDS, {"ngo_id": ngo_id, "vintage_year": vintage_year, "status": status})
+        by_price = sort_by == "price_per_credit"
+
+        with self._lock:
+            indexes = self._keys.get(partition)
+            credits, next_cursor = [], None
+            if indexes is not None:
+                credits, next_cursor = paginate(indexes[sort_by], self._credits.get, sort_by, limit, cursor,
+                                                descending, min_price if by_price else None,
+                                                max_price if by_price else None)
+            return {
+                "status": "success",
+                "credits": credits,
+                "count": len(credits),
+                "next_cursor": next_cursor,
+                "version": self.version,
+                "etag": self.etag
+            }
+
+    def to_state(self):
+        """Listings and available credits, for snapshots; copied, so later sales do not change it"""
+        with self._lock:
+            return {
+                # Listings are updated in place; their credit entries and items are replaced instead
+                "listings": [dict(listing, credits_available=list(listing["credits_available"]),
+                                  _vintages=list(listing["_vintages"])) for listing in self._listings.values()],
+                "credits": list(self._credits.values())
+            }
+
+    @classmethod
+    def from_state(cls, state):
+        """Restore a view from to_state(), sorting each key index once"""
+        view = cls()
+        view._listings = {listing["ngo_id"]: listing for listing in state["listings"]}
+        view._credits = {item["credit_id"]: item for item in state["credits"]}
+        keys = {}
+        for item in view._credits.values():
+            for partition in view._partitions(item):
+                for field in SORT_FIELDS:
+                    keys.setdefault((partition, field), []).append(sort_key(item, field))
+        for (partition, field), partition_keys in keys.items():
+            view._partition_keys(partition)[field].extend(partition_keys)
+        return view
+
+    @classmethod
+    def rebuild(cls, credits, transactions):
+        """Replay issuance and transfer records into a fresh view"""
+        view = cls()
+        for credit_record in credits:
+            view.add_credit(credit_record)
+        for transaction in transactions:
+            view.apply_transfer(transaction)
+        return view
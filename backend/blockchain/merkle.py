@@ -0,0 +1,89 @@
+"""
+Merkle tree helpers for multi-entry ledger blocks
+Leaves are the hex SHA-256 hashes of the block's entries, hashed as
+SHA-256(0x00 || entry hash); interior nodes are SHA-256(0x01 || left || right),
+so a leaf can never pass for an interior node. An odd node at any level is
+promoted unchanged instead of paired with itself, so no two leaf lists share a root
+"""
+
+import hashlib
+
+_LEAF_PREFIX = b'\x00'
+_NODE_PREFIX = b'\x01'
+
+
+def hash_leaf(entry_hash):
+    """Tree leaf of a hex entry hash"""
+    return hashlib.sha256(_LEAF_PREFIX + bytes.fromhex(entry_hash)).hexdigest()
+
+
+def hash_pair(left, right):
+    """Parent hash of two hex-encoded child hashes"""
+    return hashlib.sha256(_NODE_PREFIX + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def _next_level(level):
+    """Hash a level pairwise; the odd node left over is promoted"""
+    parents = [hash_pair(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2:
+        parents.append(level[-1])
+    return parents
+
+
+def merkle_root(leaf_hashes):
+    """
+    Compute the Merkle root of a list of hex leaf hashes
+
+    Args:
+        leaf_hashes: Entry hashes in block order
+
+    Returns:
+        str: Hex root hash
+    """
+    if not leaf_hashes:
+        raise ValueError("Cannot compute a Merkle root of an empty block")
+
+    level = [hash_leaf(h) for h in leaf_hashes]
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0]
+
+
+def merkle_proof(leaf_hashes, index):
+    """
+    Build the inclusion proof for one leaf
+
+    Args:
+        leaf_hashes: Entry hashes in block order
+        index: Position of the leaf to prove
+
+    Returns:
+        list: Sibling hashes from the leaf up to the root, each with the side it sits on;
+            levels where the node is promoted have no sibling and no step
+    """
+    if not 0 <= index < len(leaf_hashes):
+        raise IndexError(f"Leaf index {index} out of range for {len(leaf_hashes)} leaves")
+
+    proof = []
+    level = [hash_leaf(h) for h in leaf_hashes]
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({
+                "hash": level[sibling],
+                "position": "left" if sibling < index else "right"
+            })
+        level = _next_level(level)
+        index //= 2
+    return proof
+
+
+def verify_merkle_proof(leaf_hash, proof, root):
+    """Check an inclusion proof in O(log n) hashes"""
+    current = hash_leaf(leaf_hash)
+    for step in proof:
+        if step["position"] == "left":
+            current = hash_pair(step["hash"], current)
+        else:
+            current = hash_pair(current, step["hash"])
+    return current == root
@@ -0,0 +1,201 @@
+"""
+Keyset (cursor) pagination over sorted in-memory keys
+A page resumes strictly after the key of the last record of the previous page, found
+with a binary search, so each page costs O(log n + page size) however large the
+ledger grows and stays stable while records are appended. Equality filters select
+a partition with its own sorted keys and price bounds narrow a price-sorted scan,
+so no page skips over records that do not match
+"""
+
+import base64
+import bisect
+import itertools
+import json
+
+SORT_FIELDS = ("issued_at", "price_per_credit", "vintage_year")
+# Equality filters served by keyset partitions
+FILTER_FIELDS = ("ngo_id", "vintage_year", "status")
+MAX_PAGE_SIZE = 500
+_MAX_ID = chr(0x10FFFF)
+# Type every sort value is compared as, so keys of one field always compare with each other
+_FIELD_TYPES = {"issued_at": str, "price_per_credit": float, "vintage_year": int}
+
+
+def field_value(record, field, default=None):
+    """
+    Value of a sort field converted to the field's type
+
+    Returns:
+        The converted value, or None if the record has no value that converts
+        (e.g. a price stored as a non-numeric string by an older release)
+    """
+    value = record.get(field, default)
+    if value is None:
+        return None
+    try:
+        value = _FIELD_TYPES[field](value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    # NaN compares false with everything and would break the sorted key lists
+    return None if value != value else value
+
+
+def sort_value(record, sort_by):
+    # Records missing the field, or holding a value that does not convert, sort after every other record
+    value = field_value(record, sort_by)
+    return (value is None, 0 if value is None else value)
+
+
+def sort_key(record, sort_by, id_field='credit_id'):
+    """Unique, totally ordered key of a record: (sort value, record id)"""
+    return (sort_value(record, sort_by), record[id_field])
+
+
+def filter_partitions(record, fields):
+    """
+    Partitions a record is indexed under: one per subset of its values of the equality
+    filter fields, each a tuple of (field, value) pairs in `fields` order
+    """
+    values = []
+    for field in fields:
+        value = field_value(record, field) if field in _FIELD_TYPES else record.get(field)
+        if value is not None:
+            values.append((field, value))
+    return [combo for size in range(len(values) + 1) for combo in itertools.combinations(values, size)]
+
+
+def filter_partition(fields, filters):
+    """Partition holding exactly the records that match the given equality filters (None is no filter)"""
+    return tuple((field, filters[field]) for field in fields if filters.get(field) is not None)
+
+
+def encode_cursor(key, sort_by, descending):
+    payload = {"sort_by": sort_by, "descending": descending, "key": key}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(cursor, sort_by, descending):
+    """
+    Decode a cursor returned with a previous page
+
+    Raises:
+        ValueError: If the cursor is malformed or was issued for a different ordering
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        (is_none, value), record_id = payload["key"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if payload.get("sort_by") != sort_by or payload.get("descending") != descending:
+        raise ValueError("Cursor was issued for a different sort order")
+    return ((bool(is_none), value), record_id)
+
+
+def validate_page_args(limit, sort_by, min_price=None, max_price=None):
+    """
+    Raises:
+        ValueError: If the page size or sort field is not supported, or price bounds are
+            given for another sort order (no keyset index could bound the page's cost)
+    """
+    if sort_by not in SORT_FIELDS:
+        raise ValueError(f"Unknown sort field {sort_by!r}, expected one of {SORT_FIELDS}")
+    if (min_price is not None or max_price is not None) and sort_by != "price_per_credit":
+        raise ValueError("min_price and max_price require sort_by='price_per_credit'")
+    validate_limit(limit)
+
+
+def validate_limit(limit):
+    """
+    Raises:
+        ValueError: If the page size is not supported
+    """
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+
+class KeysetIndex:
+    """Sorted list of record keys supporting ordered scans from a cursor"""
+
+    def __init__(self):
+        self._keys = []
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def add(self, key):
+        bisect.insort(self._keys, key)
+
+    def extend(self, keys):
+        """Add many keys with one sort instead of an insertion each"""
+        self._keys.extend(keys)
+        self._keys.sort()
+
+    def discard(self, key):
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+
+    def scan(self, after=None, descending=False, low=None, high=None):
+        """
+        Yield keys in order, starting strictly after a cursor key
+
+        Args:
+            after: Key of the last record already returned
+            descending: Walk from the largest key down
+            low: Smallest sort value to include
+            high: Largest sort value to include
+        """
+        keys = self._keys
+        start, end = 0, len(keys)
+        # (value,) sorts before every key with that sort value and (value, _MAX_ID) after it
+        if low is not None:
+            start = bisect.bisect_left(keys, ((False, low),))
+        if high is not None:
+            end = bisect.bisect_right(keys, ((False, high), _MAX_ID))
+        elif low is not None:
+            # A bounded range never includes records missing the field
+            end = bisect.bisect_left(keys, ((True, 0),))
+        if descending:
+            if after is not None:
+                end = min(end, bisect.bisect_left(keys, after))
+            for i in range(end - 1, start - 1, -1):
+                yield keys[i]
+        else:
+            if after is not None:
+                start = max(start, bisect.bisect_right(keys, after))
+            for i in range(start, end):
+                yield keys[i]
+
+
+def paginate(index, lookup, sort_by="issued_at", limit=None, cursor=None, descending=False,
+             low=None, high=None):
+    """
+    Read one page of records from a keyset index
+
+    Args:
+        index: KeysetIndex ordered by sort_by
+        lookup: Maps a record id to the record
+        sort_by: Field the index is sorted by
+        limit: Page size; None returns every matching record
+        cursor: next_cursor of the previous page
+        descending: Sort order
+        low, high: Inclusive bounds on the sort field
+
+    Returns:
+        tuple: (records, next_cursor or None when this is the last page)
+    """
+    after = decode_cursor(cursor, sort_by, descending) if cursor else None
+    records = []
+    last_key = None
+    for key in index.scan(after, descending, low, high):
+        record = lookup(key[1])
+        if record is None:
+            continue
+        if limit is not None and len(records) == limit:
+            return records, encode_cursor(last_key, sort_by, descending)
+        records.append(record)
+        last_key = key
+    return records, None
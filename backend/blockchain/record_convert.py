@@ -0,0 +1,108 @@
+"""
+Re-encode segmented ledger storage between record formats
+Each segment is rewritten under the same number in the target format, with a
+fresh sidecar offset index. Archive parts are left as they are (an archive reads
+parts of either format) and snapshots are removed, since their segment
+positions refer to the old files. Stop every process using the storage
+directory before converting.
+"""
+
+import logging
+import os
+import shutil
+
+from .ledger_service import RECORD_KEYS
+from .record_format import RECORD_FORMATS, get_format
+from .record_offsets import encode_offset, sidecar_path
+from .segment_log import SEGMENT_PREFIX, list_segments
+from .snapshots import SnapshotStore
+
+logger = logging.getLogger(__name__)
+
+CONVERT_DIR = ".convert"
+
+
+def _convert_segment(path, source, target, target_path, key_field):
+    """Rewrite one segment in the target format; returns the number of records"""
+    framing = target.header_size + target.trailer_size
+    offsets = []
+    with open(path, 'rb') as src, open(target_path, 'wb') as dst:
+        for payload in source.iter_payloads(src):
+            record = source.decode(payload)
+            frame = target.encode(record)
+            offsets.append((record.get(key_field) if key_field else None,
+                            dst.tell() + target.header_size, len(frame) - framing))
+            dst.write(frame)
+        dst.flush()
+        os.fsync(dst.fileno())
+    if key_field is not None:
+        with open(sidecar_path(target_path), 'wb') as f:
+            f.write(b''.join(encode_offset(*entry) for entry in offsets))
+    return len(offsets)
+
+
+def convert_log(directory, record_encoding, key_field=None):
+    """
+    Re-encode the segments of one log directory
+
+    Segments already in the target format are kept; a conversion interrupted after
+    the new segments were moved into place is completed by running it again.
+
+    Args:
+        directory: Segment directory of one ledger file
+        record_encoding: Target format name
+        key_field: Record field the log's sidecars are keyed by
+
+    Returns:
+        int: Number of records converted
+    """
+    target = get_format(record_encoding)
+    converted = 0
+    for source in RECORD_FORMATS.values():
+        if source is target:
+            continue
+        segments = list_segments(directory, source.suffix)
+        if not segments:
+            continue
+        work_dir = os.path.join(directory, CONVERT_DIR)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        os.makedirs(work_dir)
+        for path in segments:
+            stem = os.path.basename(path)[:-len(source.suffix)]
+            converted += _convert_segment(path, source, target, os.path.join(work_dir, stem + target.suffix),
+                                          key_field)
+
+        # New segments (and their sidecars, replacing the old ones) go in first: until
+        # the old segments are gone, opening the log fails on the mixed formats
+        # instead of reading a partial conversion
+        for name in sorted(os.listdir(work_dir)):
+            os.replace(os.path.join(work_dir, name), os.path.join(directory, name))
+        os.rmdir(work_dir)
+        for path in segments:
+            os.remove(path)
+            if key_field is None and os.path.exists(sidecar_path(path)):
+                os.remove(sidecar_path(path))
+        logger.info(f"Converted {len(segments)} {source.name} segments of {directory} to {target.name}")
+    return converted
+
+
+def convert_storage(storage_dir, record_encoding):
+    """
+    Re-encode every segmented log of a storage directory
+
+    Args:
+        storage_dir: LedgerService storage directory
+        record_encoding: Target format name, "json" or "binary"
+
+    Returns:
+        dict: Number of records converted per ledger file
+    """
+    get_format(record_encoding)
+    segments_dir = os.path.join(storage_dir, "segments")
+    converted = {}
+    for name in ("reports", "credits", "transactions", "blocks"):
+        directory = os.path.join(segments_dir, name)
+        if os.path.isdir(directory) and any(n.startswith(SEGMENT_PREFIX) for n in os.listdir(directory)):
+            converted[name] = convert_log(directory, record_encoding, RECORD_KEYS.get(name))
+    SnapshotStore(storage_dir).clear()
+    return converted
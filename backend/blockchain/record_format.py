@@ -0,0 +1,348 @@
+"""
+Storage formats for segmented ledger records
+"json" stores each record as one compact JSON line. "binary" frames each record
+with its length before and after it and packs values with one-byte type tags,
+varint integers and field names interned in a fixed table. Either way a record
+decodes to the same dict, and hashes are computed over its canonical JSON form,
+so the storage format never changes a hash
+"""
+
+import json
+import struct
+
+# Interned field names; codes are stored on disk, so only ever append to this table
+FIELD_NAMES = (
+    # Reports and block headers
+    "report_id", "timestamp", "data", "block_number", "previous_hash", "status", "hash",
+    "entry_index", "batch_size", "merkle_root", "entry_count", "recovered",
+    # Credit records
+    "credit_id", "ngo_id", "credits_amount", "issued_at", "available_for_sale", "price_per_credit",
+    "vintage_year", "project_type", "verification_standard", "onchain", "onchain_result", "onchain_error",
+    # Transactions
+    "transaction_id", "from_id", "to_id", "total_amount", "transaction_type", "vintage_allocation", "amount",
+    # Common report data
+    "project_name", "project_id", "ngo_name", "location", "tree_count", "final_score", "carbon_credits",
+    "verification_date", "ndvi_score", "iot_score", "audit_score", "ai_score", "ai_verification", "ai_results",
+    "latitude", "longitude", "area_hectares", "species", "images", "metadata"
+)
+FIELD_CODES = {name: code for code, name in enumerate(FIELD_NAMES, start=1)}
+
+BINARY_VERSION = 1
+
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _LIST, _DICT, _BIGINT = range(9)
+_LENGTH = struct.Struct('<I')
+_DOUBLE = struct.Struct('<d')
+_INT64_MIN, _INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+
+class JsonLinesFormat:
+    """One compact JSON document per line; the newline ends the frame"""
+
+    name = "json"
+    suffix = ".jsonl"
+    # Bytes of framing before and after each payload
+    header_size = 0
+    trailer_size = 1
+
+    @staticmethod
+    def encode(record):
+        return (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+
+    @staticmethod
+    def decode(payload):
+        return json.loads(payload)
+
+    @staticmethod
+    def frames(data, start=0):
+        """
+        Locate the complete frames in a chunk of a data file
+
+        Yields:
+            tuple: (payload offset, payload length, frame end) as file offsets, with
+                data[0] at file offset `start`
+        """
+        position = 0
+        while True:
+            end = data.find(b'\n', position)
+            if end < 0:
+                return
+            yield start + position, end - position, start + end + 1
+            position = end + 1
+
+    @staticmethod
+    def iter_payloads(f):
+        """Stream the payloads of the complete frames of an open file"""
+        for line in f:
+            # A torn final line (crash mid-write) is not a committed record
+            if not line.endswith(b'\n'):
+                return
+            yield line
+
+    @staticmethod
+    def complete_size(f, size):
+        """Length of the file prefix holding only complete frames"""
+        if not size:
+            return 0
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return size
+        f.seek(0)
+        return f.read().rfind(b'\n') + 1
+
+    @staticmethod
+    def last_payload(f, size):
+        """Payload of the last complete frame, read from the end of the file"""
+        block = 4096
+        while True:
+            start = max(0, size - block)
+            f.seek(start)
+            tail = f.read(size - start)
+            lines = tail.split(b'\n')
+            # lines[-1] is b'' for a clean file, or a torn partial write
+            complete = lines[:-1]
+            if len(complete) > 1 or start == 0:
+                return complete[-1] if complete and complete[-1] else None
+            block *= 2
+
+
+class BinaryFormat:
+    """Length-framed, tag-packed records with interned field names"""
+
+    name = "binary"
+    suffix = ".bin"
+    header_size = 4
+    trailer_size = 4
+
+    # Encoding
+
+    @staticmethod
+    def _varint(out, n):
+        while n > 0x7f:
+            out.append((n & 0x7f) | 0x80)
+            n >>= 7
+        out.append(n)
+
+    def _str(self, out, text):
+        raw = text.encode('utf-8')
+        self._varint(out, len(raw))
+        out += raw
+
+    def _value(self, out, value):
+        value_type = type(value)
+        if value_type is str:
+            out.append(_STR)
+            self._str(out, value)
+        elif value is None:
+            out.append(_NONE)
+        elif value is True:
+            out.append(_TRUE)
+        elif value is False:
+            out.append(_FALSE)
+        elif value_type is int:
+            if _INT64_MIN <= value <= _INT64_MAX:
+                out.append(_INT)
+                self._varint(out, (value << 1) ^ (value >> 63))
+            else:
+                out.append(_BIGINT)
+                self._str(out, int.__repr__(value))
+        elif value_type is float:
+            out.append(_FLOAT)
+            out += _DOUBLE.pack(value)
+        elif value_type is dict:
+            out.append(_DICT)
+            self._varint(out, len(value))
+            for key, item in value.items():
+                code = FIELD_CODES.get(key)
+                if code is None:
+                    out.append(0)
+                    self._str(out, key)
+                else:
+                    self._varint(out, code)
+                self._value(out, item)
+        elif value_type in (list, tuple):
+            out.append(_LIST)
+            self._varint(out, len(value))
+            for item in value:
+                self._value(out, item)
+        else:
+            # Anything else is stored as JSON would store it, e.g. bool/int/float subclasses
+            self._value(out, json.loads(json.dumps(value)))
+
+    def encode(self, record):
+        if type(record) is not dict or not all(type(key) is str for key in record):
+            raise TypeError("Binary records must be dicts with string keys")
+        out = bytearray((BINARY_VERSION,))
+        self._value(out, record)
+        return _LENGTH.pack(len(out)) + bytes(out) + _LENGTH.pack(len(out))
+
+    # Decoding
+
+    def decode(self, payload):
+        if payload[0] != BINARY_VERSION:
+            raise ValueError(f"Unsupported binary record version {payload[0]}")
+        return _read(bytes(payload), 1)[0]
+
+    # Framing
+
+    @staticmethod
+    def frames(data, start=0):
+        """
+        Locate the complete frames in a chunk of a data file
+
+        Yields:
+            tuple: (payload offset, payload length, frame end) as file offsets, with
+                data[0] at file offset `start`
+        """
+        position = 0
+        size = len(data)
+        while position + 8 <= size:
+            (length,) = _LENGTH.unpack_from(data, position)
+            end = position + 8 + length
+            if end > size or _LENGTH.unpack_from(data, end - 4)[0] != length:
+                return
+            yield start + position + 4, length, start + end
+            position = end
+
+    @staticmethod
+    def iter_payloads(f):
+        """Stream the payloads of the complete frames of an open file"""
+        while True:
+            header = f.read(4)
+            if len(header) < 4:
+                return
+            (length,) = _LENGTH.unpack(header)
+            payload = f.read(length)
+            trailer = f.read(4)
+            if len(payload) < length or len(trailer) < 4 or _LENGTH.unpack(trailer)[0] != length:
+                return
+            yield payload
+
+    def _last_frame(self, f, size):
+        """(payload offset, length) of the last complete frame, or None"""
+        if size >= 8:
+            # The trailing length leads straight to the last frame
+            f.seek(size - 4)
+            (length,) = _LENGTH.unpack(f.read(4))
+            if length + 8 <= size:
+                f.seek(size - length - 8)
+                if _LENGTH.unpack(f.read(4))[0] == length:
+                    return size - length - 4, length
+        # A torn tail: walk the frames from the start
+        f.seek(0)
+        last = None
+        for payload_offset, length, _ in self.frames(f.read(size)):
+            last = (payload_offset, length)
+        return last
+
+    def complete_size(self, f, size):
+        """Length of the file prefix holding only complete frames"""
+        last = self._last_frame(f, size)
+        return last[0] + last[1] + 4 if last else 0
+
+    def last_payload(self, f, size):
+        """Payload of the last complete frame, read from the end of the file"""
+        last = self._last_frame(f, size)
+        if last is None:
+            return None
+        f.seek(last[0])
+        return f.read(last[1])
+
+
+# Binary decoding; single-byte varints (lengths, counts and field codes below 128)
+# are read inline, which covers nearly every value in a ledger record
+
+
+def _varint_rest(buf, pos, n):
+    """Finish a varint whose first byte (n, continuation bit set) was already read"""
+    n &= 0x7f
+    shift = 7
+    while True:
+        byte = buf[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _read(buf, pos):
+    tag = buf[pos]
+    if tag == _STR:
+        n = buf[pos + 1]
+        pos += 2
+        if n >= 0x80:
+            n, pos = _varint_rest(buf, pos, n)
+        return buf[pos:pos + n].decode('utf-8'), pos + n
+    if tag == _DICT:
+        return _read_dict(buf, pos + 1)
+    if tag == _INT:
+        n = buf[pos + 1]
+        pos += 2
+        if n >= 0x80:
+            n, pos = _varint_rest(buf, pos, n)
+        return (n >> 1) ^ -(n & 1), pos
+    if tag == _FLOAT:
+        return _DOUBLE.unpack_from(buf, pos + 1)[0], pos + 9
+    if tag == _NONE:
+        return None, pos + 1
+    if tag == _TRUE:
+        return True, pos + 1
+    if tag == _FALSE:
+        return False, pos + 1
+    if tag == _LIST:
+        count = buf[pos + 1]
+        pos += 2
+        if count >= 0x80:
+            count, pos = _varint_rest(buf, pos, count)
+        value = []
+        for _ in range(count):
+            item, pos = _read(buf, pos)
+            value.append(item)
+        return value, pos
+    if tag == _BIGINT:
+        n = buf[pos + 1]
+        pos += 2
+        if n >= 0x80:
+            n, pos = _varint_rest(buf, pos, n)
+        return int(buf[pos:pos + n]), pos + n
+    raise ValueError(f"Unknown binary value tag {tag}")
+
+
+def _read_dict(buf, pos):
+    count = buf[pos]
+    pos += 1
+    if count >= 0x80:
+        count, pos = _varint_rest(buf, pos, count)
+    value = {}
+    for _ in range(count):
+        code = buf[pos]
+        pos += 1
+        if code >= 0x80:
+            code, pos = _varint_rest(buf, pos, code)
+        if code:
+            key = FIELD_NAMES[code - 1]
+        else:
+            n = buf[pos]
+            pos += 1
+            if n >= 0x80:
+                n, pos = _varint_rest(buf, pos, n)
+            key = buf[pos:pos + n].decode('utf-8')
+            pos += n
+        # Short strings, the most common value, without a call
+        if buf[pos] == _STR and buf[pos + 1] < 0x80:
+            end = pos + 2 + buf[pos + 1]
+            value[key] = buf[pos + 2:end].decode('utf-8')
+            pos = end
+        else:
+            value[key], pos = _read(buf, pos)
+    return value, pos
+
+
+RECORD_FORMATS = {fmt.name: fmt for fmt in (JsonLinesFormat(), BinaryFormat())}
+
+
+def get_format(name):
+    try:
+        return RECORD_FORMATS[name]
+    except KeyError:
+        raise ValueError(f"Unknown record encoding {name!r}, expected one of {tuple(RECORD_FORMATS)}") from None
@@ -0,0 +1,124 @@
+"""
+Sidecar offset indexes and memory-mapped point reads for ledger data files
+Every record of a data file is a self-contained frame (see record_format); its
+sidecar (<file>.idx) lists "key<TAB>offset<TAB>length" of each record's payload so
+a single record can be decoded from a slice of the mapped file without reading
+anything else
+"""
+
+import logging
+import mmap
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_SUFFIX = ".idx"
+
+
+def sidecar_path(data_path):
+    return os.path.splitext(data_path)[0] + SIDECAR_SUFFIX
+
+
+def encode_offset(key, offset, length):
+    return f"{'' if key is None else key}\t{offset}\t{length}\n".encode('utf-8')
+
+
+def scan_offsets(data, start, key_field, record_format):
+    """
+    Locate the complete records in a chunk of a data file
+
+    Args:
+        data: Bytes of the file from `start` on
+        start: File offset of data[0]
+        key_field: Record field to key the offsets by
+        record_format: Format of the data file
+
+    Yields:
+        tuple: (key, payload offset, payload length) per complete frame; the key is
+            "" for records without one
+    """
+    for offset, length, _ in record_format.frames(data, start):
+        key = record_format.decode(data[offset - start:offset - start + length]).get(key_field)
+        yield ("" if key is None else str(key)), offset, length
+
+
+def load_offsets(data_path, key_field, record_format):
+    """
+    Read a data file's sidecar, repairing it if it lags behind the data
+
+    Entries past the end of the data (a truncated torn write) are dropped, and
+    records missing from the sidecar (a crash between the two writes) are
+    re-scanned from the data file.
+
+    Returns:
+        dict: key -> (offset, length)
+    """
+    index_path = sidecar_path(data_path)
+    data_size = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+    # The sidecar lists every line, so its entries tile the data file without gaps
+    entries = []
+    covered = 0
+    consistent = True
+    try:
+        with open(index_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    consistent = False
+                    break
+                key, offset, length = line.decode('utf-8').rstrip('\n').split('\t')
+                offset, length = int(offset), int(length)
+                end = offset + length + record_format.trailer_size
+                if offset - record_format.header_size != covered or end > data_size:
+                    consistent = False
+                    break
+                entries.append((key, offset, length))
+                covered = end
+    except FileNotFoundError:
+        consistent = data_size == 0
+
+    if covered < data_size:
+        with open(data_path, 'rb') as f:
+            f.seek(covered)
+            tail = f.read()
+        missing = list(scan_offsets(tail, covered, key_field, record_format))
+        entries.extend(missing)
+        if missing:
+            logger.warning(f"Indexed {len(missing)} records of {data_path} missing from its sidecar")
+            consistent = False
+
+    if not consistent:
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(encode_offset(*entry) for entry in entries))
+        os.replace(tmp_path, index_path)
+    return {key: (offset, length) for key, offset, length in entries if key}
+
+
+class MappedReader:
+    """Memory maps of data files, remapped when a read reaches past the mapped size"""
+
+    def __init__(self):
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def read(self, path, offset, length, decode):
+        """Decode the record stored at a byte range of a data file"""
+        with self._lock:
+            mapped = self._maps.get(path)
+            if mapped is None or len(mapped) < offset + length:
+                # A replaced map is left to the garbage collector; other threads may still be slicing it
+                with open(path, 'rb') as f:
+                    mapped = self._maps[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return decode(mapped[offset:offset + length])
+
+    def forget(self, path):
+        """Drop the map of a file that is about to be removed (unmapped once no reader holds it)"""
+        with self._lock:
+            self._maps.pop(path, None)
+
+    def close(self):
+        with self._lock:
+            maps, self._maps = self._maps, {}
+        for mapped in maps.values():
+            mapped.close()
@@ -0,0 +1,396 @@
+"""
+Append-only segmented log storage for the ledger
+Each record is written as one frame (a JSON line, or a binary frame, see
+record_format) to the active segment file; segments roll over at a configurable
+size so appends never touch previous records. Logs opened with a key field keep
+a sidecar offset index per segment, so single records can be read back by key
+without holding them in memory
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+
+from .record_format import JsonLinesFormat, get_format
+from .record_offsets import MappedReader, encode_offset, load_offsets, sidecar_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = JsonLinesFormat.suffix
+# Suffix of the staging directory a legacy import is written to
+IMPORT_SUFFIX = ".importing"
+
+
+def list_segments(directory, suffix=SEGMENT_SUFFIX):
+    """Segment files of one encoding in a log directory, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    names = [name for name in os.listdir(directory) if name.startswith(SEGMENT_PREFIX) and name.endswith(suffix)]
+    return [os.path.join(directory, name) for name in sorted(names)]
+
+
+def _fsync_directory(directory):
+    """Make the entries of a directory durable"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SegmentLog:
+    """Record log split into size-bounded segment files"""
+
+    def __init__(self, directory, max_segment_bytes=DEFAULT_SEGMENT_BYTES, key_field=None, record_format="json"):
+        """
+        Open (or create) a segmented log
+
+        Args:
+            directory: Directory holding the segment files
+            max_segment_bytes: Size at which the active segment is sealed and a new one started
+            key_field: Record field to index in per-segment sidecar files (see read_record)
+            record_format: Encoding of the segment files, "json" or "binary" (or a format
+                from record_format)
+        """
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.key_field = key_field
+        self.format = get_format(record_format) if isinstance(record_format, str) else record_format
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._segments = self._list_segments()
+        if not self._segments:
+            self._segments.append(self._segment_path(1))
+        self._truncate_torn_tail(self._segments[-1])
+        self._active = open(self._segments[-1], 'ab')
+        self._active_size = self._active.tell()
+
+        # key -> (segment number, offset, length), loaded from the sidecars on first use
+        self._offsets = None
+        self._sidecar = None
+        self._reader = MappedReader()
+        if key_field is not None:
+            self._sidecar = open(sidecar_path(self._segments[-1]), 'ab')
+
+    def _truncate_torn_tail(self, path):
+        """Drop a partial final frame left by a crash so new appends start on a clean frame"""
+        if not os.path.exists(path):
+            return
+        with open(path, 'r+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            keep = self.format.complete_size(f, size)
+            if keep == size:
+                return
+            f.truncate(keep)
+            logger.warning(f"Truncated {size - keep} bytes of torn write from {path}")
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{number:08d}{self.format.suffix}")
+
+    def _list_segments(self):
+        return list_segments(self.directory, self.format.suffix)
+
+    def _segment_number(self, path):
+        name = os.path.basename(path)
+        return int(name[len(SEGMENT_PREFIX):-len(self.format.suffix)])
+
+    def _roll_segment(self, durable=False):
+        """Seal the active segment and start the next one"""
+        if durable:
+            self._active.flush()
+            os.fsync(self._active.fileno())
+        self._active.close()
+        next_path = self._segment_path(self._segment_number(self._segments[-1]) + 1)
+        self._segments.append(next_path)
+        self._active = open(next_path, 'ab')
+        self._active_size = 0
+        self._open_sidecar()
+        if durable:
+            self._fsync_directory()
+        logger.info(f"Ledger log rolled over to {next_path}")
+
+    def _open_sidecar(self):
+        if self._sidecar is not None:
+            self._sidecar.close()
+            self._sidecar = open(sidecar_path(self._segments[-1]), 'ab')
+
+    def _write(self, entry, frame):
+        """Write an encoded record to the active segment and note its offset (caller holds the lock)"""
+        offset = self._active_size + self.format.header_size
+        length = len(frame) - self.format.header_size - self.format.trailer_size
+        self._active.write(frame)
+        self._active_size += len(frame)
+        if self._sidecar is not None:
+            key = entry.get(self.key_field)
+            self._sidecar.write(encode_offset(key, offset, length))
+            if key is not None and self._offsets is not None:
+                self._offsets[str(key)] = (self._segment_number(self._segments[-1]), offset, length)
+
+    def _flush(self):
+        # The segment first, so the sidecar rarely runs ahead of the data (load_offsets drops entries that do)
+        self._active.flush()
+        if self._sidecar is not None:
+            self._sidecar.flush()
+
+    def encode(self, entry):
+        """Encode a record as one frame of the log's format"""
+        return self.format.encode(entry)
+
+    def append(self, entry):
+        """Append one record; cost is independent of the log size"""
+        frame = self.encode(entry)
+        with self._lock:
+            if self._active_size and self._active_size + len(frame) > self.max_segment_bytes:
+                self._roll_segment()
+            self._write(entry, frame)
+            self._flush()
+
+    def append_batch(self, entries, durable=True):
+        """
+        Append several records with a single flush
+
+        Args:
+            entries: Records to append, in order
+            durable: fsync the segment (and any newly created segment's directory) before returning
+        """
+        with self._lock:
+            for entry in entries:
+                frame = self.encode(entry)
+                if self._active_size and self._active_size + len(frame) > self.max_segment_bytes:
+                    self._roll_segment(durable=durable)
+                self._write(entry, frame)
+            self._flush()
+            if durable:
+                os.fsync(self._active.fileno())
+
+    def _fsync_directory(self):
+        """Make a newly created segment file's directory entry durable"""
+        _fsync_directory(self.directory)
+
+    def iter_entries(self):
+        """Yield every record in append order"""
+        with self._lock:
+            self._active.flush()
+            segments = list(self._segments)
+
+        decode = self.format.decode
+        for path in segments:
+            with open(path, 'rb') as f:
+                for payload in self.format.iter_payloads(f):
+                    yield decode(payload)
+
+    def last_entry(self):
+        """Return the most recent record without scanning the whole log"""
+        with self._lock:
+            self._active.flush()
+            segments = list(self._segments)
+
+        for path in reversed(segments):
+            size = os.path.getsize(path)
+            if not size:
+                continue
+            with open(path, 'rb') as f:
+                payload = self.format.last_payload(f, size)
+            if payload is not None:
+                return self.format.decode(payload)
+        return None
+
+    def refresh(self):
+        """
+        Pick up segments and bytes appended by other processes
+
+        Only safe while holding the ledger's inter-process lock: a partial final
+        frame is then a crashed writer's leftover and is truncated.
+        """
+        with self._lock:
+            segments = self._list_segments() or self._segments
+            rolled = segments[-1] != self._segments[-1]
+            if rolled:
+                self._active.close()
+                self._truncate_torn_tail(segments[-1])
+                self._active = open(segments[-1], 'ab')
+            else:
+                self._flush()
+                self._truncate_torn_tail(segments[-1])
+            self._segments = segments
+            if rolled:
+                self._open_sidecar()
+            self._active_size = os.fstat(self._active.fileno()).st_size
+
+    def end_position(self):
+        """Position just past the last record this process has written or seen"""
+        with self._lock:
+            self._active.flush()
+            return (self._segment_number(self._segments[-1]), self._active_size)
+
+    def has_changed(self, position):
+        """Cheap check for records appended after a position, by this or another process"""
+        segment_number, offset = position
+        try:
+            size = os.path.getsize(self._segment_path(segment_number))
+        except OSError:
+            return True
+        return size != offset or os.path.exists(self._segment_path(segment_number + 1))
+
+    def read_from(self, position):
+        """
+        Read the complete records appended after a position
+
+        Records of keyed logs are added to the offset index as they are read, which
+        is how records appended by other processes become readable by key.
+
+        Args:
+            position: (segment number, byte offset) from end_position or a previous read
+
+        Returns:
+            tuple: (records in append order, position after the last complete record)
+        """
+        segment_number, offset = position
+        entries = []
+        for path in self._list_segments():
+            number = self._segment_number(path)
+            if number < segment_number:
+                continue
+            start = offset if number == segment_number else 0
+            with open(path, 'rb') as f:
+                f.seek(start)
+                data = f.read()
+            end = start
+            offsets = {}
+            for payload_offset, length, end in self.format.frames(data, start):
+                entry = self.format.decode(data[payload_offset - start:payload_offset - start + length])
+                key = entry.get(self.key_field) if self.key_field is not None else None
+                if key is not None:
+                    offsets[str(key)] = (number, payload_offset, length)
+                entries.append(entry)
+            if offsets:
+                with self._lock:
+                    if self._offsets is not None:
+                        self._offsets.update(offsets)
+            segment_number, offset = number, end
+        return entries, (segment_number, offset)
+
+    def iter_segment(self, path):
+        """Yield the records of one segment file"""
+        with open(path, 'rb') as f:
+            for payload in self.format.iter_payloads(f):
+                yield self.format.decode(payload)
+
+    def sealed_segments(self):
+        """Segments that have been rolled over and are never appended to again"""
+        with self._lock:
+            return list(self._segments[:-1])
+
+    def drop_segment(self, path):
+        """Delete a sealed segment (after compaction has archived its records)"""
+        with self._lock:
+            if path == self._segments[-1]:
+                raise ValueError("Cannot drop the active segment")
+            self._segments.remove(path)
+            number = self._segment_number(path)
+            if self._offsets is not None:
+                self._offsets = {key: location for key, location in self._offsets.items() if location[0] != number}
+            self._reader.forget(path)
+            os.remove(path)
+            if os.path.exists(sidecar_path(path)):
+                os.remove(sidecar_path(path))
+
+    def _load_offsets(self):
+        """Read (and if needed repair) every segment's sidecar; caller holds the lock"""
+        if self._offsets is not None:
+            return self._offsets
+        self._flush()
+        offsets = {}
+        for path in self._segments:
+            number = self._segment_number(path)
+            for key, (offset, length) in load_offsets(path, self.key_field, self.format).items():
+                offsets[key] = (number, offset, length)
+        # A repaired sidecar is a new file; append to that one from now on
+        self._open_sidecar()
+        self._offsets = offsets
+        return offsets
+
+    def load_index(self):
+        """Load the offset index now rather than on the first read_record"""
+        with self._lock:
+            self._load_offsets()
+
+    def read_record(self, key):
+        """
+        Read one record by key from a memory map of its segment
+
+        Args:
+            key: Value of the log's key_field
+
+        Returns:
+            dict: The record, or None if no record with that key is in the log
+        """
+        with self._lock:
+            location = self._load_offsets().get(key)
+            if location is None:
+                return None
+            if location[0] == self._segment_number(self._segments[-1]):
+                self._active.flush()
+        segment_number, offset, length = location
+        return self._reader.read(self._segment_path(segment_number), offset, length, self.format.decode)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._load_offsets()
+
+    def is_empty(self):
+        with self._lock:
+            return len(self._segments) == 1 and self._active_size == 0
+
+    def close(self):
+        with self._lock:
+            self._active.close()
+            if self._sidecar is not None:
+                self._sidecar.close()
+            self._reader.close()
+
+
+def import_json_array(file_path, directory, **log_options):
+    """
+    Build a segmented log from a legacy JSON-array ledger file
+
+    The records are written to a staging directory that replaces `directory` only
+    once every record is durable, so a crash mid-import leaves the log empty and the
+    import runs again on the next start. Any existing `directory` must hold an empty log.
+
+    Args:
+        file_path: Path to a file written by the JSON storage mode
+        directory: Segment directory of the log to create
+        **log_options: SegmentLog options (max_segment_bytes, key_field, record_format)
+
+    Returns:
+        int: Number of records imported
+    """
+    with open(file_path, 'r') as f:
+        records = json.load(f)
+    staging = directory + IMPORT_SUFFIX
+    # Left behind by an import that did not finish
+    shutil.rmtree(staging, ignore_errors=True)
+    log = SegmentLog(staging, **log_options)
+    try:
+        log.append_batch(records, durable=False)
+    finally:
+        log.close()
+    # Segments and sidecars alike must be on disk before the log becomes visible
+    for name in os.listdir(staging):
+        with open(os.path.join(staging, name), 'rb') as f:
+            os.fsync(f.fileno())
+    _fsync_directory(staging)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.rename(staging, directory)
+    _fsync_directory(os.path.dirname(directory) or '.')
+    logger.info(f"Imported {len(records)} records from {file_path} into {directory}")
+    return len(records)
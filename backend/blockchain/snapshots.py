@@ -0,0 +1,82 @@
+"""
+On-disk snapshots of derived ledger state
+A snapshot records the chain tip, balances, marketplace view, credit totals and record counts
+together with the position in each ledger file it covers, so startup loads it and
+replays only the records written after those positions
+"""
+
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 2
+SNAPSHOT_PREFIX = "snapshot-"
+SNAPSHOT_SUFFIX = ".json"
+KEEP_SNAPSHOTS = 2
+
+
+class SnapshotStore:
+    """Numbered snapshot files, of which the newest readable one is used"""
+
+    def __init__(self, storage_dir):
+        self.directory = os.path.join(storage_dir, "snapshots")
+
+    def _list(self):
+        if not os.path.isdir(self.directory):
+            return []
+        names = [
+            name for name in os.listdir(self.directory)
+            if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX)
+        ]
+        return sorted(names)
+
+    def latest(self):
+        """Return the newest snapshot that can be read, or None"""
+        for name in reversed(self._list()):
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, 'r') as f:
+                    snapshot = json.load(f)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable snapshot {path}: {e}")
+                continue
+            if snapshot.get("format") != SNAPSHOT_FORMAT:
+                logger.warning(f"Skipping snapshot {path} with unsupported format {snapshot.get('format')}")
+                continue
+            return snapshot
+        return None
+
+    def write(self, state):
+        """
+        Persist a snapshot atomically and prune older ones
+
+        Args:
+            state: Snapshot body; the format number and sequence are added here
+
+        Returns:
+            str: Path of the new snapshot
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        existing = self._list()
+        sequence = int(existing[-1][len(SNAPSHOT_PREFIX):-len(SNAPSHOT_SUFFIX)]) + 1 if existing else 1
+        state = dict(state, format=SNAPSHOT_FORMAT, sequence=sequence)
+
+        path = os.path.join(self.directory, f"{SNAPSHOT_PREFIX}{sequence:012d}{SNAPSHOT_SUFFIX}")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        for name in existing[:max(0, len(existing) + 1 - KEEP_SNAPSHOTS)]:
+            os.remove(os.path.join(self.directory, name))
+        logger.info(f"Wrote ledger snapshot {path}")
+        return path
+
+    def clear(self):
+        """Remove every snapshot, e.g. after the ledger files were rewritten"""
+        for name in self._list():
+            os.remove(os.path.join(self.directory, name))
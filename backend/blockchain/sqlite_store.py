@@ -0,0 +1,283 @@
+"""
+SQLite storage backend for the ledger
+Each record is stored as its JSON body next to the columns it is looked up and
+sorted by, in a WAL-mode database so readers never block the writer. The store
+answers the same lookups as LedgerIndex straight from SQLite's indexes, so no
+ledger records need to stay resident in memory
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+
+from .pagination import decode_cursor, encode_cursor, sort_key
+from .time_range import TIME_FIELDS, time_key, to_iso
+
+logger = logging.getLogger(__name__)
+
+# Columns extracted from each record, besides the JSON body
+TABLE_COLUMNS = {
+    "reports": ("report_id", "block_number", "entry_index", "timestamp"),
+    "credits": ("credit_id", "ngo_id", "report_id", "available_for_sale", "issued_at",
+                "price_per_credit", "vintage_year", "status", "credits_amount"),
+    "transactions": ("transaction_id", "from_id", "to_id", "timestamp"),
+    "blocks": ("block_number", "hash")
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    seq INTEGER PRIMARY KEY,
+    report_id TEXT NOT NULL UNIQUE,
+    block_number INTEGER NOT NULL,
+    entry_index INTEGER,
+    timestamp TEXT,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_block ON reports (block_number, entry_index);
+CREATE INDEX IF NOT EXISTS reports_time ON reports (timestamp, report_id);
+
+CREATE TABLE IF NOT EXISTS credits (
+    seq INTEGER PRIMARY KEY,
+    credit_id TEXT NOT NULL UNIQUE,
+    ngo_id TEXT NOT NULL,
+    report_id TEXT,
+    available_for_sale INTEGER,
+    issued_at TEXT,
+    price_per_credit REAL,
+    vintage_year INTEGER,
+    status TEXT,
+    credits_amount REAL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS credits_ngo ON credits (ngo_id, issued_at, credit_id);
+CREATE INDEX IF NOT EXISTS credits_report ON credits (report_id);
+CREATE INDEX IF NOT EXISTS credits_available ON credits (available_for_sale);
+CREATE INDEX IF NOT EXISTS credits_time ON credits (issued_at, credit_id);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    seq INTEGER PRIMARY KEY,
+    transaction_id TEXT NOT NULL UNIQUE,
+    from_id TEXT,
+    to_id TEXT,
+    timestamp TEXT,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_from ON transactions (from_id);
+CREATE INDEX IF NOT EXISTS transactions_to ON transactions (to_id);
+CREATE INDEX IF NOT EXISTS transactions_time ON transactions (timestamp, transaction_id);
+
+CREATE TABLE IF NOT EXISTS blocks (
+    seq INTEGER PRIMARY KEY,
+    block_number INTEGER NOT NULL UNIQUE,
+    hash TEXT,
+    body TEXT NOT NULL
+);
+"""
+
+
+def _insert_sql(table):
+    columns = TABLE_COLUMNS[table] + ("body",)
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+
+INSERT_SQL = {table: _insert_sql(table) for table in TABLE_COLUMNS}
+
+
+def _row(table, record):
+    values = [record.get(column) for column in TABLE_COLUMNS[table]]
+    values.append(json.dumps(record, separators=(',', ':')))
+    return values
+
+
+class SqliteLedgerStore:
+    """Ledger tables in one SQLite database, with LedgerIndex-compatible lookups"""
+
+    def __init__(self, path, synchronous="NORMAL"):
+        """
+        Open (or create) the ledger database
+
+        Args:
+            path: Database file
+            synchronous: SQLite synchronous level; NORMAL is durable across process
+                crashes in WAL mode, FULL also across power loss
+        """
+        self.path = path
+        self.synchronous = synchronous
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        # sqlite3 connections are per thread; each caches its prepared statements
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                         check_same_thread=False, cached_statements=256)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def close(self):
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
+
+    # Writes
+
+    def insert(self, table, record):
+        self._connection().execute(INSERT_SQL[table], _row(table, record))
+
+    def insert_many(self, table, records):
+        """Insert several records in one transaction"""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(INSERT_SQL[table], [_row(table, record) for record in records])
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    # Scans
+
+    def _bodies(self, sql, params=()):
+        return [json.loads(body) for (body,) in self._connection().execute(sql, params)]
+
+    def _body(self, sql, params=()):
+        row = self._connection().execute(sql, params).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all_records(self, table):
+        return self._bodies(f"SELECT body FROM {table} ORDER BY seq")
+
+    def records_after(self, table, seq):
+        """Records inserted after a sequence number, and the last sequence number"""
+        rows = self._connection().execute(f"SELECT seq, body FROM {table} WHERE seq > ? ORDER BY seq", (seq,)).fetchall()
+        return [json.loads(body) for _, body in rows], (rows[-1][0] if rows else seq)
+
+    def max_seq(self, table):
+        return self._connection().execute(f"SELECT COALESCE(MAX(seq), 0) FROM {table}").fetchone()[0]
+
+    def count(self, table):
+        return self._connection().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def last_record(self, table):
+        return self._body(f"SELECT body FROM {table} ORDER BY seq DESC LIMIT 1")
+
+    def is_empty(self):
+        return not any(self.max_seq(table) for table in TABLE_COLUMNS)
+
+    # LedgerIndex interface; rows are indexed by SQLite as they are inserted
+
+    def add_report(self, report):
+        pass
+
+    def add_credit(self, credit):
+        pass
+
+    def add_transaction(self, transaction):
+        pass
+
+    def add_block(self, header):
+        pass
+
+    def get_report(self, report_id):
+        return self._body("SELECT body FROM reports WHERE report_id = ?", (report_id,))
+
+    def get_credit(self, credit_id):
+        return self._body("SELECT body FROM credits WHERE credit_id = ?", (credit_id,))
+
+    def get_transaction(self, transaction_id):
+        return self._body("SELECT body FROM transactions WHERE transaction_id = ?", (transaction_id,))
+
+    def get_block(self, block_number):
+        return self._body("SELECT body FROM blocks WHERE block_number = ?", (block_number,))
+
+    def reports_in_block(self, block_number):
+        return self._bodies("SELECT body FROM reports WHERE block_number = ? ORDER BY entry_index", (block_number,))
+
+    def credits_for_ngo(self, ngo_id):
+        return self._bodies("SELECT body FROM credits WHERE ngo_id = ? ORDER BY seq", (ngo_id,))
+
+    def credits_for_report(self, report_id):
+        return self._bodies("SELECT body FROM credits WHERE report_id = ? ORDER BY seq", (report_id,))
+
+    def all_credits(self):
+        return self.all_records("credits")
+
+    def ngo_credit_totals(self, ngo_id):
+        return tuple(self._connection().execute(
+            "SELECT COALESCE(SUM(credits_amount), 0.0), "
+            "COALESCE(SUM(CASE WHEN available_for_sale THEN credits_amount ELSE 0 END), 0.0) "
+            "FROM credits WHERE ngo_id = ?", (ngo_id,)).fetchone())
+
+    def ngo_credits_page(self, ngo_id, sort_by="issued_at", limit=None, cursor=None, descending=False,
+                         vintage_year=None, min_price=None, max_price=None, status=None):
+        """
+        Keyset page of an NGO's credit records, ordered like pagination.sort_key
+
+        sort_by must already be validated against pagination.SORT_FIELDS, since it is
+        used as a column name.
+        """
+        # Missing values sort last, as (is_null, value) does in memory
+        order_key = f"({sort_by} IS NULL), COALESCE({sort_by}, 0), credit_id"
+        conditions = ["ngo_id = ?"]
+        params = [ngo_id]
+        for clause, value in (("vintage_year = ?", vintage_year), ("status = ?", status),
+                              ("COALESCE(price_per_credit, 15.0) >= ?", min_price),
+                              ("COALESCE(price_per_credit, 15.0) <= ?", max_price)):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        if cursor:
+            (is_none, value), credit_id = decode_cursor(cursor, sort_by, descending)
+            conditions.append(f"({order_key}) {'<' if descending else '>'} (?, ?, ?)")
+            params.extend((int(is_none), value, credit_id))
+
+        direction = "DESC" if descending else "ASC"
+        sql = (f"SELECT body FROM credits WHERE {' AND '.join(conditions)} "
+               f"ORDER BY ({sort_by} IS NULL) {direction}, COALESCE({sort_by}, 0) {direction}, credit_id {direction}")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+        credits = self._bodies(sql, params)
+        if limit is not None and len(credits) > limit:
+            credits = credits[:limit]
+            return credits, encode_cursor(sort_key(credits[-1], sort_by), sort_by, descending)
+        return credits, None
+
+    def time_range_page(self, kind, start=None, end=None, limit=None, cursor=None, descending=False):
+        """
+        Keyset page of records of one kind with timestamps in [start, end], like
+        LedgerIndex.time_range_page; ranges are compared on the stored ISO strings
+        """
+        time_field, id_field = TIME_FIELDS[kind]
+        conditions = [f"{time_field} IS NOT NULL"]
+        params = []
+        for clause, bound in ((f"{time_field} >= ?", start), (f"{time_field} <= ?", end)):
+            if bound is not None:
+                conditions.append(clause)
+                params.append(to_iso(bound))
+        if cursor:
+            (_, epoch), record_id = decode_cursor(cursor, time_field, descending)
+            conditions.append(f"({time_field}, {id_field}) {'<' if descending else '>'} (?, ?)")
+            params.extend((to_iso(epoch), record_id))
+
+        direction = "DESC" if descending else "ASC"
+        sql = (f"SELECT body FROM {kind} WHERE {' AND '.join(conditions)} "
+               f"ORDER BY {time_field} {direction}, {id_field} {direction}")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+        records = self._bodies(sql, params)
+        if limit is not None and len(records) > limit:
+            records = records[:limit]
+            return records, encode_cursor(time_key(records[-1], kind), time_field, descending)
+        return records, None
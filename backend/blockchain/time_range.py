@@ -0,0 +1,54 @@
+"""
+Time-ordered lookups over ledger history
+Record timestamps are stored as ISO-8601 strings; time indexes key each record by
+its epoch seconds so a date range is located with two binary searches in a
+KeysetIndex, costing O(log n + k) for the k records returned
+"""
+
+from datetime import datetime
+
+# Per record kind: (time field, id field)
+TIME_FIELDS = {
+    "reports": ("timestamp", "report_id"),
+    "credits": ("issued_at", "credit_id"),
+    "transactions": ("timestamp", "transaction_id")
+}
+
+
+def to_epoch(value):
+    """
+    Epoch seconds of a point in time
+
+    Args:
+        value: ISO-8601 string, datetime or epoch seconds; naive times are local
+            time, as the ledger's own timestamps are
+
+    Raises:
+        ValueError: If the value is not a recognisable time
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid time {value!r}")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f"Invalid ISO-8601 time {value!r}") from None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    raise ValueError(f"Invalid time {value!r}")
+
+
+def to_iso(epoch):
+    """Stored form of a time: naive local ISO-8601, which sorts like the ledger's timestamps"""
+    return datetime.fromtimestamp(epoch).isoformat()
+
+
+def time_key(record, kind):
+    """KeysetIndex key of a record by time, or None if it has no readable timestamp"""
+    time_field, id_field = TIME_FIELDS[kind]
+    try:
+        return ((False, to_epoch(record[time_field])), record[id_field])
+    except (KeyError, ValueError):
+        return None
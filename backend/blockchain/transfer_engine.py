@@ -0,0 +1,103 @@
+"""
+Lock-striped transfer engine
+Each account hashes to one of a fixed set of locks; a transfer holds the locks of
+both its accounts, taken in stripe order so two transfers can never deadlock.
+Transfers between unrelated accounts run in parallel, while two debits of the
+same account are serialized and cannot double-spend
+"""
+
+import threading
+import zlib
+from contextlib import contextmanager
+
+DEFAULT_STRIPES = 256
+
+
+class TransferEngine:
+    """Applies balance changes under per-account striped locks"""
+
+    def __init__(self, balances, stripes=DEFAULT_STRIPES):
+        """
+        Args:
+            balances: BalanceStore the engine guards
+            stripes: Number of locks accounts are spread across
+        """
+        self.balances = balances
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def _stripe(self, entity_id):
+        return zlib.crc32(str(entity_id).encode('utf-8')) % len(self._locks)
+
+    @contextmanager
+    def locked(self, *entity_ids):
+        """Hold the locks of every given account, acquired in a global order"""
+        stripes = sorted({self._stripe(entity_id) for entity_id in entity_ids})
+        acquired = []
+        try:
+            for stripe in stripes:
+                self._locks[stripe].acquire()
+                acquired.append(stripe)
+            yield
+        finally:
+            for stripe in reversed(acquired):
+                self._locks[stripe].release()
+
+    @contextmanager
+    def locked_all(self):
+        """Hold every stripe, pausing all balance changes (e.g. while snapshotting)"""
+        # Ascending stripe order, the same order locked() takes them in
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(self._locks):
+                lock.release()
+
+    def issue(self, credit_record, persist=None):
+        """
+        Credit a newly issued credit record to its NGO
+
+        Args:
+            credit_record: Issued credit record
+            persist: Called first while the NGO's account is locked; if it raises,
+                nothing is credited and the error propagates
+        """
+        with self.locked(credit_record['ngo_id']):
+            if persist is not None:
+                persist()
+            self.balances.apply_issuance(credit_record)
+
+    def replay(self, transaction):
+        """Apply a transaction that was stored by another writer process"""
+        with self.locked(transaction['from_id'], transaction['to_id']):
+            self.balances.apply_transfer(transaction)
+
+    def transfer(self, from_id, to_id, amount, vintage_year=None, persist=None):
+        """
+        Move credits between two accounts
+
+        Args:
+            from_id: Sender
+            to_id: Receiver
+            amount: Credits to move
+            vintage_year: Restrict the transfer to one vintage
+            persist: Called with the vintage allocation while both accounts are locked;
+                if it raises, the sender's debit is rolled back and the error propagates
+
+        Returns:
+            list: Vintage allocation of the transfer
+
+        Raises:
+            InsufficientCreditsError: If the sender cannot cover the amount
+        """
+        with self.locked(from_id, to_id):
+            allocation = self.balances.debit(from_id, amount, vintage_year)
+            if persist is not None:
+                try:
+                    persist(allocation)
+                except Exception:
+                    self.balances.credit_allocation(from_id, allocation)
+                    raise
+            self.balances.credit_allocation(to_id, allocation)
+            return allocation
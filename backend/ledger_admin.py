@@ -0,0 +1,65 @@
+"""
+EcoLedger ledger administration commands
+Reads the same LEDGER_* environment variables as main.py
+
+Usage:
+  python ledger_admin.py snapshot
+  python ledger_admin.py compact
+  python ledger_admin.py verify [--full]
+  python ledger_admin.py convert --to binary
+  python ledger_admin.py --storage-dir blockchain_data --storage-mode segmented compact
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+from blockchain.ledger_service import LedgerService, STORAGE_MODES
+from blockchain.record_convert import convert_storage
+from blockchain.record_format import RECORD_FORMATS
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EcoLedger ledger administration')
+    parser.add_argument('--storage-dir', default=os.environ.get('LEDGER_STORAGE_DIR', 'blockchain_data'))
+    parser.add_argument('--storage-mode', default=os.environ.get('LEDGER_STORAGE_MODE', 'json'), choices=STORAGE_MODES)
+    parser.add_argument('--record-encoding', default=os.environ.get('LEDGER_RECORD_ENCODING', 'json'),
+                        choices=tuple(RECORD_FORMATS))
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('snapshot', help='Write a snapshot of the derived ledger state')
+    commands.add_parser('compact', help='Snapshot, then archive the covered history into read-only files '
+                                        '(stop the API workers first)')
+    verify = commands.add_parser('verify', help='Verify the hash chain')
+    verify.add_argument('--full', action='store_true', help='Ignore checkpoints and verify from genesis')
+    convert = commands.add_parser('convert', help='Re-encode the segmented logs (stop the API workers first)')
+    convert.add_argument('--to', required=True, choices=tuple(RECORD_FORMATS), help='Target record encoding')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'convert':
+        converted = convert_storage(args.storage_dir, args.to)
+        print(json.dumps({"status": "success", "converted": converted, "record_encoding": args.to}, indent=2))
+        return
+
+    ledger = LedgerService(storage_mode=args.storage_mode, storage_dir=args.storage_dir,
+                           record_encoding=args.record_encoding,
+                           multi_process=True, warm_index=False)
+    try:
+        if args.command == 'snapshot':
+            result = ledger.create_snapshot()
+        elif args.command == 'compact':
+            result = ledger.compact()
+        else:
+            result = ledger.verify_chain(full=args.full)
+    finally:
+        ledger.close()
+
+    print(json.dumps(result, indent=2))
+    ok = result.get('status') == 'success' and result.get('valid', True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -20,7 +20,7 @@ from flask_socketio import SocketIO
 
 # Import blockchain module
 try:
-    from blockchain.ledger_service import LedgerService
+    from blockchain.ledger_service import LedgerService, parse_issuance_numbers, parse_transfer_numbers
 except ImportError:
     LedgerService = None
 
@@ -51,7 +51,16 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 
 # Initialize blockchain service
 if LedgerService:
-    ledger_service = LedgerService()
+    ledger_service = LedgerService(
+        storage_mode=os.environ.get('LEDGER_STORAGE_MODE', 'json'),
+        record_encoding=os.environ.get('LEDGER_RECORD_ENCODING', 'json'),
+        storage_dir=os.environ.get('LEDGER_STORAGE_DIR', 'blockchain_data'),
+        group_commit=os.environ.get('LEDGER_GROUP_COMMIT', '0') == '1',
+        commit_window_ms=float(os.environ.get('LEDGER_COMMIT_WINDOW_MS', '2')),
+        multi_process=os.environ.get('LEDGER_MULTI_PROCESS', '0') == '1',
+        snapshot_every=int(os.environ.get('LEDGER_SNAPSHOT_EVERY', '10000')),
+        fabric_batch_window_ms=float(os.environ.get('LEDGER_FABRIC_BATCH_MS', '0'))
+    )
 else:
     ledger_service = None
 
@@ -208,6 +217,22 @@ def ledger_submit():
         logger.error(f"Ledger submit error: {str(e)}")
         return jsonify({"error": "Ledger submission failed", "details": str(e)}), 500
 
+@app.route('/ledger/submit/batch', methods=['POST'])
+def ledger_submit_batch():
+    """Submit a batch of verified reports as one multi-entry block"""
+    try:
+        data = request.get_json()
+        reports = data.get('reports') if isinstance(data, dict) else data
+        if not reports or not isinstance(reports, list):
+            return jsonify({"error": "Provide a non-empty 'reports' list"}), 400
+        
+        result = ledger_service.submit_reports(reports)
+        return jsonify(result)
+    
+    except Exception as e:
+        logger.error(f"Ledger batch submit error: {str(e)}")
+        return jsonify({"error": "Ledger batch submission failed", "details": str(e)}), 500
+
 @app.route('/ledger/query/<report_id>', methods=['GET'])
 def ledger_query(report_id):
     """Query report from blockchain ledger"""
@@ -219,6 +244,28 @@ def ledger_query(report_id):
         logger.error(f"Ledger query error: {str(e)}")
         return jsonify({"error": "Ledger query failed", "details": str(e)}), 500
 
+@app.route('/ledger/transaction/<transaction_id>', methods=['GET'])
+def ledger_transaction(transaction_id):
+    """Query a credit transfer from the ledger"""
+    try:
+        result = ledger_service.query_transaction(transaction_id)
+        return jsonify(result)
+    
+    except Exception as e:
+        logger.error(f"Transaction query error: {str(e)}")
+        return jsonify({"error": "Transaction query failed", "details": str(e)}), 500
+
+@app.route('/ledger/proof/<report_id>', methods=['GET'])
+def ledger_proof(report_id):
+    """Get a Merkle inclusion proof for a report"""
+    try:
+        result = ledger_service.get_report_proof(report_id)
+        return jsonify(result)
+    
+    except Exception as e:
+        logger.error(f"Ledger proof error: {str(e)}")
+        return jsonify({"error": "Ledger proof failed", "details": str(e)}), 500
+
 @app.route('/ledger/issue', methods=['POST'])
 def ledger_issue_credits():
     """Issue carbon credits to NGO"""
@@ -230,6 +277,10 @@ def ledger_issue_credits():
             return jsonify({
                 "error": f"Required fields: {required_fields}"
             }), 400
+        try:
+            parse_issuance_numbers(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         result = ledger_service.issue_credits(data)
 
@@ -263,6 +314,11 @@ def ledger_transfer_credits():
                 "error": f"Required fields: {required_fields}"
             }), 400
         
+        try:
+            parse_transfer_numbers(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
         result = ledger_service.transfer_credits(data)
         return jsonify(result)
     
@@ -270,17 +326,96 @@ def ledger_transfer_credits():
         logger.error(f"Credit transfer error: {str(e)}")
         return jsonify({"error": "Credit transfer failed", "details": str(e)}), 500
 
+@app.route('/ledger/balance/<entity_id>', methods=['GET'])
+def ledger_balance(entity_id):
+    """Get an entity's carbon credit balance"""
+    try:
+        vintage_year = request.args.get('vintage_year', type=int)
+        result = ledger_service.get_balance(entity_id, vintage_year)
+        return jsonify(result)
+    
+    except Exception as e:
+        logger.error(f"Balance query error: {str(e)}")
+        return jsonify({"error": "Balance query failed", "details": str(e)}), 500
+
+def _page_args(default_limit=None):
+    """Keyset pagination, sorting and filter parameters from the query string"""
+    return {
+        "limit": request.args.get('limit', default_limit, type=int),
+        "cursor": request.args.get('cursor'),
+        "sort_by": request.args.get('sort_by', 'issued_at'),
+        "descending": request.args.get('order', 'asc') == 'desc',
+        "vintage_year": request.args.get('vintage_year', type=int),
+        "min_price": request.args.get('min_price', type=float),
+        "max_price": request.args.get('max_price', type=float),
+        "status": request.args.get('status')
+    }
+
 @app.route('/ledger/marketplace', methods=['GET'])
 def ledger_marketplace():
-    """Get available carbon credits in marketplace"""
+    """Get available carbon credits in marketplace (paginated when limit, cursor or filters are given)"""
     try:
-        result = ledger_service.get_marketplace_credits()
-        return jsonify(result)
+        # Pollers send back the ETag they last saw; an unchanged view needs no body
+        if request.if_none_match.contains(ledger_service.get_marketplace_etag()):
+            response = app.response_class(status=304)
+            response.set_etag(ledger_service.get_marketplace_etag())
+            return response
+        
+        result = ledger_service.get_marketplace_credits(ngo_id=request.args.get('ngo_id'), **_page_args())
+        if result.get('status') == 'failed':
+            return jsonify(result), 400
+        response = jsonify(result)
+        response.set_etag(result.get('etag', ''))
+        return response
     
     except Exception as e:
         logger.error(f"Marketplace query error: {str(e)}")
         return jsonify({"error": "Marketplace query failed", "details": str(e)}), 500
 
+@app.route('/ledger/credits/<ngo_id>', methods=['GET'])
+def ledger_ngo_credits(ngo_id):
+    """Get an NGO's credit records, one page at a time"""
+    try:
+        result = ledger_service.get_ngo_credits(ngo_id, **_page_args(default_limit=100))
+        if result.get('status') == 'failed':
+            return jsonify(result), 400
+        return jsonify(result)
+    
+    except Exception as e:
+        logger.error(f"NGO credits query error: {str(e)}")
+        return jsonify({"error": "NGO credits query failed", "details": str(e)}), 500
+
+@app.route('/ledger/history/<kind>', methods=['GET'])
+def ledger_history(kind):
+    """Get reports, credits or transactions with timestamps in a range (start/end as ISO-8601)"""
+    try:
+        result = ledger_service.query_time_range(
+            kind,
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            limit=request.args.get('limit', 100, type=int),
+            cursor=request.args.get('cursor'),
+            descending=request.args.get('order', 'asc') == 'desc'
+        )
+        if result.get('status') == 'failed':
+            return jsonify(result), 400
+        return jsonify(result)
+    
+    except Exception as e:
+        logger.error(f"Ledger history query error: {str(e)}")
+        return jsonify({"error": "Ledger history query failed", "details": str(e)}), 500
+
+@app.route('/ledger/stats', methods=['GET'])
+def ledger_stats():
+    """Get ledger record counts and credit totals (running counters, cheap to poll)"""
+    try:
+        result = ledger_service.get_blockchain_stats()
+        return jsonify(result)
+    
+    except Exception as e:
+        logger.error(f"Ledger stats error: {str(e)}")
+        return jsonify({"error": "Ledger stats query failed", "details": str(e)}), 500
+
 @app.route('/api/reports', methods=['GET'])
 def get_reports():
     """Get all verified project reports for admin dashboard"""
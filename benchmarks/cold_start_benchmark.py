@@ -0,0 +1,83 @@
+"""
+LedgerService cold-start benchmark
+Builds a segmented ledger, then times startup with a full rebuild, from a snapshot,
+and from a snapshot after compaction, each with a tail of records written after
+the snapshot. Each start is timed up to the first answered query (a report lookup
+and a page of an NGO's credits), since lookup indexes left for later would
+otherwise make startup look faster than it is
+
+Usage:
+  python benchmarks/cold_start_benchmark.py
+  python benchmarks/cold_start_benchmark.py --reports 1000000 --tail 5000
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from blockchain.ledger_service import LedgerService  # noqa: E402
+
+BATCH = 1000
+
+
+def timed_start(storage_dir, report_id):
+    """Seconds to construct the service, and to construct it and answer the first queries"""
+    started = time.perf_counter()
+    ledger = LedgerService(storage_mode="segmented", storage_dir=storage_dir, warm_index=False)
+    constructed = time.perf_counter() - started
+    assert ledger.query_report(report_id)["status"] == "found"
+    assert ledger.get_ngo_credits("ngo-1", limit=50)["status"] == "success"
+    answered = time.perf_counter() - started
+    tip = ledger._chain_tip['block_number']
+    ledger.close()
+    return constructed, answered, tip
+
+
+def report(label, timings):
+    constructed, answered, tip = timings
+    print(f"{label:<26}{constructed * 1000:9.1f} ms  first query at {answered * 1000:9.1f} ms  (tip block {tip})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LedgerService cold-start benchmark')
+    parser.add_argument('--reports', type=int, default=200000, help='Reports in the ledger')
+    parser.add_argument('--credits', type=int, default=2000, help='Credit records issued')
+    parser.add_argument('--tail', type=int, default=1000, help='Reports written after the snapshot')
+    parser.add_argument('--segment-mb', type=int, default=16)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="ledger-cold-start-")
+    try:
+        ledger = LedgerService(storage_mode="segmented", storage_dir=tmp,
+                               segment_max_bytes=args.segment_mb * 1024 * 1024)
+        print(f"building {args.reports} reports and {args.credits} credits...")
+        report_id = None
+        for start in range(0, args.reports, BATCH):
+            result = ledger.submit_reports([{"ngo_id": f"ngo-{i % 100}", "tree_count": 950, "final_score": 91.0}
+                                            for i in range(start, min(start + BATCH, args.reports))])
+            report_id = report_id or result["reports"][0]["report_id"]
+        for i in range(args.credits):
+            ledger.issue_credits({"ngo_id": f"ngo-{i % 100}", "credits_amount": 10, "report_id": report_id})
+
+        report("full rebuild:", timed_start(tmp, report_id))
+
+        ledger.create_snapshot()
+        for _ in range(args.tail):
+            ledger.submit_report({"ngo_id": "ngo-tail", "tree_count": 10})
+        report(f"snapshot + {args.tail} tail:", timed_start(tmp, report_id))
+
+        ledger.compact()
+        ledger.submit_report({"ngo_id": "ngo-tail", "tree_count": 10})
+        ledger.close()
+        report("after compaction:", timed_start(tmp, report_id))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Ledger append latency benchmark
+Measures per-append latency as the ledger grows, for the segmented log and
+(up to a small size, since each append rewrites the whole file) the legacy JSON storage
+
+Usage:
+  python benchmarks/ledger_append_benchmark.py
+  python benchmarks/ledger_append_benchmark.py --max-entries 100000 --legacy-max 2000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from blockchain.ledger_service import LedgerService  # noqa: E402
+
+SAMPLE_WINDOW = 1000
+
+
+def make_entry(block_number):
+    return {
+        "report_id": str(uuid.uuid4()),
+        "timestamp": datetime.now().isoformat(),
+        "data": {
+            "ngo_id": f"ngo-{block_number % 50}",
+            "tree_count": 950,
+            "ndvi_score": 0.8,
+            "iot_score": 0.9,
+            "final_score": 91.2,
+            "carbon_credits": 10.6
+        },
+        "block_number": block_number,
+        "previous_hash": "0" * 64,
+        "status": "verified",
+        "hash": "f" * 64
+    }
+
+
+def checkpoints(max_entries):
+    points = []
+    size = 1000
+    while size <= max_entries:
+        points.append(size)
+        size *= 10
+    return points
+
+
+def run(storage_mode, max_entries, segment_max_bytes):
+    """Append entries and report mean latency over the window ending at each checkpoint"""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger = LedgerService(storage_mode=storage_mode, storage_dir=tmp,
+                               segment_max_bytes=segment_max_bytes)
+        targets = checkpoints(max_entries)
+        count = 0
+        for target in targets:
+            # Fill silently up to the start of the measurement window
+            while count < target - SAMPLE_WINDOW:
+                count += 1
+                ledger._append_to_file(ledger.reports_file, make_entry(count))
+
+            entries = [make_entry(count + i + 1) for i in range(target - count)]
+            start = time.perf_counter()
+            for entry in entries:
+                ledger._append_to_file(ledger.reports_file, entry)
+            elapsed = time.perf_counter() - start
+            results.append((target, elapsed / len(entries) * 1e6))
+            count = target
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ledger append latency benchmark')
+    parser.add_argument('--max-entries', type=int, default=1_000_000)
+    parser.add_argument('--legacy-max', type=int, default=1000,
+                        help='Largest ledger size to measure for the JSON-array storage')
+    parser.add_argument('--segment-mb', type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'storage':<12}{'entries':>12}{'us/append':>14}")
+    for mode, max_entries in (("json", args.legacy_max), ("segmented", args.max_entries)):
+        for size, latency in run(mode, max_entries, args.segment_mb * 1024 * 1024):
+            print(f"{mode:<12}{size:>12,}{latency:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Ledger record encoding benchmark
+Builds a segmented ledger, then compares the on-disk size and load throughput of
+its records as legacy JSON arrays (storage_mode="json"), JSON-lines segments and
+binary segments, plus point reads by key and full-rebuild startup per encoding
+
+Usage:
+  python benchmarks/record_encoding_benchmark.py
+  python benchmarks/record_encoding_benchmark.py --reports 200000 --credits 20000
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from blockchain.ledger_service import LedgerService  # noqa: E402
+from blockchain.record_convert import convert_storage  # noqa: E402
+from blockchain.record_format import RECORD_FORMATS  # noqa: E402
+from blockchain.segment_log import SegmentLog  # noqa: E402
+
+BATCH = 1000
+TABLES = ("reports", "credits")
+
+
+def sample_report(i):
+    return {
+        "ngo_id": f"ngo-{i % 100:03d}",
+        "project_name": f"Mangrove Restoration Site {i % 500}",
+        "location": {"latitude": 21.9 + (i % 100) / 1000, "longitude": 89.1 + (i % 37) / 1000},
+        "tree_count": 900 + i % 200,
+        "area_hectares": 12.5,
+        "ndvi_score": 0.82,
+        "iot_score": 0.91,
+        "final_score": 91.0,
+        "carbon_credits": 10,
+        "verification_date": "2025-01-01T00:00:00"
+    }
+
+
+def directory_bytes(directory, suffix):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+               if name.endswith(suffix))
+
+
+def timed(fn):
+    started = time.perf_counter()
+    count = fn()
+    return time.perf_counter() - started, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ledger record encoding benchmark')
+    parser.add_argument('--reports', type=int, default=50000, help='Reports in the ledger')
+    parser.add_argument('--credits', type=int, default=5000, help='Credit records issued')
+    parser.add_argument('--reads', type=int, default=20000, help='Point reads by report id')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="ledger-encoding-")
+    try:
+        ledger = LedgerService(storage_mode="segmented", storage_dir=tmp)
+        print(f"building {args.reports} reports and {args.credits} credits...")
+        report_ids = []
+        for start in range(0, args.reports, BATCH):
+            result = ledger.submit_reports([sample_report(i) for i in range(start, min(start + BATCH, args.reports))])
+            report_ids.extend(r["report_id"] for r in result["reports"])
+        for i in range(args.credits):
+            ledger.issue_credits({"ngo_id": f"ngo-{i % 100:03d}", "credits_amount": 10, "report_id": report_ids[i]})
+        ledger.close()
+
+        # Legacy JSON arrays, written the way storage_mode="json" writes them
+        arrays = {}
+        for table in TABLES:
+            log = SegmentLog(os.path.join(tmp, "segments", table))
+            arrays[table] = os.path.join(tmp, f"{table}.bench.json")
+            with open(arrays[table], 'w') as f:
+                json.dump(list(log.iter_entries()), f, indent=2)
+            log.close()
+
+        def load_array(table):
+            with open(arrays[table]) as f:
+                return len(json.load(f))
+
+        print(f"\n{'table':<8} {'encoding':<12} {'size MB':>9} {'load ms':>9} {'records/s':>11}")
+        results = {}
+        for record_encoding in ("json", "binary"):
+            if record_encoding != "json":
+                convert_storage(tmp, record_encoding)
+            for table in TABLES:
+                if record_encoding == "json":
+                    size = os.path.getsize(arrays[table])
+                    elapsed, count = timed(lambda: load_array(table))
+                    print(f"{table:<8} {'json array':<12} {size / 2 ** 20:9.2f} {elapsed * 1000:9.1f} "
+                          f"{count / elapsed:11,.0f}")
+                record_format = RECORD_FORMATS[record_encoding]
+                log = SegmentLog(os.path.join(tmp, "segments", table), record_format=record_encoding)
+                size = directory_bytes(log.directory, record_format.suffix)
+                elapsed, count = timed(lambda: sum(1 for _ in log.iter_entries()))
+                log.close()
+                label = "jsonl" if record_encoding == "json" else record_encoding
+                print(f"{table:<8} {label:<12} {size / 2 ** 20:9.2f} {elapsed * 1000:9.1f} {count / elapsed:11,.0f}")
+
+            ledger = LedgerService(storage_mode="segmented", storage_dir=tmp, record_encoding=record_encoding,
+                                   warm_index=False)
+            log = ledger._segment_logs[ledger.reports_file]
+            log.load_index()
+            keys = random.Random(1).choices(report_ids, k=args.reads)
+            read_time, _ = timed(lambda: [log.read_record(key) for key in keys])
+            ledger.close()
+            startup, _ = timed(lambda: LedgerService(storage_mode="segmented", storage_dir=tmp,
+                                                     record_encoding=record_encoding, warm_index=False).close())
+            results[record_encoding] = (read_time, startup)
+
+        print()
+        for record_encoding, (read_time, startup) in results.items():
+            print(f"{record_encoding:<7} point reads: {args.reads / read_time:11,.0f}/s   "
+                  f"full-rebuild startup: {startup * 1000:8.1f} ms")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
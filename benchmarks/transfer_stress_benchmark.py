@@ -0,0 +1,97 @@
+"""
+Concurrent credit transfer stress benchmark
+Runs random transfers between NGOs and companies from many threads, reports
+throughput, and checks the balance invariants afterwards:
+  - credits are conserved (sum of balances == credits issued)
+  - no balance is negative
+  - balances rebuilt from the stored ledger match the live balances
+
+Usage:
+  python benchmarks/transfer_stress_benchmark.py
+  python benchmarks/transfer_stress_benchmark.py --threads 32 --transfers 20000 --accounts 200
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from blockchain.balances import BalanceStore  # noqa: E402
+from blockchain.ledger_service import LedgerService  # noqa: E402
+
+CREDITS_PER_NGO = 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent credit transfer stress benchmark')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--transfers', type=int, default=10000, help='Total transfers across all threads')
+    parser.add_argument('--accounts', type=int, default=100, help='NGOs; the same number of companies trade with them')
+    parser.add_argument('--storage-mode', default='segmented', choices=['json', 'segmented'])
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger = LedgerService(storage_mode=args.storage_mode, storage_dir=tmp)
+        report_id = ledger.submit_report({"project_name": "stress"})["report_id"]
+        ngos = [f"ngo-{i:04d}" for i in range(args.accounts)]
+        companies = [f"company-{i:04d}" for i in range(args.accounts)]
+        for ngo_id in ngos:
+            ledger.issue_credits({"ngo_id": ngo_id, "credits_amount": CREDITS_PER_NGO, "report_id": report_id})
+        accounts = ngos + companies
+        issued = CREDITS_PER_NGO * len(ngos)
+
+        per_thread = args.transfers // args.threads
+        outcomes = {"success": 0, "failed": 0}
+        outcome_lock = threading.Lock()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local = {"success": 0, "failed": 0}
+            for _ in range(per_thread):
+                from_id, to_id = rng.sample(accounts, 2)
+                result = ledger.transfer_credits({
+                    "from_id": from_id,
+                    "to_id": to_id,
+                    "credits_amount": rng.choice((1, 5, 10, 25, 50)),
+                    "price": 15.0
+                })
+                local[result["status"]] += 1
+            with outcome_lock:
+                for key, count in local.items():
+                    outcomes[key] += count
+
+        threads = [threading.Thread(target=worker, args=(args.seed + i,)) for i in range(args.threads)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        balances = {entity: ledger._get_available_credits(entity) for entity in accounts}
+        total = sum(balances.values())
+        negative = [entity for entity, amount in balances.items() if amount < 0]
+        rebuilt = BalanceStore.rebuild(ledger._load_from_file(ledger.credits_file),
+                                       ledger._load_from_file(ledger.transactions_file))
+        mismatched = [entity for entity in accounts if abs(rebuilt.balance(entity) - balances[entity]) > 1e-6]
+        ledger.close()
+
+    attempted = outcomes["success"] + outcomes["failed"]
+    print(f"threads={args.threads} accounts={len(accounts)} storage={args.storage_mode}")
+    print(f"transfers attempted: {attempted}  succeeded: {outcomes['success']}  rejected (insufficient): {outcomes['failed']}")
+    print(f"throughput: {attempted / elapsed:,.0f} transfers/s ({elapsed:.2f}s)")
+    print(f"conservation: issued={issued:.2f} held={total:.2f} {'OK' if abs(total - issued) < 1e-6 else 'VIOLATED'}")
+    print(f"negative balances: {len(negative)} {'OK' if not negative else 'VIOLATED'}")
+    print(f"rebuild from ledger: {len(mismatched)} mismatches {'OK' if not mismatched else 'VIOLATED'}")
+    if negative or mismatched or abs(total - issued) >= 1e-6:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,418 @@
+"""
+In-process simulator of the carbon_credits chaincode
+A Python port of carbon_credits.js running against a simulated peer: a versioned
+key-value world state with composite keys, per-transaction stubs (getState/putState,
+partial composite key iteration with bookmark pagination, tx ids, events) and
+MVCC validation at commit. FabricService(mode="simulator") drives it with the same
+method names as `fabric_client.js serve`, so the Fabric code path can be run and
+load-tested without a network or Node.js.
+
+Fabric semantics kept on purpose:
+ - a transaction reads committed state only; its own writes are invisible to it
+ - writes are applied at commit, all or nothing, and a transaction whose reads went
+   stale in the meantime fails with an MVCC read conflict
+ - paginated range queries are only allowed in evaluated (read-only) transactions
+
+Usage:
+  simulator = ChaincodeSimulator(latency_ms=50, commit_ms=2)
+  simulator.call('addCredit', {...})
+  simulator.call('queryPage', 100, '')
+"""
+
+import bisect
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# Same limits as carbon_credits.js
+MAX_BATCH_CREDITS = 500
+MAX_PAGE_SIZE = 1000
+# Committed events the simulator keeps for inspection; older ones are dropped
+DEFAULT_MAX_EVENTS = 10000
+
+# Fabric's composite key delimiters
+_KEY_DELIMITER = '\x00'
+_MAX_UNICODE = '\U0010ffff'
+
+
+class ChaincodeError(Exception):
+    """A chaincode function failed; the transaction is discarded"""
+    pass
+
+
+class MVCCConflictError(ChaincodeError):
+    """A key read by the transaction was committed by another one before it"""
+    pass
+
+
+def create_composite_key(object_type: str, attributes: List[str]) -> str:
+    """Fabric's composite key: \\x00objectType\\x00attr1\\x00attr2\\x00..."""
+    for part in [object_type] + list(attributes):
+        if _KEY_DELIMITER in part or _MAX_UNICODE in part:
+            raise ChaincodeError(f"Invalid composite key part {part!r}")
+    return _KEY_DELIMITER + object_type + _KEY_DELIMITER + ''.join(a + _KEY_DELIMITER for a in attributes)
+
+
+class WorldState:
+    """
+    Committed key-value state of the simulated peer
+    Every value carries the version (commit sequence number) that wrote it; keys are
+    also kept sorted so a partial key range is located by binary search.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[bytes, int]] = {}
+        self._keys: List[str] = []
+        self._lock = threading.Lock()
+        self.height = 0
+
+    def get(self, key: str) -> Tuple[Optional[bytes], Optional[int]]:
+        """Value and version of a key, (None, None) if absent"""
+        with self._lock:
+            return self._values.get(key, (None, None))
+
+    def range(self, start: str, end: str, limit: Optional[int] = None) -> List[Tuple[str, bytes]]:
+        """Committed (key, value) pairs with start <= key < end, in key order"""
+        with self._lock:
+            lo = bisect.bisect_left(self._keys, start)
+            hi = bisect.bisect_left(self._keys, end)
+            if limit is not None:
+                hi = min(hi, lo + limit)
+            return [(key, self._values[key][0]) for key in self._keys[lo:hi]]
+
+    def commit(self, reads: Dict[str, Optional[int]], writes: Dict[str, bytes]) -> int:
+        """
+        Validate a transaction's read set and apply its write set atomically
+
+        Returns:
+            The commit's version number
+
+        Raises:
+            MVCCConflictError: If a read key has changed since it was read
+        """
+        with self._lock:
+            for key, version in reads.items():
+                if self._values.get(key, (None, None))[1] != version:
+                    raise MVCCConflictError(f"MVCC_READ_CONFLICT on key {key!r}")
+            self.height += 1
+            for key, value in writes.items():
+                if key not in self._values:
+                    bisect.insort(self._keys, key)
+                self._values[key] = (value, self.height)
+            return self.height
+
+
+class _Iterator:
+    """State query iterator over (key, value) pairs, closed like fabric-shim's"""
+
+    def __init__(self, results: List[Tuple[str, bytes]]):
+        self._results = iter(results)
+
+    def __iter__(self):
+        return self._results
+
+    def close(self):
+        self._results = iter(())
+
+
+class ChaincodeStub:
+    """Per-transaction view of the world state, the simulator's ctx.stub"""
+
+    def __init__(self, state: WorldState, tx_id: str, read_only: bool = False):
+        self.state = state
+        self.tx_id = tx_id
+        self.read_only = read_only
+        self.timestamp = datetime.now(timezone.utc)
+        self.reads: Dict[str, Optional[int]] = {}
+        self.writes: Dict[str, bytes] = {}
+        self.event: Optional[Tuple[str, bytes]] = None
+
+    def get_tx_id(self) -> str:
+        return self.tx_id
+
+    def get_tx_timestamp(self) -> datetime:
+        return self.timestamp
+
+    def create_composite_key(self, object_type: str, attributes: List[str]) -> str:
+        return create_composite_key(object_type, attributes)
+
+    def get_state(self, key: str) -> bytes:
+        """Committed value of a key (b'' if absent); writes of this transaction are not visible"""
+        value, version = self.state.get(key)
+        self.reads.setdefault(key, version)
+        return value or b''
+
+    def put_state(self, key: str, value: bytes):
+        if self.read_only:
+            raise ChaincodeError("putState is not allowed in an evaluated transaction")
+        if not key:
+            raise ChaincodeError("key must not be empty")
+        self.writes[key] = bytes(value)
+
+    def get_state_by_partial_composite_key(self, object_type: str, attributes: List[str]) -> _Iterator:
+        start = create_composite_key(object_type, attributes)
+        return _Iterator(self.state.range(start, start + _MAX_UNICODE))
+
+    def get_state_by_partial_composite_key_with_pagination(self, object_type: str, attributes: List[str],
+                                                           page_size: int, bookmark: str = ''
+                                                           ) -> Tuple[_Iterator, Dict[str, Any]]:
+        """
+        One page of a partial composite key range
+
+        Returns:
+            (iterator, metadata) where metadata holds fetchedRecordsCount and the
+            bookmark to pass for the next page ('' once the range is exhausted)
+        """
+        if not self.read_only:
+            raise ChaincodeError("Paginated queries are only valid for read-only transactions")
+        prefix = create_composite_key(object_type, attributes)
+        start = bookmark if bookmark and bookmark.startswith(prefix) else prefix
+        # One extra record tells whether another page follows
+        results = self.state.range(start, prefix + _MAX_UNICODE, page_size + 1)
+        next_bookmark = results[page_size][0] if len(results) > page_size else ''
+        results = results[:page_size]
+        return _Iterator(results), {"fetchedRecordsCount": len(results), "bookmark": next_bookmark}
+
+    def set_event(self, name: str, payload: bytes):
+        """Only the last event set by a transaction is emitted, as in Fabric"""
+        self.event = (name, bytes(payload))
+
+
+class Context:
+    def __init__(self, stub: ChaincodeStub):
+        self.stub = stub
+
+
+class CarbonCreditContract:
+    """Port of CarbonCreditContract in carbon_credits.js; keep the two in step"""
+
+    def _credit_key(self, ctx, credit_id):
+        return ctx.stub.create_composite_key('CarbonCredit', [credit_id])
+
+    def InitLedger(self, ctx):
+        sample = []
+        for c in sample:
+            ctx.stub.put_state(self._credit_key(ctx, c['id']), json.dumps(c).encode('utf-8'))
+
+    def _put_credit(self, ctx, credit_obj, default_id):
+        """Stamp a credit with its tx metadata and store it, refusing ids already on the ledger"""
+        if not credit_obj.get('creditId'):
+            credit_obj['creditId'] = default_id
+
+        key = self._credit_key(ctx, credit_obj['creditId'])
+
+        credit_obj['txId'] = ctx.stub.get_tx_id()
+        credit_obj['createdAt'] = credit_obj.get('timestamp') or ctx.stub.get_tx_timestamp().isoformat()
+        credit_obj['type'] = 'CarbonCredit'
+
+        if ctx.stub.get_state(key):
+            raise ChaincodeError(f"CarbonCredit with id {credit_obj['creditId']} already exists")
+
+        serialized = json.dumps(credit_obj).encode('utf-8')
+        ctx.stub.put_state(key, serialized)
+        return serialized
+
+    def AddCarbonCredit(self, ctx, credit_data):
+        if not credit_data:
+            raise ChaincodeError('creditData is required')
+
+        credit_obj = json.loads(credit_data) if isinstance(credit_data, str) else credit_data
+        tx_id = ctx.stub.get_tx_id()
+        serialized = self._put_credit(ctx, credit_obj, tx_id)
+
+        ctx.stub.set_event('CarbonCreditAdded', serialized)
+
+        return json.dumps({"success": True, "creditId": credit_obj['creditId'], "txId": tx_id})
+
+    def AddCarbonCredits(self, ctx, credits_data):
+        if not credits_data:
+            raise ChaincodeError('creditsData is required')
+
+        credits = json.loads(credits_data) if isinstance(credits_data, str) else credits_data
+        if not isinstance(credits, list) or not credits:
+            raise ChaincodeError('creditsData must be a non-empty array')
+        if len(credits) > MAX_BATCH_CREDITS:
+            raise ChaincodeError(f"A batch holds at most {MAX_BATCH_CREDITS} credits, got {len(credits)}")
+
+        tx_id = ctx.stub.get_tx_id()
+        credit_ids = []
+        seen = set()
+        total_credits = 0
+        for i, credit_obj in enumerate(credits):
+            # Writes within a transaction are not visible to its own reads, so duplicates are checked here
+            if credit_obj.get('creditId') and credit_obj['creditId'] in seen:
+                raise ChaincodeError(f"CarbonCredit with id {credit_obj['creditId']} appears twice in the batch")
+            self._put_credit(ctx, credit_obj, f"{tx_id}-{i}")
+            seen.add(credit_obj['creditId'])
+            credit_ids.append(credit_obj['creditId'])
+            try:
+                total_credits += float(credit_obj.get('credits') or 0)
+            except (TypeError, ValueError):
+                pass
+
+        ctx.stub.set_event('CarbonCreditsAdded', json.dumps({
+            "txId": tx_id, "count": len(credit_ids), "totalCredits": total_credits, "creditIds": credit_ids
+        }).encode('utf-8'))
+
+        return json.dumps({"success": True, "txId": tx_id, "count": len(credit_ids), "creditIds": credit_ids})
+
+    def QueryAllCredits(self, ctx):
+        iterator = ctx.stub.get_state_by_partial_composite_key('CarbonCredit', [])
+        results = [json.loads(value) for _, value in iterator if value]
+        iterator.close()
+        return json.dumps(results)
+
+    def QueryCreditsWithPagination(self, ctx, page_size, bookmark=''):
+        try:
+            size = int(page_size)
+        except (TypeError, ValueError):
+            size = 0
+        if not 1 <= size <= MAX_PAGE_SIZE:
+            raise ChaincodeError(f"pageSize must be between 1 and {MAX_PAGE_SIZE}, got {page_size}")
+
+        iterator, metadata = ctx.stub.get_state_by_partial_composite_key_with_pagination(
+            'CarbonCredit', [], size, bookmark or '')
+        records = [json.loads(value) for _, value in iterator if value]
+        iterator.close()
+
+        return json.dumps({
+            "records": records,
+            "fetchedRecordsCount": metadata['fetchedRecordsCount'],
+            "bookmark": metadata['bookmark']
+        })
+
+    def GetCreditById(self, ctx, credit_id):
+        data = ctx.stub.get_state(self._credit_key(ctx, credit_id))
+        if not data:
+            raise ChaincodeError(f"Credit {credit_id} not found")
+        return data.decode('utf-8')
+
+
+# Client method -> (transaction kind, chaincode function), as METHODS in fabric_client.js
+CLIENT_METHODS = {
+    'addCredit': ('submit', 'AddCarbonCredit'),
+    'addCredits': ('submit', 'AddCarbonCredits'),
+    'queryAll': ('evaluate', 'QueryAllCredits'),
+    'queryPage': ('evaluate', 'QueryCreditsWithPagination'),
+    'getCredit': ('evaluate', 'GetCreditById')
+}
+
+
+def _to_arg(value):
+    # Chaincode arguments travel as strings
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value if isinstance(value, str) else str(value)
+
+
+class ChaincodeSimulator:
+    """
+    A simulated peer and orderer running CarbonCreditContract in-process
+
+    Transactions from any number of threads execute concurrently against committed
+    state and are serialised only at commit, like endorsement followed by ordering.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, commit_ms: float = 0.0,
+                 contract: Optional[CarbonCreditContract] = None, max_events: Optional[int] = DEFAULT_MAX_EVENTS):
+        """
+        Args:
+            latency_ms: Simulated endorse-and-order round trip added to every submitted
+                transaction (evaluations are answered immediately); transactions wait it
+                out concurrently
+            commit_ms: Simulated validation and commit time per transaction, spent one
+                transaction at a time as on a peer, so it bounds transactions per second
+            contract: Contract instance to run, CarbonCreditContract by default
+            max_events: Most recent committed events kept in `events` (None keeps all);
+                listeners see every event, and drain_events() hands them off
+        """
+        self.latency = latency_ms / 1000.0
+        self.commit_time = commit_ms / 1000.0
+        self.contract = contract or CarbonCreditContract()
+        self.state = WorldState()
+        self.events: Deque[Dict[str, Any]] = collections.deque(maxlen=max_events)
+        self.submitted = 0
+        self.failed = 0
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._stats_lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+
+    def drain_events(self) -> List[Dict[str, Any]]:
+        """Remove and return the kept events, oldest first"""
+        with self._stats_lock:
+            events = list(self.events)
+            self.events.clear()
+        return events
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], None]):
+        """Call callback(event) for every committed chaincode event"""
+        self._listeners.append(callback)
+
+    def _invoke(self, function: str, args, read_only: bool):
+        method = getattr(self.contract, function, None)
+        if function.startswith('_') or not callable(method):
+            raise ChaincodeError(f"Unknown chaincode function {function}")
+        stub = ChaincodeStub(self.state, hashlib.sha256(os.urandom(32)).hexdigest(), read_only=read_only)
+        return stub, method(Context(stub), *[_to_arg(arg) for arg in args])
+
+    def evaluate(self, function: str, *args) -> str:
+        """Run a chaincode function read-only and return its result without committing"""
+        _, result = self._invoke(function, args, read_only=True)
+        return result
+
+    def submit(self, function: str, *args) -> str:
+        """
+        Run a chaincode function and commit its writes and event
+
+        Raises:
+            ChaincodeError: If the function fails or its reads went stale (nothing is written)
+        """
+        try:
+            stub, result = self._invoke(function, args, read_only=False)
+            if self.latency:
+                time.sleep(self.latency)
+            with self._commit_lock:
+                if self.commit_time:
+                    time.sleep(self.commit_time)
+                block = self.state.commit(stub.reads, stub.writes)
+        except Exception:
+            with self._stats_lock:
+                self.failed += 1
+            raise
+        with self._stats_lock:
+            self.submitted += 1
+            if stub.event is not None:
+                event = {"txId": stub.tx_id, "name": stub.event[0], "payload": stub.event[1], "block": block}
+                self.events.append(event)
+            else:
+                event = None
+        if event is not None:
+            for listener in self._listeners:
+                listener(event)
+        return result
+
+    def call(self, method: str, *params: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Same interface as FabricSidecar.call: run a client method and return its parsed result
+
+        Raises:
+            ChaincodeError: On unknown methods and chaincode failures
+        """
+        if method == 'ping':
+            return 'pong'
+        if method not in CLIENT_METHODS:
+            raise ChaincodeError(f"Unknown method {method}")
+        kind, function = CLIENT_METHODS[method]
+        result = self.submit(function, *params) if kind == 'submit' else self.evaluate(function, *params)
+        try:
+            return json.loads(result)
+        except ValueError:
+            return result
+
+    def close(self):
+        pass
@@ -5,14 +5,26 @@ Save as: blockchain/fabric_client.js
 
 Usage:
   node fabric_client.js addCredit '{...json...}'
+  node fabric_client.js addCredits '[{...json...}, ...]'
   node fabric_client.js queryAll
+  node fabric_client.js queryPage 100 [bookmark]
+  node fabric_client.js serve                      # JSON-RPC over stdin/stdout
+  node fabric_client.js serve --socket /tmp/fabric.sock
+
+Serve mode keeps one connected Gateway for the life of the process and answers
+newline-delimited JSON requests, {"id": 1, "method": "addCredit", "params": [{...}]},
+with {"id": 1, "result": ...} or {"id": 1, "error": {"message": "..."}}. Requests
+are handled concurrently, so responses may arrive out of order; match them by id.
+Logs go to stderr so stdout carries only responses.
 */
 
 'use strict';
 
 const { Gateway, Wallets } = require('fabric-network');
 const fs = require('fs');
+const net = require('net');
 const path = require('path');
+const readline = require('readline');
 
 const CONNECTION_PROFILE = process.env.FABRIC_CONNECTION_PROFILE || path.resolve(__dirname, 'connection.json');
 const WALLET_PATH = process.env.FABRIC_WALLET || path.resolve(__dirname, 'wallet');
@@ -37,32 +49,138 @@ async function initGateway() {
     return gateway;
 }
 
-async function addCredit(creditJson) {
+async function getContract(gateway) {
+    const network = await gateway.getNetwork(CHANNEL_NAME);
+    return network.getContract(CHAINCODE_NAME);
+}
+
+function toJson(value) {
+    return typeof value === 'string' ? value : JSON.stringify(value);
+}
+
+// Contract calls shared by the one-shot CLI and serve mode
+const METHODS = {
+    addCredit: (contract, creditJson) => contract.submitTransaction('AddCarbonCredit', toJson(creditJson)),
+    addCredits: (contract, creditsJson) => contract.submitTransaction('AddCarbonCredits', toJson(creditsJson)),
+    queryAll: (contract) => contract.evaluateTransaction('QueryAllCredits'),
+    queryPage: (contract, pageSize, bookmark) =>
+        contract.evaluateTransaction('QueryCreditsWithPagination', String(pageSize), bookmark || ''),
+    ping: async () => Buffer.from('"pong"')
+};
+
+async function withGateway(fn) {
     const gateway = await initGateway();
     try {
-        const network = await gateway.getNetwork(CHANNEL_NAME);
-        const contract = network.getContract(CHAINCODE_NAME);
-        const input = typeof creditJson === 'string' ? creditJson : JSON.stringify(creditJson);
-        const result = await contract.submitTransaction('AddCarbonCredit', input);
-        await gateway.disconnect();
-        return result.toString();
-    } catch (err) {
+        return await fn(await getContract(gateway));
+    } finally {
         await gateway.disconnect();
-        throw err;
     }
 }
 
+async function addCredit(creditJson) {
+    const result = await withGateway((contract) => METHODS.addCredit(contract, creditJson));
+    return result.toString();
+}
+
+async function addCredits(creditsJson) {
+    const result = await withGateway((contract) => METHODS.addCredits(contract, creditsJson));
+    return result.toString();
+}
+
 async function queryAll() {
-    const gateway = await initGateway();
+    const result = await withGateway((contract) => METHODS.queryAll(contract));
+    return result.toString();
+}
+
+async function queryPage(pageSize, bookmark) {
+    const result = await withGateway((contract) => METHODS.queryPage(contract, pageSize, bookmark));
+    return result.toString();
+}
+
+function parseResult(buffer) {
+    const text = buffer.toString('utf8');
     try {
-        const network = await gateway.getNetwork(CHANNEL_NAME);
-        const contract = network.getContract(CHAINCODE_NAME);
-        const result = await contract.evaluateTransaction('QueryAllCredits');
-        await gateway.disconnect();
-        return result.toString();
+        return JSON.parse(text);
     } catch (err) {
-        await gateway.disconnect();
-        throw err;
+        return text;
+    }
+}
+
+function writeLine(output, message) {
+    // Resolves once the line is handed to the OS, so exiting afterwards cannot drop it
+    return new Promise((resolve) => output.write(JSON.stringify(message) + '\n', () => resolve()));
+}
+
+async function answer(line, output, contract) {
+    let request;
+    try {
+        request = JSON.parse(line);
+    } catch (err) {
+        await writeLine(output, { id: null, error: { message: `Invalid request: ${err.message}` } });
+        return;
+    }
+    const method = METHODS[request.method];
+    let response;
+    try {
+        if (!method) {
+            throw new Error(`Unknown method ${request.method}`);
+        }
+        const result = await method(contract, ...(request.params || []));
+        response = { id: request.id, result: parseResult(result) };
+    } catch (err) {
+        response = { id: request.id, error: { message: err.message || String(err) } };
+    }
+    await writeLine(output, response);
+}
+
+// Answer each request line on its own, without waiting for earlier ones. The
+// returned interface's settled() resolves once every request read so far is answered
+function handleLines(input, output, contract) {
+    const lines = readline.createInterface({ input, crlfDelay: Infinity });
+    const pending = new Set();
+    lines.on('line', (line) => {
+        if (!line.trim()) {
+            return;
+        }
+        const reply = answer(line, output, contract);
+        pending.add(reply);
+        reply.finally(() => pending.delete(reply));
+    });
+    lines.settled = () => Promise.all(pending);
+    return lines;
+}
+
+async function serve(socketPath) {
+    const gateway = await initGateway();
+    const contract = await getContract(gateway);
+    let closing = null;
+    const shutdown = () => {
+        closing = closing || (async () => {
+            await gateway.disconnect();
+            process.exit(0);
+        })();
+        return closing;
+    };
+    process.on('SIGTERM', shutdown);
+    process.on('SIGINT', shutdown);
+
+    if (socketPath) {
+        if (fs.existsSync(socketPath)) {
+            fs.unlinkSync(socketPath);
+        }
+        const server = net.createServer((socket) => {
+            handleLines(socket, socket, contract);
+            socket.on('error', (err) => console.error('Sidecar connection error:', err.message));
+        });
+        server.listen(socketPath, () => console.error(`Fabric sidecar listening on ${socketPath}`));
+    } else {
+        // The parent closing stdin ends the sidecar, once the requests it already sent are answered
+        const lines = handleLines(process.stdin, process.stdout, contract);
+        lines.on('close', async () => {
+            await lines.settled();
+            await shutdown();
+        });
+        console.error('Fabric sidecar serving on stdin/stdout');
     }
 }
 
@@ -80,11 +198,28 @@ if (require.main === module) {
                 }
                 const res = await addCredit(payload);
                 console.log('AddCredit result:', res);
+            } else if (action === 'addCredits') {
+                if (!payload) {
+                    console.error('Usage: node fabric_client.js addCredits "[{...json...}, ...]"');
+                    process.exit(1);
+                }
+                const res = await addCredits(payload);
+                console.log('AddCredits result:', res);
             } else if (action === 'queryAll') {
                 const res = await queryAll();
                 console.log('QueryAll result:', res);
+            } else if (action === 'queryPage') {
+                if (!payload) {
+                    console.error('Usage: node fabric_client.js queryPage <pageSize> [bookmark]');
+                    process.exit(1);
+                }
+                const res = await queryPage(payload, process.argv[4]);
+                console.log('QueryPage result:', res);
+            } else if (action === 'serve') {
+                const socketIndex = process.argv.indexOf('--socket');
+                await serve(socketIndex > 0 ? process.argv[socketIndex + 1] : null);
             } else {
-                console.error('Unknown action. Use addCredit or queryAll');
+                console.error('Unknown action. Use addCredit, addCredits, queryAll, queryPage or serve');
                 process.exit(1);
             }
         } catch (err) {
@@ -94,4 +229,4 @@ if (require.main === module) {
     })();
 }
 
-module.exports = { addCredit, queryAll };
+module.exports = { addCredit, addCredits, queryAll, queryPage, serve };
@@ -1,32 +1,317 @@
 """
 Python wrapper for Hyperledger Fabric interactions.
-This file calls the Node.js fabric_client.js via subprocess to submit and query chaincode.
+This file drives the Node.js fabric_client.js to submit and query chaincode, either
+by spawning a node process per call (the default) or, with FABRIC_CLIENT_MODE=sidecar,
+through one long-lived `fabric_client.js serve` sidecar holding a connected Gateway,
+which saves connecting a Gateway on every call. The "simulator" mode instead runs the
+chaincode in-process against a simulated world state (chaincode/carbon_credits.py),
+for local runs and load tests without a network.
 
 Provides:
  - issue_credits(credit_dict) -> dict
+ - issue_credits_batch(credit_dicts) -> dict
  - query_all_credits() -> list
+ - query_credits_page(page_size, bookmark) -> dict
+ - iter_credits(page_size) -> iterator over credits, one page in memory at a time
+
+AsyncFabricService offers the same operations as coroutines with a bounded number
+of calls in flight; SyncFabricService offers FabricService's blocking methods over
+one running on a background event loop.
 
 Note: Requires Node.js runtime and the fabric client dependencies to be installed.
 """
+import asyncio
+import functools
+import importlib.util
+import itertools
 import json
+import logging
+import os
+import socket
 import subprocess
-import shlex
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
 
 ROOT = Path(__file__).resolve().parent
 FABRIC_CLIENT = ROOT / 'fabric_client.js'
+SIMULATOR = ROOT / 'chaincode' / 'carbon_credits.py'
+CLIENT_MODES = ('sidecar', 'subprocess', 'simulator')
+DEFAULT_CLIENT_MODE = 'subprocess'
+# Matches MAX_BATCH_CREDITS in chaincode/carbon_credits.js
+MAX_BATCH_CREDITS = 500
+# Matches MAX_PAGE_SIZE in chaincode/carbon_credits.js
+MAX_PAGE_SIZE = 1000
+DEFAULT_PAGE_SIZE = 200
+DEFAULT_TIMEOUT = 60.0
+
+logger = logging.getLogger(__name__)
 
 
 class FabricServiceError(Exception):
     pass
 
 
-class FabricService:
-    def __init__(self, node_bin: str = 'node'):
+class FabricSidecar:
+    """
+    Client for a `fabric_client.js serve` process speaking newline-delimited JSON-RPC.
+
+    Requests from any number of threads share the one connection: each carries an id
+    and a reader thread resolves the matching future, so calls overlap on the Gateway
+    instead of queueing. The sidecar is (re)started on first use and after it exits.
+    """
+
+    def __init__(self, command: Optional[List[str]] = None, socket_path: Optional[str] = None):
+        """
+        Args:
+            command: Command starting a sidecar that serves on its stdin/stdout
+            socket_path: Unix socket of an already running sidecar (`serve --socket`),
+                which lets several worker processes share one Gateway
+        """
+        if (command is None) == (socket_path is None):
+            raise ValueError("Pass exactly one of command or socket_path")
+        self.command = command
+        self.socket_path = socket_path
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+        self._process = None
+        self._socket = None
+        self._reader = None
+        self._writer = None
+        self._stderr_tail: List[str] = []
+
+    def _connect(self):
+        """Start the sidecar or connect to its socket (caller holds _lock)"""
+        if self._writer is not None:
+            return
+        if self.socket_path is not None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(self.socket_path)
+            self._reader = self._socket.makefile('rb')
+            self._writer = self._socket.makefile('wb')
+        else:
+            self._process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                             stderr=subprocess.PIPE)
+            self._reader, self._writer = self._process.stdout, self._process.stdin
+            threading.Thread(target=self._drain_stderr, args=(self._process,), name="fabric-sidecar-stderr",
+                             daemon=True).start()
+        threading.Thread(target=self._read_responses, args=(self._reader,), name="fabric-sidecar-reader",
+                         daemon=True).start()
+        logger.info(f"Fabric sidecar connected ({self.socket_path or ' '.join(self.command)})")
+
+    def _drain_stderr(self, process):
+        for line in process.stderr:
+            text = line.decode('utf-8', 'replace').rstrip()
+            self._stderr_tail = (self._stderr_tail + [text])[-20:]
+            logger.debug(f"fabric sidecar: {text}")
+
+    def _read_responses(self, reader):
+        try:
+            for line in reader:
+                self._resolve(line)
+        except (OSError, ValueError):
+            # Closed under the reader by close()
+            pass
+        self._disconnected(reader)
+
+    def _resolve(self, line):
+        try:
+            response = json.loads(line)
+        except ValueError:
+            logger.warning(f"Ignoring malformed sidecar response: {line[:200]!r}")
+            return
+        with self._lock:
+            future = self._pending.pop(response.get('id'), None)
+        if future is None:
+            if response.get('error'):
+                logger.warning(f"Fabric sidecar error: {response['error'].get('message')}")
+            return
+        if 'error' in response:
+            future.set_exception(FabricServiceError(response['error'].get('message', 'sidecar error')))
+        else:
+            future.set_result(response.get('result'))
+
+    def _disconnected(self, reader):
+        """Fail the requests in flight when the sidecar goes away; the next call reconnects"""
+        with self._lock:
+            if reader is not self._reader:
+                return
+            pending, self._pending = self._pending, {}
+            self._reset()
+        detail = '; '.join(self._stderr_tail[-3:])
+        for future in pending.values():
+            future.set_exception(FabricServiceError(f"Fabric sidecar exited{': ' + detail if detail else ''}"))
+
+    def _reset(self):
+        for stream in (self._writer, self._reader, self._socket):
+            try:
+                if stream is not None:
+                    stream.close()
+            except OSError:
+                pass
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+        self._process = self._socket = self._reader = self._writer = None
+
+    def submit(self, method: str, *params: Any) -> Future:
+        """Send a request without waiting for it; returns a Future of its result"""
+        future = Future()
+        with self._lock:
+            try:
+                self._connect()
+            except OSError as e:
+                self._reset()
+                raise FabricServiceError(f"Cannot start Fabric sidecar: {e}")
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            writer = self._writer
+        line = (json.dumps({"id": request_id, "method": method, "params": list(params)}) + '\n').encode('utf-8')
+        try:
+            with self._write_lock:
+                writer.write(line)
+                writer.flush()
+        except (OSError, ValueError) as e:
+            with self._lock:
+                self._pending.pop(request_id, None)
+            raise FabricServiceError(f"Fabric sidecar unavailable: {e}")
+        return future
+
+    def call(self, method: str, *params: Any, timeout: Optional[float] = DEFAULT_TIMEOUT) -> Any:
+        future = self.submit(method, *params)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            raise FabricServiceError(f"Fabric sidecar call {method} timed out after {timeout}s")
+
+    def close(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._reset()
+        for future in pending.values():
+            future.set_exception(FabricServiceError("Fabric sidecar closed"))
+
+
+def load_simulator():
+    """The chaincode simulator module, loaded by path as chaincode/ is not a package"""
+    spec = importlib.util.spec_from_file_location('carbon_credits_simulator', SIMULATOR)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# CLI arguments and result label of each method in subprocess mode
+_CLI_CALLS = {
+    'addCredit': (lambda credit: ['addCredit', json.dumps(credit)], 'AddCredit result:'),
+    'addCredits': (lambda credits: ['addCredits', json.dumps(credits)], 'AddCredits result:'),
+    'queryAll': (lambda: ['queryAll'], 'QueryAll result:'),
+    'queryPage': (lambda size, bookmark='': ['queryPage', str(size)] + ([bookmark] if bookmark else []),
+                  'QueryPage result:')
+}
+
+
+def _parse_cli_output(out: str, label: str) -> Any:
+    """The JSON result the CLI prints after its label; raises ValueError if there is none"""
+    return json.loads(out.split(label, 1)[-1])
+
+
+def _check_batch(credits: List[Dict[str, Any]]):
+    if not credits:
+        raise FabricServiceError("issue_credits_batch needs at least one credit")
+    if len(credits) > MAX_BATCH_CREDITS:
+        raise FabricServiceError(f"A batch holds at most {MAX_BATCH_CREDITS} credits, got {len(credits)}")
+
+
+def _check_page_size(page_size: int):
+    if not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise FabricServiceError(f"page_size must be between 1 and {MAX_PAGE_SIZE}, got {page_size}")
+
+
+def _check_result(method: str, result: Any) -> Dict[str, Any]:
+    if not isinstance(result, dict) or (method == 'queryPage' and 'records' not in result):
+        raise FabricServiceError(f"Unexpected {method} result: {result!r}")
+    return result
+
+
+def _next_bookmark(page: Dict[str, Any], page_size: int, bookmark: str) -> Optional[str]:
+    """Bookmark of the page after this one, or None when this was the last"""
+    next_bookmark = page.get('bookmark') or ''
+    if len(page['records']) < page_size or not next_bookmark or next_bookmark == bookmark:
+        return None
+    return next_bookmark
+
+
+class _CreditPages:
+    """Credit iteration over a blocking query_credits_page"""
+
+    def iter_credit_pages(self, page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the ledger's credits page by page, following bookmarks until a short page."""
+        bookmark = ''
+        while bookmark is not None:
+            page = self.query_credits_page(page_size, bookmark)
+            if page['records']:
+                yield page['records']
+            bookmark = _next_bookmark(page, page_size, bookmark)
+
+    def iter_credits(self, page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+        """Yield every credit on the ledger while holding only one page in memory.
+
+        Use this instead of query_all_credits for reconciliation and exports.
+        """
+        for records in self.iter_credit_pages(page_size):
+            yield from records
+
+
+class FabricService(_CreditPages):
+    def __init__(self, node_bin: str = 'node', mode: Optional[str] = None, socket_path: Optional[str] = None,
+                 timeout: float = DEFAULT_TIMEOUT, simulator: Any = None):
+        """
+        Args:
+            node_bin: Node.js executable
+            mode: "subprocess" (a node process per call), "sidecar" (one long-lived
+                fabric_client.js holding the Gateway) or "simulator" (the chaincode
+                run in-process, no network); defaults to FABRIC_CLIENT_MODE or "subprocess"
+            socket_path: Unix socket of a sidecar started separately with
+                `fabric_client.js serve --socket`; defaults to FABRIC_SIDECAR_SOCKET
+            timeout: Seconds to wait for a sidecar response
+            simulator: ChaincodeSimulator to use in simulator mode, e.g. one shared by
+                several services; by default a new one with FABRIC_SIMULATOR_LATENCY_MS
+                of simulated latency and FABRIC_SIMULATOR_COMMIT_MS of serial commit time
+                per submitted transaction
+        """
         self.node_bin = node_bin
+        self.mode = mode or os.environ.get('FABRIC_CLIENT_MODE', DEFAULT_CLIENT_MODE)
+        if self.mode not in CLIENT_MODES:
+            raise FabricServiceError(f"Unknown Fabric client mode {self.mode!r}, expected one of {CLIENT_MODES}")
+        self.timeout = timeout
+        self._client = None
+        if self.mode == 'simulator':
+            # Same call() interface as the sidecar, so every method below works unchanged
+            self._client = simulator or load_simulator().ChaincodeSimulator(
+                latency_ms=float(os.environ.get('FABRIC_SIMULATOR_LATENCY_MS', '0')),
+                commit_ms=float(os.environ.get('FABRIC_SIMULATOR_COMMIT_MS', '0')))
+            return
         if not FABRIC_CLIENT.exists():
             raise FabricServiceError(f"Fabric client not found at {FABRIC_CLIENT}")
+        if self.mode == 'sidecar':
+            socket_path = socket_path or os.environ.get('FABRIC_SIDECAR_SOCKET')
+            if socket_path:
+                self._client = FabricSidecar(socket_path=socket_path)
+            else:
+                self._client = FabricSidecar(command=[self.node_bin, str(FABRIC_CLIENT), 'serve'])
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def _run_node(self, args: List[str], input_data: Any = None) -> str:
         cmd = [self.node_bin, str(FABRIC_CLIENT)] + args
@@ -55,6 +340,15 @@ class FabricService:
         except FileNotFoundError as e:
             raise FabricServiceError(f"Node binary not found: {e}")
 
+    def _run_cli(self, method: str, *params: Any) -> Any:
+        """Run one client method as a node process and parse the result it prints after its label"""
+        build_args, label = _CLI_CALLS[method]
+        out = self._run_node(build_args(*params))
+        try:
+            return _parse_cli_output(out, label)
+        except ValueError:
+            return {'raw': out}
+
     def issue_credits(self, credit: Dict[str, Any]) -> Dict[str, Any]:
         """Issue (add) carbon credits to the Fabric ledger.
 
@@ -62,28 +356,419 @@ class FabricService:
         returns parsed JSON result from chaincode
         """
         try:
-            args = ['addCredit', json.dumps(credit)]
-            out = self._run_node(args)
-            # chaincode returns a JSON string
-            try:
-                return json.loads(out)
-            except Exception:
-                return { 'raw': out }
+            if self._client is not None:
+                result = self._client.call('addCredit', credit, timeout=self.timeout)
+                return result if isinstance(result, dict) else {'raw': result}
+            return self._run_cli('addCredit', credit)
+        except Exception as e:
+            raise FabricServiceError(str(e))
+
+    def issue_credits_batch(self, credits: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Issue many carbon credits in one AddCarbonCredits transaction (all or nothing).
+
+        credits: list of issue_credits payloads, at most MAX_BATCH_CREDITS
+        returns { success, txId, count, creditIds } from chaincode
+        """
+        _check_batch(credits)
+        try:
+            if self._client is not None:
+                result = self._client.call('addCredits', credits, timeout=self.timeout)
+            else:
+                result = self._run_cli('addCredits', credits)
+            return _check_result('addCredits', result)
+        except FabricServiceError:
+            raise
         except Exception as e:
             raise FabricServiceError(str(e))
 
     def query_all_credits(self) -> List[Dict[str, Any]]:
         try:
-            args = ['queryAll']
-            out = self._run_node(args)
-            try:
-                return json.loads(out)
-            except Exception:
-                # If chaincode returned a stringified JSON, attempt to extract
-                return json.loads(out)
+            if self._client is not None:
+                return self._client.call('queryAll', timeout=self.timeout)
+            return self._run_cli('queryAll')
         except Exception as e:
             raise FabricServiceError(str(e))
 
+    def query_credits_page(self, page_size: int = DEFAULT_PAGE_SIZE, bookmark: str = '') -> Dict[str, Any]:
+        """Fetch one page of credits with QueryCreditsWithPagination.
+
+        bookmark: '' for the first page, then the bookmark of the previous page
+        returns { records, fetchedRecordsCount, bookmark } from chaincode
+        """
+        _check_page_size(page_size)
+        try:
+            if self._client is not None:
+                result = self._client.call('queryPage', page_size, bookmark, timeout=self.timeout)
+            else:
+                result = self._run_cli('queryPage', page_size, bookmark)
+            return _check_result('queryPage', result)
+        except FabricServiceError:
+            raise
+        except Exception as e:
+            raise FabricServiceError(str(e))
+
+
+
+# Line limit for asyncio streams: a queryAll response holds the whole ledger
+STREAM_LIMIT = 64 * 2 ** 20
+DEFAULT_MAX_IN_FLIGHT = 16
+
+
+class AsyncFabricSidecar:
+    """
+    asyncio client for a `fabric_client.js serve` process, the counterpart of FabricSidecar.
+
+    Requests are multiplexed over one connection by id and resolved by a reader task;
+    the sidecar is (re)started on first use and after it exits. Use from one event loop.
+    """
+
+    def __init__(self, command: Optional[List[str]] = None, socket_path: Optional[str] = None):
+        """
+        Args:
+            command: Command starting a sidecar that serves on its stdin/stdout
+            socket_path: Unix socket of an already running sidecar (`serve --socket`)
+        """
+        if (command is None) == (socket_path is None):
+            raise ValueError("Pass exactly one of command or socket_path")
+        self.command = command
+        self.socket_path = socket_path
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._connect_lock = None
+        self._process = None
+        self._reader = None
+        self._writer = None
+        self._stderr_tail: List[str] = []
+        self._tasks = set()
+
+    def _spawn(self, coroutine):
+        # Keep a reference so the task is not garbage collected while running
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _connect(self):
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+            if self.socket_path is not None:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path, limit=STREAM_LIMIT)
+            else:
+                self._process = await asyncio.create_subprocess_exec(
+                    *self.command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE, limit=STREAM_LIMIT)
+                self._reader, self._writer = self._process.stdout, self._process.stdin
+                self._spawn(self._drain_stderr(self._process))
+            self._spawn(self._read_responses(self._reader))
+            logger.info(f"Fabric sidecar connected ({self.socket_path or ' '.join(self.command)})")
+
+    async def _drain_stderr(self, process):
+        async for line in process.stderr:
+            text = line.decode('utf-8', 'replace').rstrip()
+            self._stderr_tail = (self._stderr_tail + [text])[-20:]
+            logger.debug(f"fabric sidecar: {text}")
+
+    async def _read_responses(self, reader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._resolve(line)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Fabric sidecar connection lost: {e}")
+        self._disconnected(reader)
+
+    def _resolve(self, line):
+        try:
+            response = json.loads(line)
+        except ValueError:
+            logger.warning(f"Ignoring malformed sidecar response: {line[:200]!r}")
+            return
+        future = self._pending.pop(response.get('id'), None)
+        if future is None or future.done():
+            if response.get('error'):
+                logger.warning(f"Fabric sidecar error: {response['error'].get('message')}")
+            return
+        if 'error' in response:
+            future.set_exception(FabricServiceError(response['error'].get('message', 'sidecar error')))
+        else:
+            future.set_result(response.get('result'))
+
+    def _disconnected(self, reader):
+        """Fail the requests in flight when the sidecar goes away; the next call reconnects"""
+        if reader is not self._reader:
+            return
+        pending, self._pending = self._pending, {}
+        self._reset()
+        detail = '; '.join(self._stderr_tail[-3:])
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(FabricServiceError(f"Fabric sidecar exited{': ' + detail if detail else ''}"))
+
+    def _reset(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._process is not None and self._process.returncode is None:
+            self._process.terminate()
+        self._process = self._reader = self._writer = None
+
+    async def call(self, method: str, *params: Any, timeout: Optional[float] = DEFAULT_TIMEOUT) -> Any:
+        try:
+            await self._connect()
+        except OSError as e:
+            self._reset()
+            raise FabricServiceError(f"Cannot start Fabric sidecar: {e}")
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        writer = self._writer
+        try:
+            writer.write((json.dumps({"id": request_id, "method": method, "params": list(params)}) + '\n')
+                         .encode('utf-8'))
+            await writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise FabricServiceError(f"Fabric sidecar call {method} timed out after {timeout}s")
+        except (OSError, RuntimeError) as e:
+            raise FabricServiceError(f"Fabric sidecar unavailable: {e}")
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def close(self):
+        process = self._process
+        pending, self._pending = self._pending, {}
+        self._reset()
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(FabricServiceError("Fabric sidecar closed"))
+        if process is not None:
+            await process.wait()
+
+
+class AsyncFabricService:
+    """
+    asyncio counterpart of FabricService: the same operations as coroutines.
+
+    At most max_in_flight calls are outstanding at once, whatever the number of
+    callers; the rest wait on a semaphore, so a burst of requests overlaps on the
+    network up to that limit instead of queueing one behind another or flooding
+    the Gateway. Use one instance from a single event loop.
+    """
+
+    def __init__(self, node_bin: str = 'node', mode: Optional[str] = None, socket_path: Optional[str] = None,
+                 timeout: float = DEFAULT_TIMEOUT, simulator: Any = None,
+                 max_in_flight: Optional[int] = None, sidecar: Optional[AsyncFabricSidecar] = None):
+        """
+        Args:
+            node_bin, mode, socket_path, timeout, simulator: As for FabricService; in
+                subprocess mode each call is an asyncio child process
+            max_in_flight: Maximum concurrent calls to Fabric; defaults to
+                FABRIC_MAX_IN_FLIGHT or 16
+            sidecar: AsyncFabricSidecar to use in sidecar mode instead of starting
+                `fabric_client.js serve`; passing one selects sidecar mode unless a
+                mode is given
+        """
+        self.node_bin = node_bin
+        if mode is None and sidecar is not None:
+            mode = 'sidecar'
+        self.mode = mode or os.environ.get('FABRIC_CLIENT_MODE', DEFAULT_CLIENT_MODE)
+        if self.mode not in CLIENT_MODES:
+            raise FabricServiceError(f"Unknown Fabric client mode {self.mode!r}, expected one of {CLIENT_MODES}")
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight or int(os.environ.get('FABRIC_MAX_IN_FLIGHT', DEFAULT_MAX_IN_FLIGHT))
+        if self.max_in_flight < 1:
+            raise FabricServiceError(f"max_in_flight must be at least 1, got {self.max_in_flight}")
+        self._semaphore = None
+        self._sidecar = None
+        self._simulator = None
+        if self.mode == 'simulator':
+            self._simulator = simulator or load_simulator().ChaincodeSimulator(
+                latency_ms=float(os.environ.get('FABRIC_SIMULATOR_LATENCY_MS', '0')),
+                commit_ms=float(os.environ.get('FABRIC_SIMULATOR_COMMIT_MS', '0')))
+            return
+        if sidecar is None and not FABRIC_CLIENT.exists():
+            raise FabricServiceError(f"Fabric client not found at {FABRIC_CLIENT}")
+        if self.mode == 'sidecar':
+            socket_path = socket_path or os.environ.get('FABRIC_SIDECAR_SOCKET')
+            if sidecar is not None:
+                self._sidecar = sidecar
+            elif socket_path:
+                self._sidecar = AsyncFabricSidecar(socket_path=socket_path)
+            else:
+                self._sidecar = AsyncFabricSidecar(command=[self.node_bin, str(FABRIC_CLIENT), 'serve'])
+
+    async def _run_node(self, method: str, *params: Any) -> Any:
+        build_args, label = _CLI_CALLS[method]
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                self.node_bin, str(FABRIC_CLIENT), *build_args(*params),
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        except FileNotFoundError as e:
+            raise FabricServiceError(f"Node binary not found: {e}")
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), self.timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise FabricServiceError(f"Fabric call {method} timed out after {self.timeout}s")
+        if proc.returncode != 0:
+            raise FabricServiceError(
+                f"Node process failed: rc={proc.returncode}, stderr={stderr.decode('utf-8').strip()}")
+        out = stdout.decode('utf-8').strip()
+        try:
+            return _parse_cli_output(out, label)
+        except ValueError:
+            return {'raw': out}
+
+    async def call(self, method: str, *params: Any) -> Any:
+        """Run a client method (addCredit, addCredits, queryAll, queryPage) once a slot is free"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        async with self._semaphore:
+            try:
+                if self._simulator is not None:
+                    # The simulator blocks for its simulated latency, so it runs off the loop
+                    return await asyncio.get_running_loop().run_in_executor(
+                        None, functools.partial(self._simulator.call, method, *params))
+                if self._sidecar is not None:
+                    return await self._sidecar.call(method, *params, timeout=self.timeout)
+                return await self._run_node(method, *params)
+            except FabricServiceError:
+                raise
+            except Exception as e:
+                raise FabricServiceError(str(e))
+
+    async def issue_credits(self, credit: Dict[str, Any]) -> Dict[str, Any]:
+        """Issue (add) carbon credits to the Fabric ledger; see FabricService.issue_credits"""
+        result = await self.call('addCredit', credit)
+        return result if isinstance(result, dict) else {'raw': result}
+
+    async def issue_credits_batch(self, credits: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Issue many carbon credits in one AddCarbonCredits transaction (all or nothing)"""
+        _check_batch(credits)
+        return _check_result('addCredits', await self.call('addCredits', credits))
+
+    async def query_all_credits(self) -> List[Dict[str, Any]]:
+        return await self.call('queryAll')
+
+    async def query_credits_page(self, page_size: int = DEFAULT_PAGE_SIZE, bookmark: str = '') -> Dict[str, Any]:
+        """Fetch one page of credits with QueryCreditsWithPagination"""
+        _check_page_size(page_size)
+        return _check_result('queryPage', await self.call('queryPage', page_size, bookmark))
+
+    async def iter_credits(self, page_size: int = DEFAULT_PAGE_SIZE) -> AsyncIterator[Dict[str, Any]]:
+        """Yield every credit on the ledger while holding only one page in memory"""
+        bookmark = ''
+        while bookmark is not None:
+            page = await self.query_credits_page(page_size, bookmark)
+            for record in page['records']:
+                yield record
+            bookmark = _next_bookmark(page, page_size, bookmark)
+
+    async def close(self):
+        if self._sidecar is not None:
+            await self._sidecar.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class _LoopClient:
+    """Runs coroutines of an AsyncFabricService on an event loop in a background thread"""
+
+    def __init__(self, service: AsyncFabricService):
+        self.service = service
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="fabric-event-loop", daemon=True)
+        self._thread.start()
+
+    def run(self, coroutine, timeout: Optional[float] = None):
+        """
+        Run a coroutine on the loop and wait for its result
+
+        Raises:
+            FabricServiceError: If it has not finished after timeout seconds; it is then cancelled
+        """
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise FabricServiceError(f"Fabric call timed out after {timeout}s")
+
+    def call(self, method: str, *params: Any, timeout: Optional[float] = None) -> Any:
+        return self.run(self.service.call(method, *params), timeout)
+
+    def close(self):
+        if not self._loop.is_running():
+            return
+        try:
+            self.run(self.service.close(), self.service.timeout)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+
+
+class SyncFabricService(_CreditPages):
+    """
+    Blocking FabricService API over an AsyncFabricService.
+
+    The async service's event loop runs on a background thread, and every method
+    blocks only its calling thread while the call is in flight. Calls from many
+    threads (e.g. Flask workers issuing credits through LedgerService) share the
+    loop and overlap on the network up to max_in_flight. Each call waits at most
+    timeout seconds, including any wait for an in-flight slot.
+    """
+
+    def __init__(self, async_service: Optional[AsyncFabricService] = None, **kwargs: Any):
+        """
+        Args:
+            async_service: Service to drive; by default one built from kwargs, which
+                are AsyncFabricService's arguments
+        """
+        service = async_service or AsyncFabricService(**kwargs)
+        self.async_service = service
+        self.node_bin = service.node_bin
+        self.mode = service.mode
+        self.timeout = service.timeout
+        self._client = _LoopClient(service)
+
+    def close(self):
+        self._client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self, coroutine):
+        return self._client.run(coroutine, self.timeout)
+
+    def issue_credits(self, credit: Dict[str, Any]) -> Dict[str, Any]:
+        """Issue (add) carbon credits to the Fabric ledger; see FabricService.issue_credits"""
+        return self._run(self.async_service.issue_credits(credit))
+
+    def issue_credits_batch(self, credits: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Issue many carbon credits in one AddCarbonCredits transaction (all or nothing)"""
+        _check_batch(credits)
+        return self._run(self.async_service.issue_credits_batch(credits))
+
+    def query_all_credits(self) -> List[Dict[str, Any]]:
+        return self._run(self.async_service.query_all_credits())
+
+    def query_credits_page(self, page_size: int = DEFAULT_PAGE_SIZE, bookmark: str = '') -> Dict[str, Any]:
+        """Fetch one page of credits with QueryCreditsWithPagination"""
+        _check_page_size(page_size)
+        return self._run(self.async_service.query_credits_page(page_size, bookmark))
+
 
 # Simple CLI for quick tests
 if __name__ == '__main__':
@@ -107,5 +792,6 @@ if __name__ == '__main__':
         res = svc.issue_credits(sample)
         print('Issue result:', res)
     if args.test_query:
-        res = svc.query_all_credits()
-        print('Query result:', res)
+        for credit in svc.iter_credits():
+            print('Credit:', credit)
+    svc.close()
@@ -0,0 +1,217 @@
+"""
+Tests for the FabricService sidecar clients, sync and asyncio (request multiplexing, errors, restarts)
+The sidecar here is a small Python process speaking the same newline-delimited
+JSON-RPC protocol as `fabric_client.js serve`, so no Fabric network is needed
+Run with: python -m pytest test_fabric_service.py
+"""
+
+import asyncio
+import importlib.util
+import os
+import sys
+import textwrap
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# Loaded by path: the backend's own `blockchain` package shadows this directory in a shared test session
+_spec = importlib.util.spec_from_file_location(
+    "fabric_service", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'blockchain', 'fabric_service.py'))
+fabric_service = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(fabric_service)
+
+SIDECAR = textwrap.dedent('''
+    import json, os, sys, threading, time
+
+    lock = threading.Lock()
+    credits = [{"creditId": f"credit-{i:03d}", "credits": i} for i in range(25)]
+    pages = []
+
+    def handle(request):
+        method, params = request["method"], request.get("params", [])
+        if method == "exit":
+            os._exit(1)
+        if method == "sleep":
+            time.sleep(params[0])
+            response = {"id": request["id"], "result": params[0]}
+        elif method == "queryPage":
+            # Bookmark-based paging like getStateByPartialCompositeKeyWithPagination
+            page_size, bookmark = params
+            start = int(bookmark) if bookmark else 0
+            records = credits[start:start + page_size]
+            pages.append(len(records))
+            response = {"id": request["id"], "result": {
+                "records": records, "fetchedRecordsCount": len(records), "bookmark": str(start + len(records))}}
+        elif method == "pages":
+            response = {"id": request["id"], "result": pages}
+        elif method == "pid":
+            response = {"id": request["id"], "result": os.getpid()}
+        else:
+            response = {"id": request["id"], "error": {"message": f"Unknown method {method}"}}
+        with lock:
+            sys.stdout.write(json.dumps(response) + "\\n")
+            sys.stdout.flush()
+
+    for line in sys.stdin:
+        threading.Thread(target=handle, args=(json.loads(line),)).start()
+''')
+
+
+@pytest.fixture
+def sidecar(tmp_path):
+    script = tmp_path / "sidecar.py"
+    script.write_text(SIDECAR)
+    client = fabric_service.FabricSidecar(command=[sys.executable, str(script)])
+    yield client
+    client.close()
+
+
+def test_concurrent_calls_share_one_process(sidecar):
+    pid = sidecar.call("pid")
+    delays = [0.3, 0.1, 0.2, 0.05] * 3
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(delays)) as pool:
+        results = list(pool.map(lambda delay: sidecar.call("sleep", delay), delays))
+    elapsed = time.perf_counter() - started
+
+    # Responses arrive out of order but are matched to their requests, and the calls overlap
+    assert results == delays
+    assert elapsed < sum(delays) / 2
+    assert sidecar.call("pid") == pid
+
+
+def test_errors_and_restart(sidecar):
+    with pytest.raises(fabric_service.FabricServiceError, match="Unknown method"):
+        sidecar.call("missing")
+
+    pid = sidecar.call("pid")
+    pending = sidecar.submit("sleep", 5)
+    with pytest.raises(fabric_service.FabricServiceError, match="exited"):
+        sidecar.call("exit", timeout=5)
+    with pytest.raises(fabric_service.FabricServiceError):
+        pending.result(timeout=5)
+
+    # The next call starts a fresh sidecar
+    assert sidecar.call("pid") != pid
+
+
+def test_call_timeout(sidecar):
+    with pytest.raises(fabric_service.FabricServiceError, match="timed out"):
+        sidecar.call("sleep", 1, timeout=0.1)
+
+
+@pytest.fixture
+def service(sidecar):
+    svc = fabric_service.FabricService(mode="subprocess")
+    svc._client = sidecar
+    yield svc
+
+
+def test_iter_credits_follows_bookmarks(service, sidecar):
+    credits = service.iter_credits(page_size=10)
+    assert next(credits)["creditId"] == "credit-000"
+    # Pages are fetched lazily, as the iterator is consumed
+    assert sidecar.call("pages") == [10]
+
+    assert [c["creditId"] for c in credits] == [f"credit-{i:03d}" for i in range(1, 25)]
+    assert sidecar.call("pages") == [10, 10, 5]
+
+    assert [len(page) for page in service.iter_credit_pages(page_size=25)] == [25]
+    with pytest.raises(fabric_service.FabricServiceError, match="page_size"):
+        service.query_credits_page(page_size=0)
+
+
+# Stands in for node: prints what `node fabric_client.js <method> ...` prints, result label included
+FAKE_NODE = textwrap.dedent('''
+    #!{python}
+    import json, sys
+    method = sys.argv[2]
+    if method == "addCredit":
+        print("AddCredit result:", json.dumps({{"success": True, "creditId": json.loads(sys.argv[3])["creditId"]}}))
+    elif method == "queryAll":
+        print("QueryAll result:", json.dumps([{{"creditId": "credit-001"}}]))
+    elif method == "queryPage":
+        print("QueryPage result:", json.dumps({{"records": [], "fetchedRecordsCount": 0, "bookmark": ""}}))
+''')
+
+
+def test_subprocess_mode_is_the_default_and_parses_labelled_output(tmp_path, monkeypatch):
+    monkeypatch.delenv("FABRIC_CLIENT_MODE", raising=False)
+    node = tmp_path / "node"
+    node.write_text(FAKE_NODE.format(python=sys.executable).lstrip())
+    node.chmod(0o755)
+
+    svc = fabric_service.FabricService(node_bin=str(node))
+    assert svc.mode == "subprocess"
+    assert svc.issue_credits({"creditId": "credit-001"}) == {"success": True, "creditId": "credit-001"}
+    assert svc.query_all_credits() == [{"creditId": "credit-001"}]
+    assert svc.query_credits_page(page_size=10)["records"] == []
+
+
+def _async_service(tmp_path, **kwargs):
+    script = tmp_path / "sidecar.py"
+    script.write_text(SIDECAR)
+    sidecar = fabric_service.AsyncFabricSidecar(command=[sys.executable, str(script)])
+    return fabric_service.AsyncFabricService(sidecar=sidecar, **kwargs)
+
+
+def test_async_calls_overlap_up_to_limit(tmp_path):
+    async def run(service, calls):
+        async with service:
+            await service.call("pid")
+            started = time.perf_counter()
+            results = await asyncio.gather(*(service.call("sleep", 0.2) for _ in range(calls)))
+            return results, time.perf_counter() - started
+
+    # A dozen queued calls overlap instead of taking 12 x 0.2s
+    results, elapsed = asyncio.run(run(_async_service(tmp_path), 12))
+    assert results == [0.2] * 12
+    assert elapsed < 0.2 * 12 / 3
+
+    # With 4 in flight they run in three waves
+    _, elapsed = asyncio.run(run(_async_service(tmp_path, max_in_flight=4), 12))
+    assert 0.2 * 3 <= elapsed < 0.2 * 12 / 2
+
+
+def test_async_errors_and_restart(tmp_path):
+    async def run(service):
+        async with service:
+            with pytest.raises(fabric_service.FabricServiceError, match="Unknown method"):
+                await service.call("missing")
+            pid = await service.call("pid")
+            pending = asyncio.ensure_future(service.call("sleep", 5))
+            await asyncio.sleep(0.1)
+            with pytest.raises(fabric_service.FabricServiceError, match="exited"):
+                await service.call("exit")
+            with pytest.raises(fabric_service.FabricServiceError):
+                await pending
+            assert await service.call("pid") != pid
+
+    asyncio.run(run(_async_service(tmp_path)))
+
+
+def test_sync_facade_shares_async_service(tmp_path):
+    service = fabric_service.SyncFabricService(_async_service(tmp_path, max_in_flight=8))
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: service.query_credits_page(page_size=10)["fetchedRecordsCount"],
+                                    range(8)))
+        assert results == [10] * 8
+        assert [len(page) for page in service.iter_credit_pages(page_size=10)] == [10, 10, 5]
+    finally:
+        service.close()
+
+
+def test_sync_calls_time_out_and_release_their_slot(tmp_path):
+    service = fabric_service.SyncFabricService(_async_service(tmp_path, max_in_flight=1))
+    try:
+        started = time.perf_counter()
+        with pytest.raises(fabric_service.FabricServiceError, match="timed out"):
+            service._client.call("sleep", 5, timeout=0.3)
+        assert time.perf_counter() - started < 2
+        # The cancelled call gave its in-flight slot back
+        assert service.query_credits_page(page_size=5)["fetchedRecordsCount"] == 5
+    finally:
+        service.close()
@@ -0,0 +1,212 @@
+"""
+End-to-end tests of on-chain issuance against the in-process chaincode simulator
+LedgerService -> IssuanceBatcher -> FabricService(mode="simulator") -> carbon_credits.py,
+with no Fabric network or Node.js
+Run with: python -m pytest test_fabric_simulator.py
+"""
+
+import importlib.util
+import json
+import os
+import time
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+from blockchain import fabric  # noqa: E402
+from blockchain.fabric import FabricServiceError  # noqa: E402
+from blockchain.issuance_batcher import IssuanceBatcher  # noqa: E402
+from blockchain.ledger_service import LedgerService  # noqa: E402
+
+# Loaded by path: the backend's own `blockchain` package shadows this directory in a shared test session
+_spec = importlib.util.spec_from_file_location(
+    "fabric_service", os.path.join(ROOT, 'blockchain', 'fabric_service.py'))
+fabric_service = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(fabric_service)
+simulator = fabric_service.load_simulator()
+
+SAMPLE_REPORT = {
+    "ngo_id": "ngo-001",
+    "project_name": "Sundarbans Restoration Phase 1",
+    "tree_count": 950,
+    "final_score": 91.0
+}
+
+
+@pytest.fixture
+def chaincode():
+    return simulator.ChaincodeSimulator()
+
+
+@pytest.fixture
+def service(chaincode):
+    return fabric_service.FabricService(mode="simulator", simulator=chaincode)
+
+
+def test_issue_and_query(service, chaincode):
+    result = service.issue_credits({"creditId": "c-1", "credits": 10})
+    assert result["success"] and result["creditId"] == "c-1"
+
+    stored = chaincode.call("getCredit", "c-1")
+    assert stored["txId"] == result["txId"] and stored["type"] == "CarbonCredit"
+    assert [e["name"] for e in chaincode.events] == ["CarbonCreditAdded"]
+
+    with pytest.raises(fabric_service.FabricServiceError, match="already exists"):
+        service.issue_credits({"creditId": "c-1", "credits": 10})
+    assert service.query_all_credits() == [stored]
+
+
+def test_event_log_is_bounded_and_drained():
+    chaincode = simulator.ChaincodeSimulator(max_events=3)
+    received = []
+    chaincode.add_listener(received.append)
+    for i in range(5):
+        chaincode.call("addCredit", {"creditId": f"c-{i}", "credits": 1})
+
+    # Listeners see every event; only the latest are kept
+    assert len(received) == 5
+    assert [json.loads(e["payload"])["creditId"] for e in chaincode.drain_events()] == ["c-2", "c-3", "c-4"]
+    assert len(chaincode.events) == 0
+
+
+def test_batch_is_all_or_nothing(service, chaincode):
+    service.issue_credits({"creditId": "c-3", "credits": 1})
+
+    with pytest.raises(fabric_service.FabricServiceError, match="c-3 already exists"):
+        service.issue_credits_batch([{"creditId": f"c-{i}", "credits": 1} for i in range(5)])
+    with pytest.raises(fabric_service.FabricServiceError, match="twice"):
+        service.issue_credits_batch([{"creditId": "c-9", "credits": 1}] * 2)
+    assert [c["creditId"] for c in service.query_all_credits()] == ["c-3"]
+
+    result = service.issue_credits_batch([{"creditId": f"b-{i}", "credits": 2} for i in range(5)])
+    assert result["count"] == 5 and result["creditIds"] == [f"b-{i}" for i in range(5)]
+    event = chaincode.events[-1]
+    assert event["name"] == "CarbonCreditsAdded"
+    assert json.loads(event["payload"])["totalCredits"] == 10
+
+
+def test_pagination(service, chaincode):
+    service.issue_credits_batch([{"creditId": f"c-{i:03d}", "credits": 1} for i in range(45)])
+
+    first = service.query_credits_page(page_size=20)
+    assert first["fetchedRecordsCount"] == 20 and first["bookmark"]
+    assert [c["creditId"] for c in service.iter_credits(page_size=20)] == [f"c-{i:03d}" for i in range(45)]
+    assert [len(page) for page in service.iter_credit_pages(page_size=15)] == [15, 15, 15]
+
+    # Paginated range queries are read-only in Fabric
+    with pytest.raises(simulator.ChaincodeError, match="read-only"):
+        chaincode.submit("QueryCreditsWithPagination", 10, "")
+
+
+def test_mvcc_conflict_discards_transaction(chaincode):
+    state = chaincode.state
+    stub = simulator.ChaincodeStub(state, "tx-1")
+    chaincode.contract.AddCarbonCredit(simulator.Context(stub), json.dumps({"creditId": "c-1"}))
+
+    # Another transaction commits the same key between endorsement and commit
+    chaincode.submit("AddCarbonCredit", json.dumps({"creditId": "c-1"}))
+    with pytest.raises(simulator.MVCCConflictError):
+        state.commit(stub.reads, stub.writes)
+    assert state.height == 1
+
+
+def test_batcher_retries_a_failed_batch_one_credit_at_a_time(service, chaincode):
+    service.issue_credits({"creditId": "c-1", "credits": 1})
+    batcher = IssuanceBatcher(service, window_ms=50)
+    pending = [batcher.submit({"creditId": credit_id, "credits": 1}) for credit_id in ("c-0", "c-1", "c-2")]
+    batcher.close()
+
+    # The duplicate fails the batch; on their own the other two are committed
+    assert pending[0].wait(1)["creditId"] == "c-0" and pending[2].wait(1)["creditId"] == "c-2"
+    with pytest.raises(fabric_service.FabricServiceError, match="already exists"):
+        pending[1].wait(1)
+    assert {c["creditId"] for c in service.query_all_credits()} == {"c-0", "c-1", "c-2"}
+
+
+def test_batcher_fails_every_credit_when_credit_ids_are_missing():
+    class ShortResultService:
+        def issue_credits_batch(self, payloads):
+            return {"success": True, "txId": "tx-1", "creditIds": [payloads[0]["creditId"]]}
+
+    batcher = IssuanceBatcher(ShortResultService(), window_ms=50)
+    pending = [batcher.submit({"creditId": f"c-{i}", "credits": 1}) for i in range(3)]
+    batcher.close()
+    for issuance in pending:
+        with pytest.raises(FabricServiceError, match="1 credit ids for 3 credits"):
+            issuance.wait(1)
+
+
+def test_issue_credits_load(tmp_path):
+    chaincode = simulator.ChaincodeSimulator(latency_ms=20)
+    fabric = fabric_service.FabricService(mode="simulator", simulator=chaincode)
+    ledger = LedgerService(storage_mode="segmented", storage_dir=str(tmp_path), fabric_service=fabric,
+                           fabric_batch_window_ms=25)
+    report_ids = [r["report_id"] for r in ledger.submit_reports([SAMPLE_REPORT] * 200)["reports"]]
+
+    def issue(report_id):
+        return ledger.issue_credits({"ngo_id": "ngo-001", "credits_amount": 5, "report_id": report_id})
+
+    with ThreadPoolExecutor(max_workers=50) as pool:
+        results = list(pool.map(issue, report_ids))
+    ledger.close()
+
+    assert all(r["onchain"] for r in results)
+    # 200 credits committed in far fewer transactions, one event each
+    assert chaincode.submitted < 50 and chaincode.failed == 0
+    assert len(chaincode.events) == chaincode.submitted
+    on_chain = {c["creditId"]: c for c in fabric.iter_credits(page_size=64)}
+    assert set(on_chain) == {r["credit_id"] for r in results}
+    for r in results:
+        assert on_chain[r["credit_id"]]["txId"] == r["onchain_result"]["txId"]
+
+
+def test_ledger_issues_through_async_service(tmp_path):
+    chaincode = simulator.ChaincodeSimulator(latency_ms=50)
+    fabric = fabric_service.SyncFabricService(mode="simulator", simulator=chaincode, max_in_flight=4)
+    ledger = LedgerService(storage_mode="segmented", storage_dir=str(tmp_path), fabric_service=fabric)
+    report_ids = [r["report_id"] for r in ledger.submit_reports([SAMPLE_REPORT] * 24)["reports"]]
+
+    def issue(report_id):
+        return ledger.issue_credits({"ngo_id": "ngo-001", "credits_amount": 5, "report_id": report_id})
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=24) as pool:
+        results = list(pool.map(issue, report_ids))
+    elapsed = time.perf_counter() - started
+    ledger.close()
+    fabric.close()
+
+    assert all(r["onchain"] for r in results)
+    assert chaincode.submitted == 24
+    # Four transactions in flight at a time: six rounds of latency, not 24
+    assert 6 * 0.05 <= elapsed < 24 * 0.05 / 2
+
+
+@pytest.mark.parametrize("async_client", [False, True])
+def test_ledger_builds_default_service_when_configured(tmp_path, monkeypatch, async_client):
+    monkeypatch.setenv("FABRIC_CLIENT_MODE", "simulator")
+    monkeypatch.setenv("FABRIC_ASYNC", "1" if async_client else "0")
+    ledger = LedgerService(storage_mode="segmented", storage_dir=str(tmp_path))
+    report_id = ledger.submit_report(SAMPLE_REPORT)["report_id"]
+
+    result = ledger.issue_credits({"ngo_id": "ngo-001", "credits_amount": 5, "report_id": report_id})
+    assert result["onchain"] and result["onchain_result"]["creditId"] == result["credit_id"]
+    assert fabric.FABRIC_AVAILABLE
+    assert type(ledger._fabric) is (fabric.SyncFabricService if async_client else fabric.FabricService)
+    assert ledger._fabric.mode == "simulator"
+    ledger.close()
+
+
+def test_ledger_issues_locally_when_fabric_is_not_configured(tmp_path, monkeypatch):
+    monkeypatch.delenv("FABRIC_CLIENT_MODE", raising=False)
+    monkeypatch.setenv("FABRIC_CONNECTION_PROFILE", str(tmp_path / "missing-connection.json"))
+    ledger = LedgerService(storage_mode="segmented", storage_dir=str(tmp_path))
+    report_id = ledger.submit_report(SAMPLE_REPORT)["report_id"]
+
+    result = ledger.issue_credits({"ngo_id": "ngo-001", "credits_amount": 5, "report_id": report_id})
+    assert result["status"] == "success" and not result["onchain"]
+    assert ledger._fabric is None
@@ -0,0 +1,101 @@
+"""
+Tests for the MongoDB ledger path, run against an in-process mongomock client
+Run with: python -m pytest test_ledger_mongo.py
+"""
+
+import os
+import sys
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from blockchain.ledger_service import MONGO_INDEXES, LedgerService  # noqa: E402
+
+SAMPLE_REPORT = {"ngo_id": "ngo-001", "tree_count": 950, "final_score": 91.0}
+
+
+@pytest.fixture
+def client():
+    return mongomock.MongoClient()
+
+
+@pytest.fixture
+def ledger(client, tmp_path):
+    return LedgerService(storage_dir=str(tmp_path), mongo_client=client)
+
+
+def _issue(ledger, ngo_id, amount):
+    report_id = ledger.submit_report(dict(SAMPLE_REPORT, ngo_id=ngo_id))["report_id"]
+    return ledger.issue_credits({"ngo_id": ngo_id, "credits_amount": amount, "report_id": report_id})
+
+
+def test_indexes_created_on_startup(ledger, client):
+    assert ledger.use_mongodb
+    db = client['ecoledger']
+    for collection, keys, options in MONGO_INDEXES:
+        indexes = {tuple(map(tuple, info['key'])): info for info in db[collection].index_information().values()}
+        assert tuple(keys) in indexes
+        assert indexes[tuple(keys)].get('unique', False) == options.get('unique', False)
+
+    # Startup is repeatable against existing indexes
+    LedgerService(storage_dir=ledger.storage_dir, mongo_client=client)
+
+
+def test_reports_are_stored_and_returned_without_object_ids(ledger):
+    single = ledger.submit_report(SAMPLE_REPORT)
+    batch = ledger.submit_reports([SAMPLE_REPORT] * 3)
+
+    report = ledger.query_report(single["report_id"])["report"]
+    assert "_id" not in report
+    assert ledger.reports_collection.count_documents({}) == 4
+    assert ledger.get_report_proof(batch["reports"][1]["report_id"])["status"] == "success"
+    assert ledger.verify_chain(full=True)["valid"]
+
+    with pytest.raises(Exception):
+        ledger.reports_collection.insert_one({"report_id": single["report_id"], "block_number": 99})
+
+
+def test_marketplace_rebuilt_by_aggregation(ledger, client):
+    _issue(ledger, "ngo-002", 4)
+    _issue(ledger, "ngo-001", 10)
+    _issue(ledger, "ngo-002", 6)
+    ledger.transfer_credits({"from_id": "ngo-002", "to_id": "company-001", "credits_amount": 5, "price": 15})
+    expected = ledger.get_marketplace_credits()["marketplace"]
+    assert [listing["ngo_id"] for listing in expected] == ["ngo-002", "ngo-001"]
+    assert expected[0]["total_credits"] == 5
+
+    reopened = LedgerService(storage_dir=ledger.storage_dir, mongo_client=client)
+    assert reopened.get_marketplace_credits()["marketplace"] == expected
+    assert reopened.get_balance("company-001")["balance"] == 5
+    assert reopened.submit_report(SAMPLE_REPORT)["block_number"] == 4
+
+    stats = reopened.get_blockchain_stats()["blockchain_stats"]
+    assert (stats["total_reports"], stats["total_credits_issued"], stats["total_transactions"]) == (4, 3, 1)
+    assert (stats["total_credit_amount_issued"], stats["total_credits_traded"], stats["total_trade_value"]) == (20, 5, 75)
+
+
+def test_ngo_credits_page(ledger):
+    for amount in (1, 2, 3):
+        _issue(ledger, "ngo-001", amount)
+
+    first = ledger.get_ngo_credits("ngo-001", limit=2)
+    second = ledger.get_ngo_credits("ngo-001", limit=2, cursor=first["next_cursor"])
+    assert [c["credits_amount"] for c in first["credits"] + second["credits"]] == [1, 2, 3]
+    assert second["next_cursor"] is None
+    assert all("_id" not in c for c in first["credits"])
+    assert first["total_credits_issued"] == 6
+
+
+def test_time_range_queries(ledger):
+    _issue(ledger, "ngo-001", 1)
+    _issue(ledger, "ngo-001", 2)
+    issued = [c["issued_at"] for c in ledger.get_ngo_credits("ngo-001")["credits"]]
+
+    assert [c["credits_amount"] for c in ledger.query_time_range("credits", start=issued[1])["records"]] == [2]
+    first = ledger.query_time_range("reports", limit=1)
+    second = ledger.query_time_range("reports", limit=1, cursor=first["next_cursor"])
+    assert first["records"][0]["block_number"] == 1 and second["records"][0]["block_number"] == 2
+    assert second["next_cursor"] is None
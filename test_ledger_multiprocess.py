@@ -0,0 +1,113 @@
+"""
+Multi-process tests for LedgerService writers sharing one storage directory
+Run with: python -m pytest test_ledger_multiprocess.py
+"""
+
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+from blockchain.ledger_service import LedgerService  # noqa: E402
+
+WORKERS = 4
+REPORTS_PER_WORKER = 25
+
+
+def _submit_worker(storage_mode, storage_dir, worker_id, count):
+    sys.path.insert(0, BACKEND_DIR)
+    from blockchain.ledger_service import LedgerService
+    ledger = LedgerService(storage_mode=storage_mode, storage_dir=storage_dir, multi_process=True)
+    for i in range(count):
+        result = ledger.submit_report({"worker": worker_id, "n": i})
+        assert result["status"] == "success", result
+    result = ledger.submit_reports([{"worker": worker_id, "batch": j} for j in range(3)])
+    assert result["status"] == "success", result
+    ledger.close()
+
+
+def _http_worker(storage_mode, storage_dir, worker_id, count):
+    # Each process imports its own copy of the Flask app, like a gunicorn worker
+    os.environ['LEDGER_STORAGE_MODE'] = storage_mode
+    os.environ['LEDGER_STORAGE_DIR'] = storage_dir
+    os.environ['LEDGER_MULTI_PROCESS'] = '1'
+    os.chdir(storage_dir)
+    sys.path.insert(0, BACKEND_DIR)
+    from main import app
+    client = app.test_client()
+    for i in range(count):
+        response = client.post('/ledger/submit', json={"worker": worker_id, "n": i})
+        assert response.status_code == 200 and response.get_json()["status"] == "success"
+
+
+def _run_workers(target, storage_mode, storage_dir):
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=target, args=(storage_mode, storage_dir, worker_id, REPORTS_PER_WORKER))
+        for worker_id in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=120)
+    assert all(process.exitcode == 0 for process in processes)
+
+
+def _assert_contiguous_chain(ledger, expected_blocks):
+    reports = ledger._load_from_file(ledger.reports_file)
+    block_numbers = sorted({r["block_number"] for r in reports})
+    assert block_numbers == list(range(1, expected_blocks + 1))
+    assert ledger.get_blockchain_stats()["blockchain_stats"]["last_block_number"] == expected_blocks
+
+    verification = ledger.verify_chain(full=True, write_checkpoint=False)
+    assert verification["valid"], verification["errors"]
+
+
+@pytest.mark.parametrize("storage_mode", ["json", "segmented", "sqlite"])
+def test_concurrent_processes_keep_chain_contiguous(tmp_path, storage_mode):
+    _run_workers(_submit_worker, storage_mode, str(tmp_path))
+
+    ledger = LedgerService(storage_mode=storage_mode, storage_dir=str(tmp_path), multi_process=True)
+    _assert_contiguous_chain(ledger, WORKERS * (REPORTS_PER_WORKER + 1))
+    assert len(ledger._load_from_file(ledger.reports_file)) == WORKERS * (REPORTS_PER_WORKER + 3)
+
+
+def test_process_sees_other_process_writes(tmp_path):
+    first = LedgerService(storage_mode="segmented", storage_dir=str(tmp_path), multi_process=True)
+    second = LedgerService(storage_mode="segmented", storage_dir=str(tmp_path), multi_process=True)
+
+    report = first.submit_report({"project_name": "shared"})
+    assert second.query_report(report["report_id"])["status"] == "found"
+    assert second.submit_report({"project_name": "next"})["block_number"] == report["block_number"] + 1
+
+    second.issue_credits({"ngo_id": "ngo-001", "credits_amount": 10, "report_id": report["report_id"]})
+    assert first.transfer_credits({"from_id": "ngo-001", "to_id": "company-001", "credits_amount": 10, "price": 15})["status"] == "success"
+    # The sender's balance was spent in the other process, so this would be a double spend
+    assert second.transfer_credits({"from_id": "ngo-001", "to_id": "company-002", "credits_amount": 10, "price": 15})["status"] == "failed"
+    assert second.get_balance("company-001")["balance"] == 10
+    # Counters follow the other process's appends too
+    stats = second.get_blockchain_stats()["blockchain_stats"]
+    assert (stats["total_reports"], stats["total_transactions"], stats["total_trade_value"]) == (2, 1, 150)
+    # Both processes tag the marketplace by ledger position, so a cached response revalidates in either
+    assert first.get_marketplace_etag() == second.get_marketplace_etag()
+
+
+def test_rejects_group_commit(tmp_path):
+    with pytest.raises(ValueError):
+        LedgerService(storage_mode="segmented", storage_dir=str(tmp_path), group_commit=True, multi_process=True)
+
+
+@pytest.mark.parametrize("storage_mode", ["json", "segmented"])
+def test_concurrent_http_workers_keep_chain_contiguous(tmp_path, storage_mode):
+    pytest.importorskip("flask")
+    pytest.importorskip("flask_cors")
+    pytest.importorskip("flask_socketio")
+    storage_dir = str(tmp_path)
+    _run_workers(_http_worker, storage_mode, storage_dir)
+
+    ledger = LedgerService(storage_mode=storage_mode, storage_dir=storage_dir, multi_process=True)
+    _assert_contiguous_chain(ledger, WORKERS * REPORTS_PER_WORKER)
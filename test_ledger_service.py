@@ -0,0 +1,884 @@
+"""
+Unit tests for the blockchain LedgerService storage engine
+Run with: python -m pytest test_ledger_service.py
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from blockchain.chain_verifier import entry_hash  # noqa: E402
+from blockchain.group_commit import GroupCommitWriter  # noqa: E402
+from blockchain.ledger_index import LedgerIndex  # noqa: E402
+from blockchain.ledger_service import LedgerService  # noqa: E402
+from blockchain.ledger_totals import LedgerTotals  # noqa: E402
+from blockchain.marketplace import MarketplaceView  # noqa: E402
+from blockchain.merkle import hash_leaf, hash_pair, merkle_proof, merkle_root, verify_merkle_proof  # noqa: E402
+from blockchain.pagination import sort_key, validate_page_args  # noqa: E402
+from blockchain.record_convert import convert_storage  # noqa: E402
+from blockchain.record_format import RECORD_FORMATS  # noqa: E402
+from blockchain.segment_log import SegmentLog  # noqa: E402
+from blockchain.sqlite_store import TABLE_COLUMNS  # noqa: E402
+
+SAMPLE_REPORT = {
+    "ngo_id": "ngo-001",
+    "project_name": "Sundarbans Restoration Phase 1",
+    "tree_count": 950,
+    "final_score": 91.0
+}
+
+
+@pytest.fixture(params=["json", "segmented", "segmented-binary", "sqlite"])
+def ledger(request, tmp_path):
+    storage_mode, _, record_encoding = request.param.partition("-")
+    return LedgerService(storage_mode=storage_mode, storage_dir=str(tmp_path), record_encoding=record_encoding or "json")
+
+
+def _reopen(ledger, **kwargs):
+    return LedgerService(storage_mode=ledger.storage_mode, storage_dir=ledger.storage_dir,
+                         record_encoding=ledger.record_encoding, **kwargs)
+
+
+def test_submit_and_query_report(ledger):
+    first = ledger.submit_report(SAMPLE_REPORT)
+    second = ledger.submit_report(SAMPLE_REPORT)
+
+    assert first["status"] == "success"
+    assert second["block_number"] == first["block_number"] + 1
+
+    found = ledger.query_report(second["report_id"])
+    assert found["status"] == "found"
+    assert found["report"]["previous_hash"] == first["blockchain_hash"]
+    assert ledger.query_report("missing")["status"] == "not_found"
+
+
+def test_issue_and_marketplace(ledger):
+    report = ledger.submit_report(SAMPLE_REPORT)
+    issued = ledger.issue_credits({"ngo_id": "ngo-001", "credits_amount": 10.5, "report_id": report["report_id"]})
+    assert issued["status"] == "success"
+
+    market = ledger.get_marketplace_credits()
+    assert market["total_credits_available"] == 10.5
+    assert ledger.get_ngo_credits("ngo-001")["total_credits_issued"] == 10.5
+
+
+def test_segment_log_rolls_over(tmp_path):
+    log = SegmentLog(str(tmp_path), max_segment_bytes=256)
+    for i in range(50):
+        log.append({"n": i, "pad": "x" * 40})
+
+    assert len(os.listdir(tmp_path)) > 1
+    assert [e["n"] for e in log.iter_entries()] == list(range(50))
+    assert log.last_entry()["n"] == 49
+
+
+def test_segment_log_point_reads_by_key(tmp_path):
+    log = SegmentLog(str(tmp_path), max_segment_bytes=256, key_field="id")
+    for i in range(30):
+        log.append({"id": f"r{i}", "pad": "x" * 40})
+    log.append_batch([{"id": "b1"}, {"id": "b2"}])
+    assert log.read_record("r3") == {"id": "r3", "pad": "x" * 40}
+    assert log.read_record("b2") == {"id": "b2"}
+    assert log.read_record("missing") is None
+    log.close()
+
+    # A sidecar that lags its segment (crash between the two writes) is repaired on open
+    sidecars = sorted(name for name in os.listdir(tmp_path) if name.endswith(".idx"))
+    assert len(sidecars) > 1
+    with open(os.path.join(tmp_path, sidecars[-1]), 'r+b') as f:
+        f.truncate(5)
+    reopened = SegmentLog(str(tmp_path), max_segment_bytes=256, key_field="id")
+    assert [reopened.read_record(key)["id"] for key in ("r0", "r29", "b1", "b2")] == ["r0", "r29", "b1", "b2"]
+
+
+@pytest.mark.parametrize("record_format", list(RECORD_FORMATS))
+def test_segment_log_ignores_torn_tail(tmp_path, record_format):
+    log = SegmentLog(str(tmp_path), record_format=record_format)
+    log.append({"n": 1})
+    torn = log.encode({"n": 2})[:-2]
+    log.close()
+    segment = os.path.join(tmp_path, os.listdir(tmp_path)[0])
+    with open(segment, 'ab') as f:
+        f.write(torn)
+
+    reopened = SegmentLog(str(tmp_path), record_format=record_format)
+    assert [e["n"] for e in reopened.iter_entries()] == [1]
+    assert reopened.last_entry()["n"] == 1
+    reopened.append({"n": 3})
+    assert [e["n"] for e in reopened.iter_entries()] == [1, 3]
+
+
+def test_record_formats_round_trip():
+    record = {
+        "report_id": "r-1", "block_number": 7, "previous_hash": None, "available_for_sale": True,
+        "credits_amount": 10.0, "price_per_credit": 15.25, "delta": -3, "big": 2 ** 70,
+        "data": {"project_name": "Sundarbans – फेज़ 1", "tree_count": 950, "scores": [91.0, 0, False, {}]},
+        "unlisted_field": []
+    }
+    for record_format in RECORD_FORMATS.values():
+        frame = record_format.encode(record)
+        payload = frame[record_format.header_size:len(frame) - record_format.trailer_size]
+        decoded = record_format.decode(payload)
+        # Same values and types, so the hash is unchanged by the storage format
+        assert decoded == record and type(decoded["credits_amount"]) is float
+        assert entry_hash(decoded) == entry_hash(record)
+    assert len(RECORD_FORMATS["binary"].encode(record)) < len(RECORD_FORMATS["json"].encode(record))
+
+
+@pytest.mark.parametrize("storage_mode", ["segmented", "sqlite"])
+def test_storage_mode_imports_legacy_json(tmp_path, storage_mode):
+    legacy = LedgerService(storage_mode="json", storage_dir=str(tmp_path))
+    submitted = legacy.submit_report(SAMPLE_REPORT)
+
+    migrated = LedgerService(storage_mode=storage_mode, storage_dir=str(tmp_path))
+    assert migrated.query_report(submitted["report_id"])["status"] == "found"
+    assert migrated.submit_report(SAMPLE_REPORT)["block_number"] == submitted["block_number"] + 1
+
+    with open(legacy.reports_file) as f:
+        assert len(json.load(f)) == 1
+
+
+def test_interrupted_legacy_import_is_redone(tmp_path, monkeypatch):
+    legacy = LedgerService(storage_mode="json", storage_dir=str(tmp_path))
+    report_ids = [r["report_id"] for r in legacy.submit_reports([SAMPLE_REPORT] * 5)["reports"]]
+
+    def crash_midway(log, entries, durable=True):
+        # Part of the batch reaches the staging log before the process dies
+        original_append_batch(log, entries[:3], durable)
+        raise OSError("simulated crash")
+
+    original_append_batch = SegmentLog.append_batch
+    monkeypatch.setattr(SegmentLog, "append_batch", crash_midway)
+    with pytest.raises(OSError):
+        LedgerService(storage_mode="segmented", storage_dir=str(tmp_path))
+    monkeypatch.undo()
+    assert SegmentLog(str(tmp_path / "segments" / "reports")).is_empty()
+
+    migrated = LedgerService(storage_mode="segmented", storage_dir=str(tmp_path))
+    assert all(migrated.query_report(report_id)["status"] == "found" for report_id in report_ids)
+    assert migrated.verify_chain(full=True)["valid"]
+    assert not os.path.exists(tmp_path / "segments" / "reports.importing")
+
+
+def test_indexes_survive_restart(ledger):
+    report = ledger.submit_report(SAMPLE_REPORT)
+    for amount in (1.0, 2.0):
+        ledger.issue_credits({"ngo_id": "ngo-002", "credits_amount": amount, "report_id": report["report_id"]})
+
+    reopened = _reopen(ledger)
+    assert reopened.query_report(report["report_id"])["status"] == "found"
+    assert reopened.get_report_credits(report["report_id"])["total_credits_issued"] == 3.0
+    assert [c["credits_amount"] for c in reopened.get_ngo_credits("ngo-002")["credits"]] == [1.0, 2.0]
+    assert reopened._get_available_credits("ngo-002") == 3.0
+
+
+def test_chain_tip_recovered_after_lost_tip_write(ledger):
+    ledger.submit_report(SAMPLE_REPORT)
+    last = ledger.submit_report(SAMPLE_REPORT)
+    # Simulate a crash between the report append and the tip write
+    with open(ledger.chain_tip_file, 'w') as f:
+        json.dump({"block_number": 1, "hash": "stale"}, f)
+
+    reopened = _reopen(ledger)
+    assert reopened._get_last_block_hash() == last["blockchain_hash"]
+    assert reopened.submit_report(SAMPLE_REPORT)["block_number"] == last["block_number"] + 1
+    # Appends leave the tip file alone; it is written at shutdown
+    with open(reopened.chain_tip_file) as f:
+        assert json.load(f)["block_number"] == last["block_number"]
+    reopened.close()
+    with open(reopened.chain_tip_file) as f:
+        assert json.load(f)["block_number"] == last["block_number"] + 1
+
+
+def test_group_commit_batches_concurrent_submits(tmp_path):
+    ledger = LedgerService(storage_mode="segmented", storage_dir=str(tmp_path),
+                           group_commit=True, commit_window_ms=5)
+    batches = []
+    log = ledger._segment_logs[ledger.reports_file]
+    original_append_batch = log.append_batch
+
+    def counting_append_batch(entries, durable=True):
+        batches.append(len(entries))
+        original_append_batch(entries, durable)
+
+    log.append_batch = counting_append_batch
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda _: ledger.submit_report(SAMPLE_REPORT), range(200)))
+    ledger.close()
+
+    assert all(r["status"] == "success" for r in results)
+    assert sum(batches) == 200
+    assert len(batches) < 200
+
+    reports = list(SegmentLog(log.directory).iter_entries())
+    assert [r["block_number"] for r in reports] == list(range(1, 201))
+    for previous, current in zip(reports, reports[1:]):
+        assert current["previous_hash"] == previous["hash"]
+
+
+def test_group_commit_failure_rejects_only_the_failed_log(tmp_path):
+    good = SegmentLog(str(tmp_path / "good"))
+    bad = SegmentLog(str(tmp_path / "bad"))
+
+    def failing_append_batch(entries, durable=True):
+        raise OSError("fsync failed")
+
+    bad.append_batch = failing_append_batch
+    failures = []
+    writer = GroupCommitWriter(commit_window_ms=50, on_failure=failures.append)
+    durable = []
+    good_write = writer.submit(good, {"n": 1}, on_durable=lambda: durable.append("good"))
+    bad_write = writer.submit(bad, {"n": 2}, on_durable=lambda: durable.append("bad"))
+    flush = writer.submit(None, None)
+
+    good_write.wait(5)
+    with pytest.raises(IOError, match="fsync failed"):
+        bad_write.wait(5)
+    with pytest.raises(IOError):
+        flush.wait(5)
+    writer.close()
+
+    # The record that reached disk stays accepted and indexed
+    assert durable == ["good"] and len(failures) == 1
+    assert list(good.iter_entries()) == [{"n": 1}]
+
+
+def test_submit_reports_packs_batch_into_one_block(ledger):
+    first = ledger.submit_report(SAMPLE_REPORT)
+    batch = [dict(SAMPLE_REPORT, tree_count=n) for n in range(5)]
+    result = ledger.submit_reports(batch)
+
+    assert result["status"] == "success"
+    assert result["block_number"] == first["block_number"] + 1
+    assert len(result["reports"]) == 5
+    assert result["merkle_root"] == merkle_root([r["blockchain_hash"] for r in result["reports"]])
+
+    stored = ledger.query_report(result["reports"][3]["report_id"])["report"]
+    assert stored["block_number"] == result["block_number"]
+    assert stored["previous_hash"] == first["blockchain_hash"]
+    assert stored["hash"] == result["reports"][3]["blockchain_hash"]
+
+    after = ledger.submit_report(SAMPLE_REPORT)
+    assert ledger.query_report(after["report_id"])["report"]["previous_hash"] == result["block_hash"]
+    assert ledger.submit_reports([])["status"] == "failed"
+
+
+def test_batch_header_repaired_after_crash(tmp_path):
+    ledger = LedgerService(storage_mode="segmented", storage_dir=str(tmp_path))
+    ledger.submit_reports([SAMPLE_REPORT, SAMPLE_REPORT, SAMPLE_REPORT])
+    ledger.close()
+    # Lose the header, as if the process died between writing entries and header
+    blocks_dir = os.path.join(str(tmp_path), "segments", "blocks")
+    for name in os.listdir(blocks_dir):
+        open(os.path.join(blocks_dir, name), 'w').close()
+
+    reopened = LedgerService(storage_mode="segmented", storage_dir=str(tmp_path))
+    header = reopened._get_block_header(1)
+    assert header["recovered"] is True
+    assert header["entry_count"] == 3
+    assert reopened._get_last_block_hash() == header["hash"]
+
+
+def test_merkle_proofs_for_every_leaf_count():
+    for count in range(1, 12):
+        leaves = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(count)]
+        root = merkle_root(leaves)
+        for index, leaf in enumerate(leaves):
+            proof = merkle_proof(leaves, index)
+            assert len(proof) <= (count - 1).bit_length()
+            assert verify_merkle_proof(leaf, proof, root)
+            assert not verify_merkle_proof("0" * 64, proof, root)
+
+
+def test_merkle_tree_separates_leaves_from_nodes():
+    a, b, c = (hashlib.sha256(x).hexdigest() for x in (b"a", b"b", b"c"))
+    # An odd last leaf is promoted, not duplicated, so [a, b, c] and [a, b, c, c] differ
+    assert merkle_root([a, b, c]) != merkle_root([a, b, c, c])
+    # An interior node cannot be presented as a leaf
+    interior = hash_pair(hash_leaf(a), hash_leaf(b))
+    assert merkle_root([interior, hash_leaf(c)]) != merkle_root([a, b, c])
+    assert merkle_root([a]) == hash_leaf(a) != a
+
+
+def test_report_proof_endpoint_data(ledger):
+    single = ledger.submit_report(SAMPLE_REPORT)
+    batch = ledger.submit_reports([dict(SAMPLE_REPORT, tree_count=n) for n in range(7)])
+
+    proof = ledger.get_report_proof(batch["reports"][5]["report_id"])
+    assert proof["verified"] is True
+    assert proof["merkle_root"] == batch["merkle_root"]
+    assert proof["block_hash"] == batch["block_hash"]
+    assert ledger._calculate_hash(proof["block_header"]) == batch["block_hash"]
+    assert "merkle_version" not in proof["block_header"]
+    assert verify_merkle_proof(proof["report_hash"], proof["proof"], proof["merkle_root"])
+
+    single_proof = ledger.get_report_proof(single["report_id"])
+    assert single_proof["proof"] == [] and single_proof["block_hash"] == single["blockchain_hash"]
+    assert single_proof["verified"] is True and single_proof["merkle_root"] == merkle_root([single["blockchain_hash"]])
+    assert ledger.get_report_proof("missing")["status"] == "not_found"
+
+
+def test_verify_chain_incremental_from_checkpoint(ledger):
+    for _ in range(3):
+        ledger.submit_report(SAMPLE_REPORT)
+    ledger.submit_reports([SAMPLE_REPORT] * 4)
+
+    first = ledger.verify_chain()
+    assert first["valid"] and first["mode"] == "full"
+    assert first["blocks_verified"] == 4 and first["entries_verified"] == 7
+
+    ledger.submit_report(SAMPLE_REPORT)
+    second = ledger.verify_chain()
+    assert second["valid"] and second["mode"] == "incremental"
+    assert second["verified_from_block"] == 5 and second["blocks_verified"] == 1
+
+    full = ledger.verify_chain(full=True, write_checkpoint=False)
+    assert full["checkpoint"] is None
+    assert full["valid"] and full["blocks_verified"] == 5
+    # Both runs fold the same blocks into the same cumulative hash
+    assert ledger._checkpoints.latest()["cumulative_hash"] == second["checkpoint"]["cumulative_hash"]
+
+
+def _tamper(ledger, table, record, **changes):
+    """Change a stored record behind the ledger's back"""
+    record.update(changes)
+    key_column = TABLE_COLUMNS[table][0]
+    if ledger.storage_mode == "sqlite":
+        ledger._sqlite._connection().execute(f"UPDATE {table} SET body = ? WHERE {key_column} = ?",
+                                             (json.dumps(record), record[key_column]))
+    elif ledger.storage_mode == "segmented" and table != "blocks":
+        # Segmented records are read back from disk; rewrite this one in place (same length)
+        log = ledger._segment_logs[getattr(ledger, f"{table}_file")]
+        segment_number, offset, length = log._offsets[record[key_column]]
+        frame = log.encode(record)
+        assert len(frame) == length + log.format.header_size + log.format.trailer_size
+        with open(log._segment_path(segment_number), 'r+b') as f:
+            f.seek(offset - log.format.header_size)
+            f.write(frame)
+
+
+def test_verify_chain_detects_tampering(ledger):
+    report = ledger.submit_report(SAMPLE_REPORT)
+    ledger.submit_reports([SAMPLE_REPORT] * 3)
+    ledger.submit_report(SAMPLE_REPORT)
+    ledger.verify_chain()
+
+    stored = ledger._index.get_report(report["report_id"])
+    _tamper(ledger, "reports", stored, data=dict(stored["data"], tree_count=951))
+    assert ledger.verify_chain()["valid"]  # before the checkpoint: not re-hashed
+    result = ledger.verify_chain(full=True)
+    assert not result["valid"]
+    assert any("hash mismatch" in e for e in result["errors"])
+
+
+def test_verify_chain_rejects_forged_checkpoint(ledger):
+    ledger.submit_report(SAMPLE_REPORT)
+    checkpoint = ledger.verify_chain()["checkpoint"]
+    forged = dict(checkpoint, cumulative_hash="0" * 64)
+    with open(ledger._checkpoints.path, 'a') as f:
+        f.write(json.dumps(forged) + '\n')
+
+    result = ledger.verify_chain()
+    assert result["mode"] == "full" and result["warnings"]
+
+
+def test_verify_chain_parallel(ledger):
+    for i in range(20):
+        if i % 5 == 0:
+            ledger.submit_reports([SAMPLE_REPORT] * 3)
+        else:
+            ledger.submit_report(SAMPLE_REPORT)
+
+    parallel = ledger.verify_chain(full=True, workers=3, write_checkpoint=False)
+    sequential = ledger.verify_chain(full=True)
+    assert parallel["valid"] and parallel["mode"] == "parallel"
+    assert parallel["entries_verified"] == sequential["entries_verified"] == 28
+
+    _tamper(ledger, "blocks", ledger._index.get_block(6), merkle_root="f" * 64)
+    assert not ledger.verify_chain(full=True, workers=3)["valid"]
+
+
+def _issue(ledger, ngo_id, amount, report_id=None):
+    report_id = report_id or ledger.submit_report(SAMPLE_REPORT)["report_id"]
+    return ledger.issue_credits({"ngo_id": ngo_id, "credits_amount": amount, "report_id": report_id})
+
+
+def test_transfers_move_balances_and_survive_rebuild(ledger):
+    _issue(ledger, "ngo-001", 10)
+    _issue(ledger, "ngo-001", 5)
+
+    ok = ledger.transfer_credits({"from_id": "ngo-001", "to_id": "acme", "credits_amount": 12, "price": 15})
+    assert ok["status"] == "success"
+    assert ledger._get_available_credits("ngo-001") == 3
+    assert ledger._get_available_credits("acme") == 12
+
+    resale = ledger.transfer_credits({"from_id": "acme", "to_id": "globex", "credits_amount": 2, "price": 20})
+    assert resale["status"] == "success"
+
+    failed = ledger.transfer_credits({"from_id": "ngo-001", "to_id": "acme", "credits_amount": 4, "price": 15})
+    assert failed["status"] == "failed" and "Insufficient credits" in failed["error"]
+
+    reopened = _reopen(ledger)
+    for entity, expected in (("ngo-001", 3), ("acme", 10), ("globex", 2)):
+        assert reopened.get_balance(entity)["balance"] == expected
+
+
+def test_transfer_by_vintage(ledger):
+    _issue(ledger, "ngo-001", 10)
+    vintage = ledger.get_ngo_credits("ngo-001")["credits"][0]["vintage_year"]
+
+    assert ledger.transfer_credits({"from_id": "ngo-001", "to_id": "acme", "credits_amount": 1,
+                                    "price": 15, "vintage_year": vintage - 1})["status"] == "failed"
+    assert ledger.transfer_credits({"from_id": "ngo-001", "to_id": "acme", "credits_amount": 4,
+                                    "price": 15, "vintage_year": vintage})["status"] == "success"
+    assert ledger.get_balance("acme", vintage)["balance"] == 4
+    assert ledger.get_balance("acme")["vintages"] == {str(vintage): 4}
+
+
+def test_transfer_rejects_non_finite_and_non_positive_numbers(ledger):
+    _issue(ledger, "ngo-001", 100)
+    _issue(ledger, "ngo-001", 50)
+
+    for bad in ({"credits_amount": "nan"}, {"credits_amount": float("inf")}, {"credits_amount": -1},
+                {"credits_amount": 0}, {"credits_amount": "ten"}, {"price": "nan"}, {"price": float("inf")},
+                {"price": -5}, {"price": "cheap"}):
+        request = dict({"from_id": "ngo-001", "to_id": "acme", "credits_amount": 1, "price": 15}, **bad)
+        assert ledger.transfer_credits(request)["status"] == "failed"
+    assert ledger.get_balance("ngo-001")["balance"] == 150
+    assert ledger.get_balance("acme")["balance"] == 0
+    assert _reopen(ledger).get_balance("ngo-001")["balance"] == 150
+
+    with pytest.raises(ValueError):
+        ledger._balances.debit("ngo-001", float("nan"))
+    assert ledger._balances.balance("ngo-001") == 150
+
+
+def test_concurrent_transfers_cannot_double_spend(tmp_path):
+    ledger = LedgerService(storage_mode="segmented", storage_dir=str(tmp_path))
+    _issue(ledger, "ngo-001", 100)
+
+    def buy(i):
+        return ledger.transfer_credits({"from_id": "ngo-001", "to_id": f"company-{i % 4}",
+                                        "credits_amount": 3, "price": 15})
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(buy, range(60)))
+
+    assert sum(r["status"] == "success" for r in results) == 33
+    assert ledger.get_balance("ngo-001")["balance"] == 1
+    assert sum(ledger.get_balance(f"company-{i}")["balance"] for i in range(4)) == 99
+
+
+def test_marketplace_view_tracks_sales_and_versions(ledger):
+    _issue(ledger, "ngo-001", 10)
+    _issue(ledger, "ngo-001", 5)
+    _issue(ledger, "ngo-002", 8)
+
+    first = ledger.get_marketplace_credits()
+    assert first["total_credits_available"] == 23
+    # An unchanged view is served as the same rendered response under the same etag
+    assert ledger.get_marketplace_credits() is first
+    assert ledger.get_marketplace_etag() == first["etag"]
+
+    ledger.transfer_credits({"from_id": "ngo-001", "to_id": "company-001", "credits_amount": 12, "price": 15})
+    second = ledger.get_marketplace_credits()
+    assert second["version"] > first["version"] and second["etag"] != first["etag"]
+    assert second["total_credits_available"] == 11
+    ngo = next(n for n in second["marketplace"] if n["ngo_id"] == "ngo-001")
+    # The oldest listing is sold first
+    assert [c["amount"] for c in ngo["credits_available"]] == [3]
+    assert first["total_credits_available"] == 23
+
+    ledger.transfer_credits({"from_id": "ngo-002", "to_id": "company-001", "credits_amount": 8, "price": 15})
+    reopened = _reopen(ledger)
+    rebuilt = reopened.get_marketplace_credits()
+    assert [n["ngo_id"] for n in rebuilt["marketplace"]] == ["ngo-001"]
+    assert rebuilt["marketplace"] == ledger.get_marketplace_credits()["marketplace"]
+    # The etag names a ledger position, so every process serving this ledger agrees on it
+    assert reopened.get_marketplace_etag() == ledger.get_marketplace_etag()
+    reopened.create_snapshot()
+    assert _reopen(reopened).get_marketplace_etag() == ledger.get_marketplace_etag()
+
+
+def test_issue_converts_numeric_fields_and_reopens(ledger):
+    report_id = ledger.submit_report(SAMPLE_REPORT)["report_id"]
+    result = ledger.issue_credits({"ngo_id": "ngo-001", "credits_amount": "10", "report_id": report_id,
+                                   "price_per_credit": "12.5", "vintage_year": "2023"})
+    assert result["status"] == "success"
+    _issue(ledger, "ngo-001", 5, report_id)
+    assert ledger.get_balance("ngo-001")["balance"] == 15
+
+    for bad in ({"price_per_credit": "cheap"}, {"credits_amount": "ten"}, {"vintage_year": "soon"},
+                {"credits_amount": 0}, {"price_per_credit": float("nan")}):
+        request = dict({"ngo_id": "ngo-001", "credits_amount": 1, "report_id": report_id}, **bad)
+        assert ledger.issue_credits(request)["status"] == "failed"
+    assert ledger.get_balance("ngo-001")["balance"] == 15
+
+    reopened = _reopen(ledger)
+    assert reopened.get_balance("ngo-001")["balance"] == 15
+    credits = reopened.get_ngo_credits("ngo-001", sort_by="price_per_credit")["credits"]
+    assert [(c["price_per_credit"], c["vintage_year"]) for c in credits] == [(12.5, 2023), (15.0, datetime.now().year)]
+
+
+def test_sort_keys_tolerate_values_of_the_wrong_type():
+    # Records written before issuance converted its fields may hold strings
+    records = [{"credit_id": "a", "price_per_credit": "12.5"}, {"credit_id": "b", "price_per_credit": 3.0},
+               {"credit_id": "c", "price_per_credit": "cheap"}, {"credit_id": "d"}]
+    ordered = sorted(records, key=lambda r: sort_key(r, "price_per_credit"))
+    assert [r["credit_id"] for r in ordered] == ["b", "a", "c", "d"]
+
+
+def _pages(fetch, **kwargs):
+    pages = [fetch(**kwargs)]
+    while pages[-1]["next_cursor"]:
+        pages.append(fetch(cursor=pages[-1]["next_cursor"], **kwargs))
+    return pages
+
+
+def test_marketplace_keyset_pagination_and_filters(ledger):
+    report_id = ledger.submit_report(SAMPLE_REPORT)["report_id"]
+    for i in range(7):
+        ledger.issue_credits({"ngo_id": f"ngo-{i % 2}", "credits_amount": 1 + i, "report_id": report_id,
+                              "price_per_credit": 10.0 + (i * 3) % 7})
+
+    pages = _pages(ledger.get_marketplace_credits, limit=3, sort_by="price_per_credit", descending=True)
+    assert [page["count"] for page in pages] == [3, 3, 1]
+    credits = [c for page in pages for c in page["credits"]]
+    assert len({c["credit_id"] for c in credits}) == 7
+    assert [c["price_per_credit"] for c in credits] == sorted((c["price_per_credit"] for c in credits), reverse=True)
+
+    cheap = _pages(ledger.get_marketplace_credits, limit=2, sort_by="price_per_credit", ngo_id="ngo-0", max_price=13.0)
+    assert {c["credit_id"] for p in cheap for c in p["credits"]} == {
+        c["credit_id"] for c in credits if c["ngo_id"] == "ngo-0" and c["price_per_credit"] <= 13.0}
+
+    # A page already handed out is not changed by a later sale
+    first = ledger.get_marketplace_credits(limit=1)
+    amount = first["credits"][0]["amount"]
+    ledger.transfer_credits({"from_id": first["credits"][0]["ngo_id"], "to_id": "company-001", "credits_amount": 0.5, "price": 15})
+    assert first["credits"][0]["amount"] == amount
+    assert ledger.get_marketplace_credits(limit=1)["credits"][0]["amount"] == amount - 0.5
+
+    assert ledger.get_marketplace_credits(limit=2, cursor="not-a-cursor")["status"] == "failed"
+    assert ledger.get_marketplace_credits(limit=2, cursor=pages[0]["next_cursor"])["status"] == "failed"
+    assert ledger.get_marketplace_credits(sort_by="amount")["status"] == "failed"
+
+
+def test_ngo_credits_pagination(ledger):
+    report_id = ledger.submit_report(SAMPLE_REPORT)["report_id"]
+    issued = [
+        ledger.issue_credits({"ngo_id": "ngo-001", "credits_amount": 2, "report_id": report_id})["credit_id"]
+        for _ in range(5)
+    ]
+
+    pages = _pages(ledger.get_ngo_credits, ngo_id="ngo-001", limit=2)
+    assert [c["credit_id"] for p in pages for c in p["credits"]] == issued
+    assert all(p["total_credits_issued"] == 10 for p in pages)
+
+    newest = ledger.get_ngo_credits("ngo-001", limit=1, descending=True)
+    assert newest["credits"][0]["credit_id"] == issued[-1]
+    assert ledger.get_ngo_credits("ngo-001", status="missing")["credits"] == []
+
+
+class CountingLookups(dict):
+    """Record store that counts the records a page reads"""
+
+    lookups = 0
+
+    def get(self, key, default=None):
+        self.lookups += 1
+        return super().get(key, default)
+
+
+def test_filtered_pages_read_a_bounded_number_of_records():
+    credits = [{"credit_id": f"c-{i:03d}", "ngo_id": f"ngo-{i % 2}", "report_id": "r", "credits_amount": 1.0,
+                "price_per_credit": float(i % 50), "vintage_year": 2020 + i % 4, "issued_at": f"2025-01-01T{i:05d}",
+                "status": "retired" if i % 100 == 0 else "issued", "available_for_sale": True} for i in range(400)]
+    view = MarketplaceView()
+    index = LedgerIndex()
+    for credit in credits:
+        view.add_credit(credit)
+        index.add_credit(credit)
+    view._credits = CountingLookups(view._credits)
+    index.credits_by_id = CountingLookups(index.credits_by_id)
+
+    def marketplace_page(**kwargs):
+        page = view.page(**kwargs)
+        return page["credits"], page["next_cursor"]
+
+    sources = [(marketplace_page, view._credits, {}), (partial(index.ngo_credits_page, "ngo-0"), index.credits_by_id,
+                                                       {"ngo_id": "ngo-0"})]
+    queries = [{"status": "retired"}, {"status": "issued", "vintage_year": 2022, "sort_by": "vintage_year"},
+               {"sort_by": "price_per_credit", "min_price": 47.5, "descending": True},
+               {"vintage_year": 2022, "sort_by": "price_per_credit", "max_price": 1}]
+    for fetch, store, scope in sources:
+        for query in queries:
+            expected = {c["credit_id"] for c in credits
+                        if all(c[field] == query.get(field, scope.get(field, c[field]))
+                               for field in ("ngo_id", "status", "vintage_year"))
+                        and query.get("min_price", 0) <= c["price_per_credit"] <= query.get("max_price", 100)}
+            seen, cursor = [], None
+            while True:
+                store.lookups = 0
+                page, cursor = fetch(limit=3, cursor=cursor, **query)
+                # At most one record beyond the page, to tell whether another page follows
+                assert store.lookups <= 4
+                seen.extend(c["credit_id"] for c in page)
+                if cursor is None:
+                    break
+            assert expected and sorted(seen) == sorted(expected)
+
+    with pytest.raises(ValueError):
+        validate_page_args(3, "issued_at", min_price=10)
+
+
+def test_query_transaction(ledger):
+    _issue(ledger, "ngo-001", 10)
+    transfer = ledger.transfer_credits({"from_id": "ngo-001", "to_id": "company-001", "credits_amount": 4, "price": 15})
+
+    found = ledger.query_transaction(transfer["transaction_id"])
+    assert found["status"] == "found" and found["transaction"]["to_id"] == "company-001"
+    assert ledger.query_transaction("missing")["status"] == "not_found"
+
+
+def test_time_range_queries(ledger):
+    report_ids = [ledger.submit_report(SAMPLE_REPORT)["report_id"] for _ in range(5)]
+    times = [ledger.query_report(report_id)["report"]["timestamp"] for report_id in report_ids]
+
+    middle = ledger.query_time_range("reports", start=times[1], end=times[3])
+    assert [r["report_id"] for r in middle["records"]] == report_ids[1:4]
+    assert [r["report_id"] for r in ledger.query_time_range("reports", end=times[0])["records"]] == report_ids[:1]
+
+    # Keyset pages, newest first, resume after the last record returned
+    first = ledger.query_time_range("reports", limit=2, descending=True)
+    second = ledger.query_time_range("reports", limit=2, descending=True, cursor=first["next_cursor"])
+    assert [r["report_id"] for r in first["records"] + second["records"]] == report_ids[::-1][:4]
+
+    _issue(ledger, "ngo-001", 10, report_ids[0])
+    ledger.transfer_credits({"from_id": "ngo-001", "to_id": "company-001", "credits_amount": 4, "price": 15})
+    assert ledger.query_time_range("credits", start=times[-1])["count"] == 1
+    assert ledger.query_time_range("transactions", end=times[-1])["count"] == 0
+
+    reopened = _reopen(ledger)
+    assert reopened.query_time_range("transactions", start=times[0])["records"][0]["to_id"] == "company-001"
+    assert reopened.query_time_range("reports", start=times[2])["count"] == 3
+    assert reopened.query_time_range("blocks")["status"] == "failed"
+    assert reopened.query_time_range("reports", start="last tuesday")["status"] == "failed"
+
+
+def test_stats_are_running_counters(ledger):
+    _issue(ledger, "ngo-001", 10)
+    _issue(ledger, "ngo-002", 2.5)
+    ledger.submit_reports([SAMPLE_REPORT] * 3)
+    ledger.transfer_credits({"from_id": "ngo-001", "to_id": "company-001", "credits_amount": 4, "price": 20})
+    ledger.transfer_credits({"from_id": "company-001", "to_id": "company-002", "credits_amount": 1, "price": 18})
+
+    stats = ledger.get_blockchain_stats()["blockchain_stats"]
+    assert (stats["total_reports"], stats["total_credits_issued"], stats["total_transactions"]) == (5, 2, 2)
+    assert stats["total_credit_amount_issued"] == 12.5
+    assert stats["total_credits_traded"] == 5
+    assert stats["total_trade_value"] == 4 * 20 + 18
+    assert stats["last_block_number"] == 3
+
+    # Rebuilt from the ledger on a cold start without a snapshot
+    reopened = _reopen(ledger)
+    assert reopened.get_blockchain_stats()["blockchain_stats"] == stats
+
+
+def test_stats_stay_finite_with_non_finite_transactions(ledger):
+    _issue(ledger, "ngo-001", 10)
+    ledger.transfer_credits({"from_id": "ngo-001", "to_id": "company-001", "credits_amount": 4, "price": 20})
+    assert ledger.transfer_credits({"from_id": "ngo-001", "to_id": "company-001",
+                                    "credits_amount": "nan", "price": 20})["status"] == "failed"
+    # A transaction stored by a build that did not validate transfer amounts
+    poisoned = {"transaction_id": "poisoned", "from_id": "ngo-001", "to_id": "company-001",
+                "credits_amount": float("nan"), "price_per_credit": 20.0, "total_amount": float("nan"),
+                "timestamp": datetime.now().isoformat(), "vintage_allocation": []}
+    assert ledger._append_to_file(ledger.transactions_file, poisoned)
+    ledger._totals.apply_transfer(poisoned)
+
+    expected = {"total_credits_traded": 4, "total_trade_value": 80}
+    stats = ledger.get_blockchain_stats()["blockchain_stats"]
+    assert {key: stats[key] for key in expected} == expected
+
+    # Rebuilt from the ledger, then restored from a snapshot
+    rebuilt = _reopen(ledger).get_blockchain_stats()["blockchain_stats"]
+    assert {key: rebuilt[key] for key in expected} == expected
+    ledger.create_snapshot()
+    restored = _reopen(ledger).get_blockchain_stats()["blockchain_stats"]
+    assert {key: restored[key] for key in expected} == expected
+
+    with pytest.raises(ValueError):
+        LedgerTotals.from_state({"credits_issued": 10.0, "credits_traded": float("nan"), "trade_value": 0.0})
+
+
+def _derived_state(ledger):
+    return {
+        "tip": dict(ledger._chain_tip),
+        "balances": sorted(map(tuple, ledger._balances.to_state()), key=repr),
+        "marketplace": ledger.get_marketplace_credits()["marketplace"],
+        "counts": dict(ledger._counts),
+        "stats": ledger.get_blockchain_stats()["blockchain_stats"]
+    }
+
+
+def test_snapshot_restores_state_and_replays_tail(ledger):
+    _issue(ledger, "ngo-001", 10)
+    ledger.transfer_credits({"from_id": "ngo-001", "to_id": "company-001", "credits_amount": 4, "price": 15})
+    assert ledger.create_snapshot()["status"] == "success"
+
+    # Written after the snapshot, so replayed on startup
+    ledger.submit_reports([SAMPLE_REPORT, SAMPLE_REPORT])
+    _issue(ledger, "ngo-002", 3)
+    ledger.transfer_credits({"from_id": "ngo-001", "to_id": "company-002", "credits_amount": 1, "price": 15})
+    expected = _derived_state(ledger)
+
+    reopened = _reopen(ledger, warm_index=False)
+    if ledger.storage_mode == "segmented":
+        # Segmented snapshots carry the lookup indexes, brought up to date with the tail
+        assert reopened._index_data.to_state() == reopened._build_index().to_state()
+    else:
+        assert reopened._index_data is None
+    assert _derived_state(reopened) == expected
+    assert reopened.submit_report(SAMPLE_REPORT)["block_number"] == expected["tip"]["block_number"] + 1
+    assert reopened.verify_chain(full=True)["valid"]
+
+
+def test_automatic_snapshots_run_off_the_request_thread(tmp_path):
+    ledger = LedgerService(storage_mode="segmented", storage_dir=str(tmp_path), snapshot_every=5)
+    take_snapshot = ledger.create_snapshot
+    threads = []
+
+    def recording_snapshot():
+        threads.append(threading.current_thread().name)
+        return take_snapshot()
+
+    ledger.create_snapshot = recording_snapshot
+    report_ids = [ledger.submit_report(SAMPLE_REPORT)["report_id"] for _ in range(12)]
+    ledger.close()
+    assert threads and set(threads) == {"ledger-snapshot"}
+
+    reopened = _reopen(ledger, warm_index=False)
+    assert ledger._snapshots.latest()["index"]["reports"]
+    assert reopened.query_report(report_ids[-1])["status"] == "found"
+    assert reopened.submit_report(SAMPLE_REPORT)["block_number"] == 13
+
+
+def test_unreadable_snapshot_falls_back(ledger):
+    _issue(ledger, "ngo-001", 10)
+    ledger.create_snapshot()
+    _issue(ledger, "ngo-001", 5)
+    ledger.create_snapshot()
+    with open(os.path.join(ledger._snapshots.directory, sorted(os.listdir(ledger._snapshots.directory))[-1]), 'w') as f:
+        f.write('{"format": 1, "torn')
+
+    reopened = _reopen(ledger)
+    assert reopened.get_balance("ngo-001")["balance"] == 15
+
+
+@pytest.mark.parametrize("storage_mode", ["json", "segmented"])
+def test_compaction_archives_history(tmp_path, storage_mode):
+    ledger = LedgerService(storage_mode=storage_mode, storage_dir=str(tmp_path), segment_max_bytes=1024)
+    report_ids = [ledger.submit_report(SAMPLE_REPORT)["report_id"] for _ in range(20)]
+    _issue(ledger, "ngo-001", 10, report_ids[0])
+    ledger.transfer_credits({"from_id": "ngo-001", "to_id": "company-001", "credits_amount": 4, "price": 15})
+
+    result = ledger.compact()
+    assert result["status"] == "success" and result["archived"]["reports"] > 0
+    archived = os.path.join(str(tmp_path), "archive", "reports")
+    assert all(os.stat(os.path.join(archived, name)).st_mode & 0o222 == 0
+               for name in os.listdir(archived) if name.startswith("part-"))
+    ledger.submit_report(SAMPLE_REPORT)
+    ledger.close()
+
+    reopened = LedgerService(storage_mode=storage_mode, storage_dir=str(tmp_path), segment_max_bytes=1024)
+    assert reopened.query_report(report_ids[0])["status"] == "found"
+    assert len(reopened._load_from_file(reopened.reports_file)) == 21
+    assert reopened.get_balance("company-001")["balance"] == 4
+    assert reopened.submit_report(SAMPLE_REPORT)["block_number"] == 22
+    assert reopened.verify_chain(full=True)["valid"]
+
+
+def test_sqlite_mode_keeps_history_in_database(tmp_path):
+    ledger = LedgerService(storage_mode="sqlite", storage_dir=str(tmp_path))
+    batch = ledger.submit_reports([SAMPLE_REPORT] * 3)
+    assert ledger._sqlite.count("reports") == 3 and ledger._sqlite.count("blocks") == 1
+    assert ledger.get_blockchain_stats()["blockchain_stats"]["storage_type"] == "SQLite"
+    assert ledger.compact()["status"] == "failed"
+    ledger.close()
+
+    reopened = LedgerService(storage_mode="sqlite", storage_dir=str(tmp_path))
+    assert reopened.get_report_proof(batch["reports"][2]["report_id"])["status"] == "success"
+
+
+def test_convert_segments_between_encodings(tmp_path):
+    ledger = LedgerService(storage_mode="segmented", storage_dir=str(tmp_path), segment_max_bytes=1024)
+    report_ids = [ledger.submit_report(SAMPLE_REPORT)["report_id"] for _ in range(10)]
+    _issue(ledger, "ngo-001", 10, report_ids[0])
+    assert ledger.compact()["status"] == "success"
+    report_ids += [r["report_id"] for r in ledger.submit_reports([SAMPLE_REPORT] * 5)["reports"]]
+    ledger.transfer_credits({"from_id": "ngo-001", "to_id": "company-001", "credits_amount": 4, "price": 15})
+    ledger.close()
+
+    with pytest.raises(ValueError):
+        LedgerService(storage_mode="segmented", storage_dir=str(tmp_path), record_encoding="binary")
+    converted = convert_storage(str(tmp_path), "binary")
+    assert converted["transactions"] == 1
+    with pytest.raises(ValueError):
+        LedgerService(storage_mode="segmented", storage_dir=str(tmp_path))
+
+    binary = LedgerService(storage_mode="segmented", storage_dir=str(tmp_path), record_encoding="binary")
+    assert all(binary.query_report(report_id)["status"] == "found" for report_id in report_ids)
+    assert binary.get_balance("company-001")["balance"] == 4
+    assert binary.verify_chain(full=True)["valid"]
+    assert binary.submit_report(SAMPLE_REPORT)["block_number"] == 12
+    binary.close()
+
+    convert_storage(str(tmp_path), "json")
+    reopened = LedgerService(storage_mode="segmented", storage_dir=str(tmp_path))
+    assert len(reopened._load_from_file(reopened.reports_file)) == 16
+    transaction = reopened._load_from_file(reopened.transactions_file)[0]
+    assert reopened.query_transaction(transaction["transaction_id"])["status"] == "found"
+    assert reopened.verify_chain(full=True)["valid"]
+
+
+class RecordingFabric:
+    """Stands in for FabricService: records each AddCarbonCredits batch it is asked to submit"""
+
+    def __init__(self):
+        self.batches = []
+
+    def issue_credits_batch(self, credits):
+        self.batches.append(credits)
+        return {"success": True, "txId": f"tx-{len(self.batches)}", "count": len(credits),
+                "creditIds": [credit["creditId"] for credit in credits]}
+
+
+def test_concurrent_issuances_share_fabric_batches(tmp_path):
+    fabric = RecordingFabric()
+    ledger = LedgerService(storage_mode="segmented", storage_dir=str(tmp_path), fabric_service=fabric,
+                           fabric_batch_window_ms=50)
+    report_ids = [r["report_id"] for r in ledger.submit_reports([SAMPLE_REPORT] * 20)["reports"]]
+
+    def issue(report_id):
+        return ledger.issue_credits({"ngo_id": "ngo-001", "credits_amount": 5, "report_id": report_id})
+
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        results = list(pool.map(issue, report_ids))
+    ledger.close()
+
+    assert all(r["onchain"] for r in results)
+    assert sum(len(batch) for batch in fabric.batches) == 20
+    assert len(fabric.batches) < 20
+    for r in results:
+        assert r["onchain_result"]["creditId"] == r["credit_id"]
+        assert r["onchain_result"]["batchSize"] > 0